@@ -1,14 +1,28 @@
 from openai import OpenAI
-from openai import AssistantEventHandler
+from openai import AssistantEventHandler, NOT_GIVEN
+from openai.lib.streaming import AssistantStreamManager
 from openai.types.beta import Assistant, AssistantDeleted
 from openai.types.beta import Thread, ThreadDeleted
 from openai.types.beta import VectorStore, VectorStoreDeleted
 from openai.types.beta.vector_stores import VectorStoreFile, VectorStoreFileDeleted
 from openai.types.beta.threads import Message, Run
 
+from RequestPolicy import Request_Policy
+from OutputSinks import Output_Sink, Console_Sink
+
 from enum import Enum
+from typing import Callable, TYPE_CHECKING
 from typing_extensions import override
+from threading import Lock
+from collections import deque
 from os import path
+import json
+import time
+
+# Only needed for annotations, so numpy and sqlite3 are not imported unless they are used
+if TYPE_CHECKING:
+    from LocalIndex import Local_Embedding_Index
+    from ConversationLog import Conversation_Log
 
 class Assistant_Error(Exception):
     """
@@ -38,89 +52,332 @@ class Language_Model(Enum):
 
     GPT_3_5_TURBO: str  = "gpt-3.5-turbo-0125"
     GPT_4O_MINI: str = "gpt-4o-mini"
+    GPT_4O: str = "gpt-4o"
+    GPT_4_TURBO: str = "gpt-4-turbo"
+
+# USD per million prompt and completion tokens, matched by model name prefix, longest first
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+def Estimate_Cost(model: str, promptTokens: int, completionTokens: int) -> float:
+    """
+    Estimates the cost of a run in USD from its token usage. Unknown models cost 0.
+    """
 
-class Stream_Handler(AssistantEventHandler):
-    def __init__(self, client: OpenAI, assistantName: str = 'Assistant'):
+    for prefix, (promptPrice, completionPrice) in MODEL_PRICES.items():
+        if model.startswith(prefix):
+            return (promptTokens * promptPrice + completionTokens * completionPrice) / 1_000_000
+    return 0.0
+
+class _Round_Handler(AssistantEventHandler):
+    """
+    Receives the events of one stream of a run and forwards them to the caller's Stream_Handler.
+    The SDK only lets an event handler be attached to a single stream, so a new one is created for every
+    tool round, while the state that spans rounds stays on the Stream_Handler.
+    """
+
+    def __init__(self, streamHandler: 'Stream_Handler'):
         super().__init__()
 
+        self.streamHandler = streamHandler
+
+    @override
+    def on_event(self, event) -> None:
+        self.streamHandler.on_event(event)
+
+    @override
+    def on_exception(self, exception) -> None:
+        self.streamHandler.on_exception(exception)
+
+    @override
+    def on_timeout(self) -> None:
+        self.streamHandler.on_timeout()
+
+    @override
+    def on_end(self) -> None:
+        self.streamHandler.on_end()
+
+    @override
+    def on_run_step_created(self, run_step) -> None:
+        self.streamHandler.on_run_step_created(run_step)
+
+    @override
+    def on_run_step_delta(self, delta, snapshot) -> None:
+        self.streamHandler.on_run_step_delta(delta, snapshot)
+
+    @override
+    def on_run_step_done(self, run_step) -> None:
+        self.streamHandler.on_run_step_done(run_step)
+
+    @override
+    def on_tool_call_created(self, tool_call) -> None:
+        self.streamHandler.on_tool_call_created(tool_call)
+
+    @override
+    def on_tool_call_delta(self, delta, snapshot) -> None:
+        self.streamHandler.on_tool_call_delta(delta, snapshot)
+
+    @override
+    def on_tool_call_done(self, tool_call) -> None:
+        self.streamHandler.on_tool_call_done(tool_call)
+
+    @override
+    def on_message_created(self, message) -> None:
+        self.streamHandler.on_message_created(message)
+
+    @override
+    def on_message_delta(self, delta, snapshot) -> None:
+        self.streamHandler.on_message_delta(delta, snapshot)
+
+    @override
+    def on_message_done(self, message) -> None:
+        self.streamHandler.on_message_done(message)
+
+    @override
+    def on_text_created(self, text) -> None:
+        self.streamHandler.on_text_created(text)
+
+    @override
+    def on_text_delta(self, delta, snapshot) -> None:
+        self.streamHandler.on_text_delta(delta, snapshot)
+
+    @override
+    def on_text_done(self, text) -> None:
+        self.streamHandler.on_text_done(text)
+
+    @override
+    def on_image_file_done(self, image_file) -> None:
+        self.streamHandler.on_image_file_done(image_file)
+
+class Stream_Handler:
+    """
+    Receives the events of a run, across every tool round, and writes its text to sinks.
+    Subclasses override the on_* hooks of the SDK's AssistantEventHandler, which are forwarded to them.
+    """
+
+    # Run events whose data is the run itself
+    RUN_EVENTS: tuple[str] = (
+        'thread.run.created',
+        'thread.run.queued',
+        'thread.run.in_progress',
+        'thread.run.requires_action',
+        'thread.run.cancelling',
+        'thread.run.completed',
+        'thread.run.failed',
+        'thread.run.cancelled',
+        'thread.run.expired',
+        'thread.run.incomplete'
+    )
+
+    def __init__(
+        self,
+        client: OpenAI,
+        assistantName: str = 'Assistant',
+        requestPolicy: Request_Policy | None = None,
+        sinks: list[Output_Sink] | None = None,
+        speechSinks: list[Output_Sink] | None = None
+    ):
         self.client = client
         self.assistantName = assistantName
+        self.requestPolicy = requestPolicy if requestPolicy is not None else Request_Policy()
+
+        # Every piece of displayed text is written to each sink, defaulting to the console
+        self.sinks: list[Output_Sink] = sinks if sinks is not None else [Console_Sink()]
+
+        # Only message text is written to speech sinks, without the name prefix, tool notices or sources
+        self.speechSinks: list[Output_Sink] = speechSinks if speechSinks is not None else []
+
+        # The text of every message completed during the run, in the order they completed
+        self.responseMessages: list[str] = []
+
+        # The run as of its last event, and as of its last terminal event, including runs continued after tool outputs
+        self.current_run: Run | None = None
+        self.finalRun: Run | None = None
+
+        # Tool outputs waiting to be submitted once the current stream ends
+        self.pendingToolOutputs: list[dict] | None = None
+
+        # The number of tool output rounds submitted during the run
+        self.toolRounds: int = 0
+
+        # The number of tool calls made during the run, by tool type
+        self.toolCalls: dict[str, int] = {}
+
+        # Called before tools run. Tools are skipped when it returns False
+        self.toolGate: Callable[[], bool] | None = None
+
+    def _Write(self, text: str) -> None:
+        """
+        **[ DO NOT OVERRIDE ]**
+        """
+        for sink in self.sinks:
+            sink.Write(text)
+
+    def _Flush(self) -> None:
+        """
+        **[ DO NOT OVERRIDE ]**
+        """
+        for sink in self.sinks:
+            sink.Flush()
 
-    @override
     def on_exception(self, exception) -> None:
-        print(f"|| Stream failed to complete: {exception} ||", flush=True)
+        self._Write(f"|| Stream failed to complete: {exception} ||\n")
+        self._Flush()
         raise Assistant_Error(
             message=f"Stream failed to complete. {exception}",
             code=303
         )
     
-    @override
-    def on_event(self, event):
+    def on_event(self, event) -> None:
         """
         **[ DO NOT OVERRIDE ]**
         """
+        if event.event in self.RUN_EVENTS:
+            self.current_run = event.data
+
         if event.event == 'thread.run.requires_action':
-            self.Handle_Required_Actions(data=event.data)
+            if self.toolGate is not None and not self.toolGate():
+                return
+
+            toolOutputs: list[dict] | None = self.Handle_Required_Actions(data=event.data)
+            if toolOutputs is not None:
+                self._Submit_Tool_Outputs(toolOutputs)
+
+        elif event.event == 'thread.message.completed':
+            # Only text blocks are kept, a message may also hold images or no content at all
+            text: str = ''.join(content.text.value for content in event.data.content if content.type == 'text')
+            if len(text) > 0:
+                self.responseMessages.append(text)
+
+        elif event.event in (
+            'thread.run.completed',
+            'thread.run.failed',
+            'thread.run.cancelled',
+            'thread.run.expired',
+            'thread.run.incomplete'
+        ):
+            self.finalRun = event.data
+
+    def Handle_Required_Actions(self, data: Run) -> list[dict] | None:
+        """
+        Handles the tool calls of a run that requires action.
+        Overrides either return the tool outputs or pass them to _Submit_Tool_Outputs.
+
+        Parameters:
+            data (Run): The run that requires action.
 
-    def Handle_Required_Actions(self, data: Run) -> None:
+        Returns:
+            list[dict] | None: The tool outputs, or None if they were passed to _Submit_Tool_Outputs.
+        """
         return None
 
     def _Submit_Tool_Outputs(self, toolOutputs: list[dict]) -> None:
         """
         **[ DO NOT OVERRIDE ]**
+
+        Queues the tool outputs for the current round. They are submitted by the assistant once the
+        current stream ends, and the continued run streams back to this same handler.
         """
-        with self.client.beta.threads.runs.submit_tool_outputs_stream(
-            thread_id=self.current_run.thread_id,
-            run_id=self.current_run.id,
-            tool_outputs=toolOutputs,
-            event_handler=Stream_Handler(
-                client=self.client,
-                assistantName=self.assistantName
-            )
-        ) as stream:
-            for text in stream.text_deltas:
-                print(text, end="", flush=True)
-            print()
+        self.pendingToolOutputs = toolOutputs
+
+    def _Begin_Round(self) -> _Round_Handler:
+        """
+        **[ DO NOT OVERRIDE ]**
+
+        Returns a new event handler for the next stream of the run, which forwards its events to this handler.
+        """
+        self.pendingToolOutputs = None
+        return _Round_Handler(self)
+
+    def on_timeout(self) -> None:
+        return None
+
+    def on_run_step_created(self, run_step) -> None:
+        return None
+
+    def on_run_step_delta(self, delta, snapshot) -> None:
+        return None
+
+    def on_run_step_done(self, run_step) -> None:
+        return None
+
+    def on_tool_call_delta(self, delta, snapshot) -> None:
+        return None
+
+    def on_tool_call_done(self, tool_call) -> None:
+        return None
+
+    def on_message_created(self, message) -> None:
+        return None
+
+    def on_message_delta(self, delta, snapshot) -> None:
+        return None
+
+    def on_image_file_done(self, image_file) -> None:
+        return None
 
-    @override
     def on_text_created(self, text) -> None:
-        print(f"{self.assistantName} > ", end="", flush=True)
+        self._Write(f"{self.assistantName} > ")
 
-    @override
     def on_text_delta(self, delta, snapshot) -> None:
-        print(delta.value, end="", flush=True)
+        self._Write(delta.value)
+        for sink in self.speechSinks:
+            sink.Write(delta.value)
 
-    @override
     def on_text_done(self, text) -> None:
-        return super().on_text_done(text)
+        self._Write("\n")
+        self._Flush()
+        for sink in self.speechSinks:
+            sink.Flush()
     
-    @override
     def on_tool_call_created(self, tool_call) -> None:
-        print(f"\n{self.assistantName} > Using the {tool_call.type.replace('_', ' ')} tool.", flush=True)
+        self.toolCalls[tool_call.type] = self.toolCalls.get(tool_call.type, 0) + 1
+        self._Write(f"\n{self.assistantName} > Using the {tool_call.type.replace('_', ' ')} tool.\n")
+        self._Flush()
+
+    def on_end(self) -> None:
+        self._Flush()
 
-    @override
     def on_message_done(self, message) -> None:
 
-        # Get message annotations
-        content = message.content[0].text
-        annotations: list = content.annotations
+        # Citations are only displayed
+        if len(self.sinks) == 0:
+            return
+
+        # Get the annotations of the message's text blocks
+        annotations: list = [
+            (block.text, annotation)
+            for block in message.content if block.type == 'text'
+            for annotation in block.text.annotations
+        ]
 
         # Build citations
         citations: list = []
-        for index, annotation in enumerate(annotations):
+        for index, (content, annotation) in enumerate(annotations):
             content.value = content.value.replace(
                 annotation.text, f"[{index}]"
             )
 
             if file_citation := getattr(annotation, "file_citation", None):
-                citedFile = self.client.files.retrieve(file_citation.file_id)
+                citedFile = self.requestPolicy.Execute(
+                    'files.retrieve',
+                    self.client.files.retrieve,
+                    file_citation.file_id,
+                    idempotent=True,
+                    hedge=True
+                )
                 citations.append(f"{citedFile.filename}")
 
         if (len(citations) > 0):
-            print(f"\nSources: ", end="", flush=True)
+            self._Write(f"\nSources: ")
             for i, x in enumerate(citations):
-                print(f"[{i}] {x}, ", end="", flush=True)
-            print("", end="\n", flush=True)
+                self._Write(f"[{i}] {x}, ")
+            self._Write("\n")
+            self._Flush()
 
 class Vector_Store:
     def __init__(
@@ -128,16 +385,23 @@ class Vector_Store:
         client: OpenAI, 
         id: str | None = None, 
         name: str | None = 'Vector_Store', 
-        lifeTime: int | None = 1
+        lifeTime: int | None = 1,
+        requestPolicy: Request_Policy | None = None,
+        localIndex: 'Local_Embedding_Index | None' = None
     ):
         # User defined attributes
         self.client = client
         self.id = id
         self.name = name
         self.lifeTime = lifeTime
+        self.requestPolicy = requestPolicy if requestPolicy is not None else Request_Policy()
+
+        # Optional local copy of the store's files, searched before a run starts
+        self.localIndex = localIndex
 
         # Default attributes
         self.files: dict[str, str] = {}
+        self.filePaths: dict[str, str] = {}
 
         # Retrieve the vector store
         self.instance = self.Retrieve_Vector_Store()
@@ -167,7 +431,13 @@ class Vector_Store:
 
         try:
             # Retrieve the vector store
-            return self.client.beta.vector_stores.retrieve(vector_store_id=self.id)
+            return self.requestPolicy.Execute(
+                'vector_stores.retrieve',
+                self.client.beta.vector_stores.retrieve,
+                vector_store_id=self.id,
+                idempotent=True,
+                hedge=True
+            )
         
         except Exception as e:
             raise Assistant_Error(
@@ -188,7 +458,9 @@ class Vector_Store:
 
         try:
             # Create the vector store
-            return self.client.beta.vector_stores.create(
+            return self.requestPolicy.Execute(
+                'vector_stores.create',
+                self.client.beta.vector_stores.create,
                 name=self.name,
                 expires_after={
                     "anchor": "last_active_at",
@@ -210,8 +482,11 @@ class Vector_Store:
                 print("Failed to delete attached files")
 
         # Delete the vector store
-        deletionResponse: VectorStoreDeleted = self.client.beta.vector_stores.delete(
-            vector_store_id=self.id
+        deletionResponse: VectorStoreDeleted = self.requestPolicy.Execute(
+            'vector_stores.delete',
+            self.client.beta.vector_stores.delete,
+            vector_store_id=self.id,
+            idempotent=True
         )
 
         # Check if the vector store was deleted
@@ -259,16 +534,23 @@ class Vector_Store:
                     code=403
                 )
 
-            # Upload and poll the file
-            vsFile: VectorStoreFile = self.client.beta.vector_stores.files.upload_and_poll(
-                vector_store_id=self.id,
-                file=fileStream
-            )
+            def _Upload_And_Poll(**kwargs) -> VectorStoreFile:
+                # Rewind the file so a retried upload sends the whole file
+                fileStream.seek(0)
+                return self.client.beta.vector_stores.files.upload_and_poll(**kwargs)
+
+            # Upload and poll the file, closing it once every attempt is done
+            with fileStream:
+                vsFile: VectorStoreFile = self.requestPolicy.Execute(
+                    'vector_stores.files.upload_and_poll',
+                    _Upload_And_Poll,
+                    vector_store_id=self.id,
+                    file=fileStream
+                )
 
             # Add the file to the files dictionary
             self.files[fileName] = vsFile.id
-
-            return True
+            self.filePaths[fileName] = filePath
 
         except Exception as e:
             raise Assistant_Error(
@@ -276,6 +558,22 @@ class Vector_Store:
                 code=402
             )
 
+        # Index the same file locally, skipping formats the local index cannot read
+        if self.localIndex is not None:
+            try:
+                self.localIndex.Add_File(fileName, filePath)
+
+            except ValueError:
+                pass
+
+            except Exception as e:
+                raise Assistant_Error(
+                    message=f"Failed to index file locally: {e}",
+                    code=408
+                )
+
+        return True
+
     def _Delete_File_By_Id(self, fileID: str) -> bool:
         """
         Deletes a file from the vector store by its ID.
@@ -293,8 +591,11 @@ class Vector_Store:
 
         try:
             # Delete the file
-            deletionResponse: VectorStoreFileDeleted = self.client.files.delete(
-                file_id=fileID
+            deletionResponse: VectorStoreFileDeleted = self.requestPolicy.Execute(
+                'files.delete',
+                self.client.files.delete,
+                file_id=fileID,
+                idempotent=True
             )
 
             if deletionResponse.deleted:
@@ -335,6 +636,9 @@ class Vector_Store:
         finally:
             if self._Delete_File_By_Id(fileID):
                 del self.files[fileName]
+                self.filePaths.pop(fileName, None)
+                if self.localIndex is not None:
+                    self.localIndex.Remove_File(fileName)
                 return True
         
     def Delete_All_Files(self) -> bool:
@@ -355,6 +659,51 @@ class Vector_Store:
         else:
             return False
 
+class Thread_Run_Queue:
+    """
+    Messages waiting for the active run on a thread to finish.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+
+        # Whether a run is currently being driven on the thread
+        self.active: bool = False
+
+        # Queued message texts and the time each was queued
+        self.pending: list[tuple[str, float]] = []
+
+class Usage_Budget:
+    """
+    Token and cost limits checked after every run.
+    """
+
+    def __init__(
+        self,
+        maxTurnTokens: int | None = None,
+        maxThreadTokens: int | None = None,
+        maxTotalTokens: int | None = None,
+        maxTotalCost: float | None = None,
+        onExceeded: Callable[[str, str, dict[str, any]], None] | None = None,
+        rolloverThreads: bool = False,
+    ):
+        """
+        Parameters:
+            maxTurnTokens (int | None): The total tokens a single run may use.
+            maxThreadTokens (int | None): The total tokens the runs on one thread may use before it is rolled over.
+            maxTotalTokens (int | None): The total tokens all runs may use.
+            maxTotalCost (float | None): The estimated USD cost all runs may use.
+            onExceeded (Callable[[str, str, dict[str, any]], None] | None): Called with the exceeded limit ('turn', 'thread', 'total' or 'cost'), the thread name and the run's usage, after every run that ends over a limit.
+            rolloverThreads (bool): Whether a thread over maxThreadTokens is replaced with a new thread under the same name.
+        """
+
+        self.maxTurnTokens = maxTurnTokens
+        self.maxThreadTokens = maxThreadTokens
+        self.maxTotalTokens = maxTotalTokens
+        self.maxTotalCost = maxTotalCost
+        self.onExceeded = onExceeded
+        self.rolloverThreads = rolloverThreads
+
 class Assistant_V2:
     def __init__(
         self, 
@@ -363,6 +712,10 @@ class Assistant_V2:
         name: str | None = 'Assistant',
         instructionPrompt: str | None = 'You are a simple chat bot.',
         languageModel: Language_Model | None = Language_Model.GPT_3_5_TURBO,
+        requestPolicy: Request_Policy | None = None,
+        usageBudget: Usage_Budget | None = None,
+        turnHistory: int = 500,
+        conversationLog: 'Conversation_Log | None' = None,
     ):
         # Set user defined attributes
         self.client = client
@@ -370,6 +723,11 @@ class Assistant_V2:
         self.name = name
         self.instructionPrompt = instructionPrompt
         self.languageModel = languageModel
+        self.requestPolicy = requestPolicy if requestPolicy is not None else Request_Policy()
+        self.usageBudget = usageBudget
+
+        # Optional local record of every message, tool call and run
+        self.conversationLog = conversationLog
 
         # Set default attributes
         self.threads: dict[str, str] = {}
@@ -377,6 +735,21 @@ class Assistant_V2:
             {"type": "file_search"}
         ]
         self.vectorStores: list[Vector_Store] = []
+        self.runQueues: dict[str, Thread_Run_Queue] = {}
+        self.runQueueMetrics: dict[str, float] = {
+            'messagesSubmitted': 0,
+            'messagesQueued': 0,
+            'runs': 0,
+            'coalescedMessages': 0,
+            'maxQueueDepth': 0,
+            'totalWaitSeconds': 0.0,
+            'maxWaitSeconds': 0.0,
+        }
+        self._runQueueLock = Lock()
+        self.usageMetrics: dict[str, any] = {**self._New_Usage_Counters(), 'budgetsExceeded': 0, 'threadRollovers': 0}
+        self.threadUsage: dict[str, dict[str, any]] = {}
+        self.turnUsage: deque[dict[str, any]] = deque(maxlen=turnHistory)
+        self._usageLock = Lock()
 
         # Retrieve the assistant
         self.instance: Assistant = self.Retrieve_Assistant()
@@ -428,6 +801,31 @@ class Assistant_V2:
             )
         return True
 
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the assistant's runtime metrics.
+
+        Returns:
+            dict[str, any]: The metrics, keyed by subsystem.
+        """
+
+        return {
+            'requests': self.requestPolicy.Get_Metrics(),
+            'runQueue': self.Get_Run_Queue_Metrics(),
+            'usage': self.Get_Usage_Metrics()
+        }
+
+    def Export_Metrics(self, filePath: str) -> None:
+        """
+        Writes the assistant's runtime metrics to a JSON file.
+
+        Parameters:
+            filePath (str): The path of the file to write.
+        """
+
+        with open(filePath, 'w', encoding='utf-8') as file:
+            json.dump(self.Get_Metrics(), file, indent=2)
+
     # # # #
     # 
     # Assistant Creation and Deletion Methods 
@@ -453,8 +851,12 @@ class Assistant_V2:
 
         # Retrieve the assistant
         try:
-            return self.client.beta.assistants.retrieve(
-                assistant_id=self.id
+            return self.requestPolicy.Execute(
+                'assistants.retrieve',
+                self.client.beta.assistants.retrieve,
+                assistant_id=self.id,
+                idempotent=True,
+                hedge=True
             )
         
         except Exception as e:
@@ -477,7 +879,9 @@ class Assistant_V2:
             self.Delete_Assistant()
 
         # Create a new assistant
-        self.instance = self.client.beta.assistants.create(
+        self.instance = self.requestPolicy.Execute(
+            'assistants.create',
+            self.client.beta.assistants.create,
             name=self.name,
             instructions=self.instructionPrompt,
             model=self.languageModel.value,
@@ -511,8 +915,11 @@ class Assistant_V2:
             return True
         
         # Delete the assistant
-        deletionResponse: AssistantDeleted = self.client.beta.assistants.delete(
-            assistant_id=self.id
+        deletionResponse: AssistantDeleted = self.requestPolicy.Execute(
+            'assistants.delete',
+            self.client.beta.assistants.delete,
+            assistant_id=self.id,
+            idempotent=True
         )
 
         # Check if the assistant was successfully deleted
@@ -554,8 +961,11 @@ class Assistant_V2:
 
         try:
             # Update the assistant
-            self.instance = self.client.beta.assistants.update(
+            self.instance = self.requestPolicy.Execute(
+                'assistants.update',
+                self.client.beta.assistants.update,
                 assistant_id=self.id,
+                idempotent=True,
                 name=name
             )
             
@@ -585,8 +995,11 @@ class Assistant_V2:
         
         try:
             # Update the assistant
-            self.instance = self.client.beta.assistants.update(
+            self.instance = self.requestPolicy.Execute(
+                'assistants.update',
+                self.client.beta.assistants.update,
                 assistant_id=self.id,
+                idempotent=True,
                 instructions=instructionPrompt
             )
             
@@ -617,8 +1030,11 @@ class Assistant_V2:
 
         try:
             # Update the assistant
-            self.instance = self.client.beta.assistants.update(
+            self.instance = self.requestPolicy.Execute(
+                'assistants.update',
+                self.client.beta.assistants.update,
                 assistant_id=self.id,
+                idempotent=True,
                 model=languageModel.value
             )
             
@@ -639,8 +1055,11 @@ class Assistant_V2:
 
         try:
             # Update the assistant
-            self.instance = self.client.beta.assistants.update(
+            self.instance = self.requestPolicy.Execute(
+                'assistants.update',
+                self.client.beta.assistants.update,
                 assistant_id=self.id,
+                idempotent=True,
                 tools=tools
             )
             
@@ -660,12 +1079,14 @@ class Assistant_V2:
     #
     # # # # 
 
-    def Create_Thread(self, threadName: str) -> str:
+    def Create_Thread(self, threadName: str, messages: list[dict[str, str]] | None = None) -> str:
         """
         Creates a new thread with the given name.
 
         Parameters:
             threadName (str): The name of the thread to create.
+            messages (list[dict[str, str]] | None): Messages to start the thread with, each with a "role" and "content",
+                e.g. context rebuilt from the conversation log.
 
         Returns:
             str: The ID of the created thread.
@@ -681,7 +1102,11 @@ class Assistant_V2:
         threadInstance: Thread = None
 
         # Create a new thread
-        threadInstance = self.client.beta.threads.create()
+        threadInstance = self.requestPolicy.Execute(
+            'threads.create',
+            self.client.beta.threads.create,
+            messages=messages if messages else NOT_GIVEN
+        )
 
         # Exception handling
         if threadInstance is None:
@@ -692,6 +1117,7 @@ class Assistant_V2:
 
         # Add the thread to the threads dictionary
         self.threads[threadName] = threadInstance.id
+        self._Log('thread', threadName, restoredMessages=len(messages) if messages else 0)
 
         # Return the thread ID
         return threadInstance.id
@@ -720,8 +1146,11 @@ class Assistant_V2:
         threadID: str = self.threads[threadName]
 
         # Delete the thread
-        deletionResponse: ThreadDeleted = self.client.beta.threads.delete(
-            thread_id=threadID
+        deletionResponse: ThreadDeleted = self.requestPolicy.Execute(
+            'threads.delete',
+            self.client.beta.threads.delete,
+            thread_id=threadID,
+            idempotent=True
         )
 
         # Check if the thread was successfully deleted
@@ -729,6 +1158,9 @@ class Assistant_V2:
 
             # Remove the thread from the threads dictionary
             del self.threads[threadName]
+            self.runQueues.pop(threadName, None)
+            with self._usageLock:
+                self.threadUsage.pop(threadName, None)
             return True
         
         # Raise an exception if the thread could not be deleted
@@ -753,8 +1185,12 @@ class Assistant_V2:
         
         try:
             # Retrieve the thread
-            return self.client.beta.threads.retrieve(
-                thread_id=threadID
+            return self.requestPolicy.Execute(
+                'threads.retrieve',
+                self.client.beta.threads.retrieve,
+                thread_id=threadID,
+                idempotent=True,
+                hedge=True
             )
 
         except Exception as e:
@@ -811,6 +1247,15 @@ class Assistant_V2:
             # Remove the old thread
             del self.threads[threadName]
 
+            # Move the thread's run queue
+            if threadName in self.runQueues:
+                self.runQueues[newName] = self.runQueues.pop(threadName)
+
+            # Move the thread's usage
+            with self._usageLock:
+                if threadName in self.threadUsage:
+                    self.threadUsage[newName] = self.threadUsage.pop(threadName)
+
             return True
 
         except Exception as e:
@@ -845,8 +1290,11 @@ class Assistant_V2:
         threadId: str = self.threads[threadName]
 
         try:
-            self.client.beta.threads.update(
+            self.requestPolicy.Execute(
+                'threads.update',
+                self.client.beta.threads.update,
                 thread_id=threadId,
+                idempotent=True,
                 tool_resources={"file_search":{
                     "vector_store_ids":[vectorStore.id]
                 }}
@@ -875,8 +1323,11 @@ class Assistant_V2:
         """
         
         try:
-            self.instance = self.client.beta.assistants.update(
+            self.instance = self.requestPolicy.Execute(
+                'assistants.update',
+                self.client.beta.assistants.update,
                 assistant_id=self.id,
+                idempotent=True,
                 tool_resources={"file_search":{
                     "vector_store_ids":[vectorStore.id]
                 }}
@@ -915,11 +1366,17 @@ class Assistant_V2:
         
         if threadName is None:
             # Link the vector store to the assistant
-            return self._Link_VS_To_Assistant(vectorStore=vectorStore)
+            linked: bool = self._Link_VS_To_Assistant(vectorStore=vectorStore)
 
         else:
             # Link the vector store to the thread
-            return self._Link_VS_To_Thread(threadName=threadName, vectorStore=vectorStore)
+            linked: bool = self._Link_VS_To_Thread(threadName=threadName, vectorStore=vectorStore)
+
+        # Remember the store so its local index is searched for new messages
+        if linked and vectorStore not in self.vectorStores:
+            self.vectorStores.append(vectorStore)
+
+        return linked
 
     # # # #
     # 
@@ -983,40 +1440,42 @@ class Assistant_V2:
 
         return messageStrings
     
-    def _Create_Run_Instance(self, threadID: str, assistantID: str) -> Run:
+    def _Retrieve_Local_Context(self, threadName: str, textContent: str) -> str | None:
+        """
+        Searches the local indexes of the linked vector stores for passages relevant to a message.
+        An index that fails, e.g. because the embedding request failed, is skipped, since the run can still
+        search the vector store itself.
         """
-        Creates a new run instance in the specified thread.
 
-        Parameters:
-            threadID (str): The ID of the thread to create the run in.
-            assistantID (str): The ID of the assistant to associate with the run.
+        contexts: list[str] = []
+        for vectorStore in self.vectorStores:
+            if vectorStore.localIndex is None:
+                continue
 
-        Returns:
-            Run: The created run instance.
+            try:
+                context: str | None = vectorStore.localIndex.Build_Context(textContent)
+            except Exception as e:
+                self._Log('context_failed', threadName, str(e), vectorStore=vectorStore.name)
+                continue
 
-        Raises
-            Assistant_Error: If the run creation fails.
-        """
+            if context is not None:
+                contexts.append(context)
 
-        try:
-            return self.client.beta.threads.runs.create_and_poll(
-                thread_id=threadID,
-                assistant_id=assistantID
-            )
-        
-        except Exception as e:
-            raise Assistant_Error(
-                message=f"Failed to create run instance. | {e}",
-                code=301
-            )
-    
-    def Create_Message(self, threadName: str, textContent: str) -> None:
+        return "\n\n".join(contexts) if len(contexts) > 0 else None
+
+    def Create_Message(self, threadName: str, textContent: str, role: str = "user", attachContext: bool = True) -> Message:
         """
         Creates a new message in the specified thread.
+        User messages have the most relevant passages of any linked vector store with a local index attached.
 
         Parameters:
             threadName (str): The name of the thread to which the message should be added.
             textContent (str): The content of the message to be created.
+            role (str): The role of the message's author, "user" or "assistant".
+            attachContext (bool): Whether passages from local indexes are attached to user messages.
+
+        Returns:
+            Message: The created message.
 
         Raises:
             Assistant_Error: If the thread does not exist or if the message could not be created.
@@ -1026,12 +1485,25 @@ class Assistant_V2:
         self._Verify_Existing_Thread_Name(threadName)
         
         try:
+            # Attach locally retrieved passages so the run can answer without a file search
+            messageContent: str = textContent
+            if attachContext and role == "user":
+                context: str | None = self._Retrieve_Local_Context(threadName, textContent)
+                if context is not None:
+                    messageContent = f"{textContent}\n\n{context}"
+
             # Create a new message
-            self.client.beta.threads.messages.create(
+            message: Message = self.requestPolicy.Execute(
+                'messages.create',
+                self.client.beta.threads.messages.create,
                 thread_id=self.threads[threadName],
-                role="user",
-                content=textContent
+                role=role,
+                content=messageContent
             )
+
+            # Log the text without attached passages, which can be retrieved again
+            self._Log('message', threadName, textContent, role=role, messageID=message.id, attachedContext=messageContent != textContent)
+            return message
         
         except Exception as e:
             raise Assistant_Error(
@@ -1039,58 +1511,281 @@ class Assistant_V2:
                 code=103
             )
     
-    def Static_Response(self, threadName: str) -> list[str]:
+    def Delete_Message(self, threadName: str, messageID: str) -> bool:
+        """
+        Deletes a message from the specified thread.
+
+        Parameters:
+            threadName (str): The name of the thread that contains the message.
+            messageID (str): The ID of the message to delete.
+
+        Returns:
+            bool: True if the message was deleted, False otherwise.
+
+        Raises:
+            Assistant_Error: If the thread does not exist or if the message could not be deleted.
+        """
+
+        # Verify that the thread exists
+        self._Verify_Existing_Thread_Name(threadName)
+
+        try:
+            # Delete the message
+            deleted: bool = self.requestPolicy.Execute(
+                'messages.delete',
+                self.client.beta.threads.messages.delete,
+                message_id=messageID,
+                thread_id=self.threads[threadName],
+                idempotent=True
+            ).deleted
+
+            if deleted:
+                self._Log('message_deleted', threadName, messageID=messageID)
+            return deleted
+
+        except Exception as e:
+            raise Assistant_Error(
+                message=f"Failed to delete message. | {e}",
+                code=106
+            )
+
+    def Cancel_Run(self, threadName: str, runID: str) -> Run:
+        """
+        Cancels a run on the specified thread.
+
+        Parameters:
+            threadName (str): The name of the thread the run belongs to.
+            runID (str): The ID of the run to cancel.
+
+        Returns:
+            Run: The run after the cancellation request.
+
+        Raises:
+            Assistant_Error: If the thread does not exist or if the run could not be cancelled.
+        """
+
+        # Verify that the thread exists
+        self._Verify_Existing_Thread_Name(threadName)
+
+        try:
+            # Cancel the run
+            return self.requestPolicy.Execute(
+                'runs.cancel',
+                self.client.beta.threads.runs.cancel,
+                run_id=runID,
+                thread_id=self.threads[threadName],
+                idempotent=True
+            )
+
+        except Exception as e:
+            raise Assistant_Error(
+                message=f"Failed to cancel run. | {e}",
+                code=305
+            )
+
+    def _Run_Stream(
+        self,
+        threadName: str,
+        streamHandler: Stream_Handler,
+        languageModel: Language_Model | None = None,
+        additionalMessages: list[dict[str, str]] | None = None,
+        onRunStarted: Callable[[Run], None] | None = None
+    ) -> Run | None:
+        """
+        Runs the assistant on a thread as a stream, handling every tool round in a flat loop.
+        The same stream handler receives the events of every round. Opening each stream is retried by the
+        request policy, but a stream that fails once its events have started is not.
+
+        If the thread name is not registered yet, the thread is created together with the run, and
+        registered under the name as soon as the run reports the thread's ID.
+
+        Parameters:
+            threadName (str): The name of the thread to run.
+            streamHandler (Stream_Handler): The stream handler that receives the run's events.
+            languageModel (Language_Model | None): The language model of this run only. Defaults to the assistant's model.
+            additionalMessages (list[dict[str, str]] | None): Messages added to the thread by the same request that starts the run.
+            onRunStarted (Callable[[Run], None] | None): Called once the first stream ends, if the run started.
+
+        Returns:
+            Run | None: The run as of its last event.
+
+        Raises:
+            Assistant_Error: If the run requires action and the stream handler provided no tool outputs.
+            Exception: If a stream could not be opened or failed to complete.
+        """
+
+        threadID: str | None = self.threads.get(threadName)
+        toolOutputs: list[dict] | None = None
+        startTime: float = time.perf_counter()
+        streamed: bool = False
+
+        try:
+            while True:
+                # Start the run, or continue it with the previous round's tool outputs
+                def Open_Stream() -> tuple[AssistantStreamManager, _Round_Handler]:
+                    roundHandler: _Round_Handler = streamHandler._Begin_Round()
+                    if toolOutputs is None and threadID is None:
+                        streamManager = self.client.beta.threads.create_and_run_stream(
+                            assistant_id=self.id,
+                            thread={"messages": additionalMessages} if additionalMessages else NOT_GIVEN,
+                            model=languageModel.value if languageModel is not None else NOT_GIVEN,
+                            event_handler=roundHandler
+                        )
+                    elif toolOutputs is None:
+                        streamManager = self.client.beta.threads.runs.stream(
+                            thread_id=threadID,
+                            assistant_id=self.id,
+                            additional_messages=additionalMessages if additionalMessages else NOT_GIVEN,
+                            model=languageModel.value if languageModel is not None else NOT_GIVEN,
+                            event_handler=roundHandler
+                        )
+                    else:
+                        streamManager = self.client.beta.threads.runs.submit_tool_outputs_stream(
+                            thread_id=threadID,
+                            run_id=run.id,
+                            tool_outputs=toolOutputs,
+                            event_handler=roundHandler
+                        )
+
+                    # Sends the request, raising on an error status before any event is read
+                    return streamManager, streamManager.__enter__()
+
+                # Opening the stream is retried, since a request rejected with an error status never started the run.
+                # Once events arrive the run exists, so a failure after that is not retried
+                streamManager, stream = self.requestPolicy.Execute(
+                    'runs.submit_tool_outputs_stream' if toolOutputs is not None else 'runs.stream' if threadID is not None else 'threads.create_and_run_stream',
+                    Open_Stream,
+                    idempotent=True
+                )
+
+                try:
+                    stream.until_done()
+
+                finally:
+                    streamManager.__exit__(None, None, None)
+
+                    # Register a thread created with the run, even if the stream failed after it started
+                    if threadID is None and streamHandler.current_run is not None:
+                        threadID = self._Register_Run_Thread(threadName, streamHandler.current_run.thread_id)
+
+                    if toolOutputs is None and onRunStarted is not None and streamHandler.current_run is not None:
+                        onRunStarted(streamHandler.current_run)
+
+                # Stop once the run no longer waits on tool outputs
+                run: Run | None = streamHandler.current_run
+                if run is None or run.status != 'requires_action':
+                    streamed = True
+                    return run
+
+                toolOutputs = streamHandler.pendingToolOutputs
+                self._Log_Tool_Round(threadName, run, toolOutputs)
+                if toolOutputs is None:
+                    # Release the thread rather than leave the run waiting until it expires
+                    self.Cancel_Run(threadName=threadName, runID=run.id)
+                    raise Assistant_Error(
+                        message="Run requires action, but the stream handler provided no tool outputs.",
+                        code=304
+                    )
+
+                streamHandler.toolRounds += 1
+
+        finally:
+            runID: str | None = streamHandler.current_run.id if streamHandler.current_run is not None else None
+            for responseMessage in streamHandler.responseMessages:
+                self._Log('message', threadName, responseMessage, role='assistant', runID=runID)
+
+            # Usage is always counted, but a failed stream is not checked against the budget,
+            # so a rollover or budget callback never runs in place of the stream's own error
+            self._Record_Run_Usage(
+                threadName=threadName,
+                run=streamHandler.current_run,
+                seconds=time.perf_counter() - startTime,
+                streamHandler=streamHandler,
+                checkBudget=streamed
+            )
+
+    def _Register_Run_Thread(self, threadName: str, threadID: str) -> str:
+        """
+        Registers a thread that was created together with a run.
+        """
+
+        self.threads[threadName] = threadID
+        self._Log('thread', threadName, createdWithRun=True)
+        return threadID
+
+    def Static_Response(self, threadName: str, streamHandler: Stream_Handler = None, languageModel: Language_Model | None = None) -> list[str]:
         """
         This method initiates a run to process user messages and returns a list of strings
         representing the assistant's response.
 
+        The run is consumed as an event stream, so text is collected as it arrives, tool calls are
+        handled by the stream handler's Handle_Required_Actions, and the method returns as soon as
+        the run completes instead of waiting on a polling interval.
+
         Parameters:
             threadName (str): The name of the thread to process.
+            streamHandler (Stream_Handler): The stream handler to use. If not provided, a stream handler without sinks is used.
+            languageModel (Language_Model | None): The language model of this run only. Defaults to the assistant's model.
 
         Returns:
-            list[str]: The strings of the assistant's response.
+            list[str]: The strings of the assistant's response, most recent first.
 
         Raises:
             Assistant_Error: If the thread does not exist, or if the run failed to complete.
         """
-        
+
+        # Collect the response without displaying it if a stream handler was not provided
+        if streamHandler is None:
+            streamHandler = Stream_Handler(
+                client=self.client,
+                assistantName=self.name,
+                requestPolicy=self.requestPolicy,
+                sinks=[]
+            )
+
         # Verify that the thread exists
         self._Verify_Existing_Thread_Name(threadName)
 
-        # Create a run
-        run: Run = self._Create_Run_Instance(
-            threadID=self.threads[threadName],
-            assistantID=self.id
-        )
+        try:
+            # Create a run and consume its events
+            self._Run_Stream(
+                threadName=threadName,
+                streamHandler=streamHandler,
+                languageModel=languageModel
+            )
 
-        if run.status == 'completed':
-            # Retrieve the messages in the thread
-            allMessages: list[Message] = self.client.beta.threads.messages.list(
-                thread_id=self.threads[threadName],
-            ).data
+        except Assistant_Error:
+            raise
 
-            # Filter for the assistant's response
-            filteredMessages: list[Message] = self._Filter_Assistant_Response(
-                messages=allMessages
+        except Exception as e:
+            raise Assistant_Error(
+                message=f"Failed to create run instance. | {e}",
+                code=301
             )
 
-            # Return the strings of the assistant's response
-            return self._Filter_Message_Strings(
-                messages=filteredMessages
+        # Check that the run, including any tool rounds, completed
+        finalRun: Run | None = streamHandler.finalRun if streamHandler.finalRun is not None else streamHandler.current_run
+        if finalRun is None or finalRun.status != 'completed':
+            raise Assistant_Error(
+                message=f"Run failed to complete. | {finalRun.status if finalRun else 'no final status'}",
+                code=302
             )
 
-        raise Assistant_Error(
-            message=f"Run failed to complete. | {run.status}",
-            code=302
-        )
+        # Return the strings of the assistant's response
+        return list(reversed(streamHandler.responseMessages))
     
-    def Stream_Response(self, threadName: str, streamHandler: Stream_Handler = None) -> None:
+    def Stream_Response(self, threadName: str, streamHandler: Stream_Handler = None, languageModel: Language_Model | None = None) -> Run | None:
         """
-        This method initiates a run to process user messages and streams the assistant's response to the console.
+        This method initiates a run to process user messages and streams the assistant's response to the stream handler's sinks.
+        Tool rounds are handled in place, and the same stream handler receives every round.
 
         Parameters:
             threadName (str): The name of the thread to process.
             streamHandler (Stream_Handler): The stream handler to use. If not provided, a default stream handler is used.
+            languageModel (Language_Model | None): The language model of this run only. Defaults to the assistant's model.
+
+        Returns:
+            Run | None: The run as of its last event.
 
         Raises:
             Assistant_Error: If the thread does not exist, or if the run failed to complete.
@@ -1100,7 +1795,8 @@ class Assistant_V2:
         if streamHandler is None:
             streamHandler = Stream_Handler(
                 client=self.client,
-                assistantName=self.name
+                assistantName=self.name,
+                requestPolicy=self.requestPolicy
             )
 
         # Verify that the thread exists
@@ -1108,15 +1804,456 @@ class Assistant_V2:
 
         try:
             # Create a stream
-            with self.client.beta.threads.runs.stream(
-                thread_id=self.threads[threadName],
-                assistant_id=self.id,
-                event_handler=streamHandler
-            ) as stream:
-                stream.until_done()
+            return self._Run_Stream(
+                threadName=threadName,
+                streamHandler=streamHandler,
+                languageModel=languageModel
+            )
+
+        except Assistant_Error:
+            raise
+
+        except Exception as e:
+            raise Assistant_Error(
+                message=f"Stream failed to complete. | {e}",
+                code=303
+            )
+
+    def Send_And_Stream(
+        self,
+        threadName: str,
+        textContent: str,
+        streamHandler: Stream_Handler = None,
+        languageModel: Language_Model | None = None,
+        attachContext: bool = True
+    ) -> Run | None:
+        """
+        Sends a user message and streams the assistant's response with a single request.
+        The message is added by the request that starts the run, and a thread name that is not registered
+        yet gets a new thread created by that same request, so no separate round trip precedes the stream.
+
+        Parameters:
+            threadName (str): The name of the thread. A new thread is created if the name is not registered.
+            textContent (str): The content of the message.
+            streamHandler (Stream_Handler): The stream handler to use. If not provided, a default stream handler is used.
+            languageModel (Language_Model | None): The language model of this run only. Defaults to the assistant's model.
+            attachContext (bool): Whether passages from local indexes are attached to the message.
+
+        Returns:
+            Run | None: The run as of its last event.
+
+        Raises:
+            Assistant_Error: As Create_Thread if a new thread could not be created, as Create_Message if the message
+            could not be added, and as Stream_Response if the run failed after it started.
+        """
+
+        # Check if a stream handler was provided
+        if streamHandler is None:
+            streamHandler = Stream_Handler(
+                client=self.client,
+                assistantName=self.name,
+                requestPolicy=self.requestPolicy
+            )
+
+        newThread: bool = threadName not in self.threads
+
+        # Attach locally retrieved passages so the run can answer without a file search
+        messageContent: str = textContent
+        if attachContext:
+            context: str | None = self._Retrieve_Local_Context(threadName, textContent)
+            if context is not None:
+                messageContent = f"{textContent}\n\n{context}"
+
+        try:
+            # Log the text without attached passages, once it is known to be in the thread
+            run: Run | None = self._Run_Stream(
+                threadName=threadName,
+                streamHandler=streamHandler,
+                languageModel=languageModel,
+                additionalMessages=[{"role": "user", "content": messageContent}],
+                onRunStarted=lambda startedRun: self._Log(
+                    'message', threadName, textContent, role='user', runID=startedRun.id, attachedContext=messageContent != textContent
+                )
+            )
+
+        except Assistant_Error:
+            raise
 
         except Exception as e:
+            # Until the run starts, neither the thread nor the message exist
+            if streamHandler.current_run is None and newThread:
+                raise Assistant_Error(
+                    message=f"Failed to create thread. | {e}",
+                    code=101
+                )
+
+            if streamHandler.current_run is None:
+                raise Assistant_Error(
+                    message=f"Failed to create message. | {e}",
+                    code=103
+                )
+
             raise Assistant_Error(
                 message=f"Stream failed to complete. | {e}",
                 code=303
-            )
\ No newline at end of file
+            )
+
+        return run
+
+    # # # #
+    # 
+    # Assistant Run Queue Methods 
+    #
+    # # # # 
+
+    def _Get_Run_Queue(self, threadName: str) -> Thread_Run_Queue:
+        """
+        Returns the run queue of a thread, creating it if needed.
+        """
+
+        with self._runQueueLock:
+            if threadName not in self.runQueues:
+                self.runQueues[threadName] = Thread_Run_Queue()
+            return self.runQueues[threadName]
+
+    def Submit_Message(
+        self,
+        threadName: str,
+        textContent: str,
+        streamHandlerFactory: Callable[[], Stream_Handler] | None = None
+    ) -> bool:
+        """
+        Submits a user message to a thread without conflicting with an active run.
+
+        If no run is active on the thread, the message is sent and its response is streamed by this call.
+        If a run is active, the message is queued and this call returns immediately. When the active run
+        finishes, every queued message is merged into a single message and answered by one follow-up run,
+        streamed by the call that started the first run.
+
+        Parameters:
+            threadName (str): The name of the thread to send the message to.
+            textContent (str): The content of the message.
+            streamHandlerFactory (Callable[[], Stream_Handler] | None): Creates a stream handler for each run. If not provided, the default stream handler is used.
+
+        Returns:
+            bool: True if this call streamed the response, False if the message was queued for a follow-up run.
+
+        Raises:
+            Assistant_Error: If the thread does not exist, or if a message or run fails. If the merged message
+            could not be sent, the queued messages in it go back to the head of the queue and are sent with the
+            next submitted message, while this call's own message is left to its caller. If the run failed after
+            it started, the merged message is already in the thread and is not sent again.
+        """
+
+        # Verify that the thread exists
+        self._Verify_Existing_Thread_Name(threadName)
+
+        runQueue: Thread_Run_Queue = self._Get_Run_Queue(threadName)
+        entry: tuple[str, float] = (textContent, time.monotonic())
+
+        with runQueue.lock:
+            runQueue.pending.append(entry)
+            self._Record_Run_Queue_Submission(queued=runQueue.active, depth=len(runQueue.pending))
+
+            # Leave the message for the call that is driving the active run
+            if runQueue.active:
+                return False
+
+            runQueue.active = True
+
+        try:
+            while True:
+                # Take every queued message, or stop once the queue is empty
+                with runQueue.lock:
+                    if len(runQueue.pending) == 0:
+                        runQueue.active = False
+                        return True
+
+                    batch: list[tuple[str, float]] = runQueue.pending
+                    runQueue.pending = []
+
+                self._Record_Run_Queue_Batch(batch)
+
+                streamHandler: Stream_Handler = streamHandlerFactory() if streamHandlerFactory is not None else Stream_Handler(
+                    client=self.client,
+                    assistantName=self.name,
+                    requestPolicy=self.requestPolicy
+                )
+
+                # Merge the queued messages into a single follow-up turn, sent with the run that answers it
+                try:
+                    self.Send_And_Stream(
+                        threadName=threadName,
+                        textContent="\n".join(text for text, _ in batch),
+                        streamHandler=streamHandler
+                    )
+
+                except Exception:
+                    # Messages that never reached the thread are put back for the next submission, since their
+                    # callers were told they would be answered. This call's own message fails with the error instead
+                    if streamHandler.current_run is None:
+                        with runQueue.lock:
+                            runQueue.pending[:0] = [item for item in batch if item is not entry]
+                    raise
+
+        except Exception:
+            with runQueue.lock:
+                runQueue.active = False
+            raise
+
+    def _Record_Run_Queue_Submission(self, queued: bool, depth: int) -> None:
+        with self._runQueueLock:
+            self.runQueueMetrics['messagesSubmitted'] += 1
+            if queued:
+                self.runQueueMetrics['messagesQueued'] += 1
+            self.runQueueMetrics['maxQueueDepth'] = max(self.runQueueMetrics['maxQueueDepth'], depth)
+
+    def _Record_Run_Queue_Batch(self, batch: list[tuple[str, float]]) -> None:
+        now: float = time.monotonic()
+
+        with self._runQueueLock:
+            self.runQueueMetrics['runs'] += 1
+            self.runQueueMetrics['coalescedMessages'] += len(batch) - 1
+
+            for _, queuedAt in batch:
+                waitSeconds: float = now - queuedAt
+                self.runQueueMetrics['totalWaitSeconds'] += waitSeconds
+                self.runQueueMetrics['maxWaitSeconds'] = max(self.runQueueMetrics['maxWaitSeconds'], waitSeconds)
+
+    def Get_Run_Queue_Metrics(self) -> dict[str, any]:
+        """
+        Returns the run queue metrics, including the current queue depth of each thread.
+
+        Returns:
+            dict[str, any]: The run queue metrics.
+        """
+
+        with self._runQueueLock:
+            metrics: dict[str, any] = dict(self.runQueueMetrics)
+            runQueues: dict[str, Thread_Run_Queue] = dict(self.runQueues)
+
+        started: int = metrics['messagesSubmitted'] - sum(len(q.pending) for q in runQueues.values())
+        metrics['averageWaitSeconds'] = metrics['totalWaitSeconds'] / started if started > 0 else 0.0
+        metrics['queueDepth'] = {
+            threadName: len(runQueue.pending)
+            for threadName, runQueue in runQueues.items()
+        }
+        metrics['activeRuns'] = sum(1 for runQueue in runQueues.values() if runQueue.active)
+
+        return metrics
+
+    # # # #
+    # 
+    # Assistant Usage Methods 
+    #
+    # # # # 
+
+    def _New_Usage_Counters(self) -> dict[str, any]:
+        return {
+            'runs': 0,
+            'failedRuns': 0,
+            'promptTokens': 0,
+            'completionTokens': 0,
+            'totalTokens': 0,
+            'costUSD': 0.0,
+            'totalSeconds': 0.0,
+            'maxSeconds': 0.0,
+            'toolRounds': 0,
+            'toolCalls': {},
+        }
+
+    def _Add_Usage(self, counters: dict[str, any], turn: dict[str, any]) -> None:
+        counters['runs'] += 1
+        if turn['status'] != 'completed':
+            counters['failedRuns'] += 1
+
+        for key in ('promptTokens', 'completionTokens', 'totalTokens', 'costUSD', 'toolRounds'):
+            counters[key] += turn[key]
+        counters['totalSeconds'] += turn['seconds']
+        counters['maxSeconds'] = max(counters['maxSeconds'], turn['seconds'])
+
+        for toolType, count in turn['toolCalls'].items():
+            counters['toolCalls'][toolType] = counters['toolCalls'].get(toolType, 0) + count
+
+    def _Log(self, kind: str, threadName: str, content: str = '', role: str | None = None, **data: any) -> None:
+        """
+        Queues an event in the conversation log, if there is one.
+        """
+
+        if self.conversationLog is not None:
+            self.conversationLog.Log(kind, content, threadName, self.threads.get(threadName), role, **data)
+
+    def _Log_Tool_Round(self, threadName: str, run: Run, toolOutputs: list[dict] | None) -> None:
+        """
+        Logs the function calls of a run that requires action, and the outputs submitted for them.
+        """
+
+        if self.conversationLog is None or run.required_action is None:
+            return
+
+        outputs: dict[str, str] = {output['tool_call_id']: output['output'] for output in toolOutputs or []}
+        for toolCall in run.required_action.submit_tool_outputs.tool_calls:
+            self._Log('tool_call', threadName, toolCall.function.arguments, runID=run.id, callID=toolCall.id, name=toolCall.function.name)
+            if toolCall.id in outputs:
+                self._Log('tool_output', threadName, str(outputs[toolCall.id]), runID=run.id, callID=toolCall.id, name=toolCall.function.name)
+
+    def _Record_Run_Usage(self, threadName: str, run: Run | None, seconds: float, streamHandler: Stream_Handler, checkBudget: bool = True) -> None:
+        """
+        Adds a run's token usage, duration and tool rounds to the per-thread and global counters,
+        then checks the usage budget if `checkBudget` is set. Never raises, since it runs as a stream ends.
+        """
+
+        usage = run.usage if run is not None else None
+        model: str = run.model if run is not None else (self.languageModel.value if self.languageModel else '')
+        promptTokens: int = usage.prompt_tokens if usage is not None else 0
+        completionTokens: int = usage.completion_tokens if usage is not None else 0
+
+        turn: dict[str, any] = {
+            'threadName': threadName,
+            'runID': run.id if run is not None else None,
+            'model': model,
+            'status': run.status if run is not None else 'not_started',
+            'promptTokens': promptTokens,
+            'completionTokens': completionTokens,
+            'totalTokens': promptTokens + completionTokens,
+            'costUSD': Estimate_Cost(model, promptTokens, completionTokens),
+            'seconds': seconds,
+            'toolRounds': streamHandler.toolRounds,
+            'toolCalls': dict(streamHandler.toolCalls),
+            'finishedAt': time.time(),
+        }
+
+        with self._usageLock:
+            threadCounters: dict[str, any] = self.threadUsage.setdefault(threadName, {
+                **self._New_Usage_Counters(),
+                'threadTokens': 0,
+                'rollovers': 0,
+                'previousThreadIDs': [],
+            })
+
+            self._Add_Usage(self.usageMetrics, turn)
+            self._Add_Usage(threadCounters, turn)
+            threadCounters['threadTokens'] += turn['totalTokens']
+            self.turnUsage.append(turn)
+
+            threadTokens: int = threadCounters['threadTokens']
+            totalTokens: int = self.usageMetrics['totalTokens']
+            totalCost: float = self.usageMetrics['costUSD']
+
+        self._Log('run', threadName, **{key: value for key, value in turn.items() if key != 'threadName'})
+
+        # Only finished runs count against the budget
+        budget: Usage_Budget | None = self.usageBudget
+        if not checkBudget or budget is None or run is None or run.status in ('queued', 'in_progress', 'requires_action', 'cancelling'):
+            return
+
+        exceeded: list[str] = []
+        if budget.maxTurnTokens is not None and turn['totalTokens'] > budget.maxTurnTokens:
+            exceeded.append('turn')
+        if budget.maxThreadTokens is not None and threadTokens > budget.maxThreadTokens:
+            exceeded.append('thread')
+        if budget.maxTotalTokens is not None and totalTokens > budget.maxTotalTokens:
+            exceeded.append('total')
+        if budget.maxTotalCost is not None and totalCost > budget.maxTotalCost:
+            exceeded.append('cost')
+
+        for limit in exceeded:
+            with self._usageLock:
+                self.usageMetrics['budgetsExceeded'] += 1
+
+            if budget.onExceeded is not None:
+                try:
+                    budget.onExceeded(limit, threadName, turn)
+                except Exception as e:
+                    self._Log('budget_callback_failed', threadName, str(e), limit=limit)
+
+        # A failed rollover leaves the full thread in use, and is tried again after the next run
+        if 'thread' in exceeded and budget.rolloverThreads and threadName in self.threads:
+            try:
+                self.Rollover_Thread(threadName)
+            except Assistant_Error as e:
+                self._Log('rollover_failed', threadName, str(e))
+
+    def Rollover_Thread(self, threadName: str) -> str:
+        """
+        Replaces a thread with a new, empty thread under the same name, keeping its linked vector stores.
+        The old thread is not deleted.
+
+        Parameters:
+            threadName (str): The name of the thread to roll over.
+
+        Returns:
+            str: The ID of the new thread.
+
+        Raises:
+            Assistant_Error: If the thread does not exist or if the new thread could not be created.
+        """
+
+        # Verify that the thread exists
+        self._Verify_Existing_Thread_Name(threadName)
+
+        oldThreadID: str = self.threads[threadName]
+
+        try:
+            # Carry the old thread's vector stores over to the new one
+            oldThread: Thread = self.Retrieve_Thread_By_Id(oldThreadID)
+            toolResources = oldThread.tool_resources.model_dump(exclude_none=True) if oldThread.tool_resources else None
+
+            newThread: Thread = self.requestPolicy.Execute(
+                'threads.create',
+                self.client.beta.threads.create,
+                tool_resources=toolResources if toolResources else NOT_GIVEN
+            )
+
+        except Exception as e:
+            raise Assistant_Error(
+                message=f"Failed to roll over thread. | {e}",
+                code=107
+            )
+
+        self.threads[threadName] = newThread.id
+        self._Log('thread', threadName, previousThreadID=oldThreadID)
+
+        with self._usageLock:
+            threadCounters: dict[str, any] | None = self.threadUsage.get(threadName)
+            if threadCounters is not None:
+                threadCounters['threadTokens'] = 0
+                threadCounters['rollovers'] += 1
+                threadCounters['previousThreadIDs'].append(oldThreadID)
+            self.usageMetrics['threadRollovers'] += 1
+
+        return newThread.id
+
+    def Get_Usage_Metrics(self, threadName: str | None = None, recentTurns: int = 20) -> dict[str, any]:
+        """
+        Returns the token usage, estimated cost, run duration and tool rounds of the assistant's runs.
+
+        Parameters:
+            threadName (str | None): Only return the usage of this thread, and its recent turns.
+            recentTurns (int): The number of most recent turns to include.
+
+        Returns:
+            dict[str, any]: The global or per-thread counters, the per-thread counters and the recent turns.
+        """
+
+        with self._usageLock:
+            if threadName is None:
+                metrics: dict[str, any] = dict(self.usageMetrics)
+                metrics['threads'] = {
+                    name: {**counters, 'toolCalls': dict(counters['toolCalls'])}
+                    for name, counters in self.threadUsage.items()
+                }
+            else:
+                metrics: dict[str, any] = dict(self.threadUsage.get(threadName, self._New_Usage_Counters()))
+
+            metrics['toolCalls'] = dict(metrics['toolCalls'])
+            turns: list[dict[str, any]] = [
+                dict(turn) for turn in self.turnUsage
+                if threadName is None or turn['threadName'] == threadName
+            ]
+
+        metrics['averageSeconds'] = metrics['totalSeconds'] / metrics['runs'] if metrics['runs'] > 0 else 0.0
+        metrics['averageTokens'] = metrics['totalTokens'] / metrics['runs'] if metrics['runs'] > 0 else 0.0
+        metrics['recentTurns'] = turns[-recentTurns:] if recentTurns > 0 else []
+
+        return metrics
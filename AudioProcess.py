@@ -0,0 +1,679 @@
+"""
+Process-Isolated Audio
+
+Runs microphone capture and speaker playback in their own worker processes, so stream parsing,
+JSON decoding and tools in the main process cannot starve the audio callbacks. Each worker
+exchanges 16-bit PCM with the main process through a single-producer, single-consumer ring
+buffer in shared memory.
+
+The ring buffer takes no locks. The producer only moves the write index and the consumer only
+moves the read index, each after copying the frames, and readers see the frames as memoryviews
+of the shared memory. Each side counts its own overruns (frames dropped because the ring was
+full) and underruns (frames missing when the device needed them).
+
+Workers are started with `python -m AudioProcess`, so the main script is never re-imported, and
+they exit when the main process closes their stdin or exits.
+"""
+# Imports
+from multiprocessing import shared_memory, resource_tracker
+from threading import Thread
+import speech_recognition as sr
+import subprocess
+import time
+import sys
+import os
+
+# Header slots, as unsigned 64-bit integers. The indices sit on separate cache lines
+WRITE_INDEX: int = 0
+READ_INDEX: int = 8
+OVERRUNS: int = 16
+UNDERRUNS: int = 17
+DROPPED_BYTES: int = 18
+DEVICE_XRUNS: int = 19
+STATE: int = 20
+SAMPLE_RATE: int = 21
+SAMPLE_WIDTH: int = 22
+CHANNELS: int = 23
+CONSUMING: int = 24
+CLIP_END: int = 25
+CLOCK_NS: int = 26
+CLOCK_INDEX: int = 27
+HEADER_BYTES: int = 256
+
+# Worker states
+STARTING: int = 0
+READY: int = 1
+STOPPING: int = 2
+FAILED: int = 3
+
+class Shared_Ring_Buffer:
+    """
+    A lock-free single-producer, single-consumer byte ring in shared memory.
+    Indices count every byte ever written or read, so the ring is full when they differ by its capacity.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner
+        self.name: str = memory.name
+        self.header: memoryview = memory.buf[:HEADER_BYTES].cast('Q')
+        self.data: memoryview = memory.buf[HEADER_BYTES:]
+        self.capacity: int = len(self.data)
+
+    @classmethod
+    def Create(cls, capacity: int) -> 'Shared_Ring_Buffer':
+        """
+        Creates a ring buffer. The creator unlinks the shared memory when it closes the ring.
+
+        Parameters:
+            capacity (int): The number of bytes the ring holds.
+
+        Returns:
+            Shared_Ring_Buffer: The ring buffer.
+        """
+
+        memory: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + capacity)
+        memory.buf[:HEADER_BYTES] = bytes(HEADER_BYTES)
+        ring: Shared_Ring_Buffer = cls(memory, owner=True)
+
+        # Some platforms round the size up
+        ring.data = ring.data[:capacity]
+        ring.capacity = capacity
+        return ring
+
+    @classmethod
+    def Attach(cls, name: str, capacity: int) -> 'Shared_Ring_Buffer':
+        """
+        Attaches to a ring buffer created by another process.
+
+        Parameters:
+            name (str): The name of the shared memory.
+            capacity (int): The number of bytes the ring holds.
+
+        Returns:
+            Shared_Ring_Buffer: The ring buffer.
+        """
+
+        memory: shared_memory.SharedMemory = shared_memory.SharedMemory(name=name)
+
+        # Only the creator may unlink the memory, so the attaching process must not track it
+        if os.name != 'nt':
+            resource_tracker.unregister(memory._name, 'shared_memory')
+
+        ring: Shared_Ring_Buffer = cls(memory, owner=False)
+        ring.data = ring.data[:capacity]
+        ring.capacity = capacity
+        return ring
+
+    # # # #
+    #
+    # Producer Methods
+    #
+    # # # #
+
+    def Free(self) -> int:
+        """
+        Returns the number of bytes that can be written.
+        """
+
+        return self.capacity - (self.header[WRITE_INDEX] - self.header[READ_INDEX])
+
+    def Write(self, data: bytes | memoryview, partial: bool = False) -> int:
+        """
+        Copies data into the ring and publishes it. Producer only.
+
+        Parameters:
+            data (bytes | memoryview): The data to write.
+            partial (bool): Whether to write as much as fits. Otherwise data that does not fit is dropped whole and counted as an overrun.
+
+        Returns:
+            int: The number of bytes written.
+        """
+
+        size: int = len(data)
+        free: int = self.Free()
+        if size > free:
+            if not partial:
+                self.header[OVERRUNS] += 1
+                self.header[DROPPED_BYTES] += size
+                return 0
+            size = free
+
+        if size == 0:
+            return 0
+
+        writeIndex: int = self.header[WRITE_INDEX]
+        start: int = writeIndex % self.capacity
+        first: int = min(size, self.capacity - start)
+        self.data[start:start + first] = data[:first]
+        if first < size:
+            self.data[:size - first] = data[first:size]
+
+        # Publish only after the frames are in place
+        self.header[WRITE_INDEX] = writeIndex + size
+        return size
+
+    # # # #
+    #
+    # Consumer Methods
+    #
+    # # # #
+
+    def Available(self) -> int:
+        """
+        Returns the number of bytes that can be read.
+        """
+
+        return self.header[WRITE_INDEX] - self.header[READ_INDEX]
+
+    def Peek(self, size: int) -> list[memoryview]:
+        """
+        Returns views of the next bytes without copying or consuming them. Consumer only.
+        The views are valid until Advance is called.
+
+        Parameters:
+            size (int): The most bytes to view.
+
+        Returns:
+            list[memoryview]: One view, or two if the bytes wrap around the end of the ring.
+        """
+
+        size = min(size, self.Available())
+        if size == 0:
+            return []
+
+        start: int = self.header[READ_INDEX] % self.capacity
+        first: int = min(size, self.capacity - start)
+        if first == size:
+            return [self.data[start:start + size]]
+        return [self.data[start:start + first], self.data[:size - first]]
+
+    def Advance(self, size: int) -> None:
+        """
+        Consumes bytes, making their space writable again. Consumer only.
+        """
+
+        self.header[READ_INDEX] += size
+
+    def Read(self, size: int) -> bytes:
+        """
+        Copies out and consumes up to `size` bytes. Consumer only.
+        """
+
+        views: list[memoryview] = self.Peek(size)
+        data: bytes = b''.join(views)
+        for view in views:
+            view.release()
+
+        self.Advance(len(data))
+        return data
+
+    def Skip_To_End(self) -> int:
+        """
+        Drops every unread byte. Consumer only.
+
+        Returns:
+            int: The number of bytes dropped.
+        """
+
+        writeIndex: int = self.header[WRITE_INDEX]
+        skipped: int = writeIndex - self.header[READ_INDEX]
+        self.header[READ_INDEX] = writeIndex
+        return skipped
+
+    # # # #
+    #
+    # Shared State Methods
+    #
+    # # # #
+
+    def Get(self, slot: int) -> int:
+        return self.header[slot]
+
+    def Set(self, slot: int, value: int) -> None:
+        self.header[slot] = value
+
+    def Add(self, slot: int, value: int = 1) -> None:
+        # Each counter has a single writer, so this does not race
+        self.header[slot] += value
+
+    def Get_Counters(self) -> dict[str, int]:
+        """
+        Returns the ring's fill level and xrun counters.
+        """
+
+        return {
+            'capacityBytes': self.capacity,
+            'bufferedBytes': self.Available(),
+            'overruns': self.header[OVERRUNS],
+            'underruns': self.header[UNDERRUNS],
+            'droppedBytes': self.header[DROPPED_BYTES],
+            'deviceXruns': self.header[DEVICE_XRUNS],
+        }
+
+    def Close(self) -> None:
+        """
+        Detaches from the ring, and frees the shared memory if this process created it.
+        """
+
+        self.header.release()
+        self.data.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+"""
+Main Process
+"""
+class Audio_Worker:
+    """
+    A worker process that owns one audio device and one ring buffer.
+    """
+
+    def __init__(self, role: str, deviceIndex: int | None, sampleRate: int | None, channels: int, bufferSeconds: float, chunkSize: int):
+        self.role = role
+        self.deviceIndex = deviceIndex
+        self.sampleRate = sampleRate
+        self.channels = channels
+        self.bufferSeconds = bufferSeconds
+        self.chunkSize = chunkSize
+
+        # Default attributes
+        self.ring: Shared_Ring_Buffer | None = None
+        self.process: subprocess.Popen | None = None
+        self.sampleWidth: int = 2
+
+    def Start(self, timeout: float = 10.0) -> None:
+        """
+        Starts the worker and waits until its device is open.
+
+        Parameters:
+            timeout (float): The most seconds to wait.
+
+        Raises:
+            OSError: If the worker could not open its device in time.
+        """
+
+        # Size the ring for the worst case sample rate until the device's rate is known
+        capacity: int = int(self.bufferSeconds * (self.sampleRate or 48000) * self.sampleWidth * self.channels)
+        self.ring = Shared_Ring_Buffer.Create(capacity)
+
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'AudioProcess', self.role, self.ring.name, str(capacity),
+                str(self.deviceIndex if self.deviceIndex is not None else -1),
+                str(self.sampleRate or 0), str(self.channels), str(self.chunkSize)
+            ],
+            stdin=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+
+        deadline: float = time.monotonic() + timeout
+        while self.ring.Get(STATE) == STARTING:
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.Stop()
+                raise OSError(f"The {self.role} worker could not open its audio device.")
+            time.sleep(0.01)
+
+        if self.ring.Get(STATE) == FAILED:
+            self.Stop()
+            raise OSError(f"The {self.role} worker could not open its audio device.")
+
+        self.sampleRate = self.ring.Get(SAMPLE_RATE)
+
+    def Is_Alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None and self.ring.Get(STATE) == READY
+
+    def Stop(self, timeout: float = 2.0) -> None:
+        """
+        Stops the worker and frees the ring buffer.
+        """
+
+        if self.process is not None:
+            self.ring.Set(STATE, STOPPING)
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+            self.process = None
+
+        if self.ring is not None:
+            self.ring.Close()
+            self.ring = None
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the ring's fill level and overrun and underrun counters.
+
+        Returns:
+            dict[str, any]: The worker metrics.
+        """
+
+        if self.ring is None:
+            return {'running': False}
+        return {'running': self.Is_Alive(), 'sampleRate': self.sampleRate, **self.ring.Get_Counters()}
+
+class Capture_Process(Audio_Worker):
+    """
+    Captures a microphone in a worker process. Frames are only kept while a consumer is attached.
+    """
+
+    def __init__(self, deviceIndex: int | None = None, sampleRate: int | None = None, chunkSize: int = 1024, bufferSeconds: float = 5.0):
+        super().__init__('capture', deviceIndex, sampleRate, 1, bufferSeconds, chunkSize)
+
+    def Attach(self) -> None:
+        """
+        Starts keeping frames, dropping any captured before.
+        """
+
+        self.ring.Skip_To_End()
+        self.ring.Set(CONSUMING, 1)
+
+    def Detach(self) -> None:
+        """
+        Stops keeping frames, so the ring does not overrun while nothing reads it.
+        """
+
+        self.ring.Set(CONSUMING, 0)
+
+    def Read(self, size: int, timeout: float | None = None) -> bytes:
+        """
+        Waits for and consumes `size` bytes of audio.
+
+        Parameters:
+            size (int): The number of bytes to read.
+            timeout (float | None): The most seconds to wait.
+
+        Returns:
+            bytes: The audio.
+
+        Raises:
+            OSError: If the worker stopped, or no audio arrived in time.
+        """
+
+        deadline: float | None = time.monotonic() + timeout if timeout is not None else None
+
+        # Poll at a quarter of the time the requested audio takes to arrive
+        pause: float = max(0.001, size / (self.sampleRate * self.sampleWidth) / 4)
+        while self.ring.Available() < size:
+            if not self.Is_Alive():
+                raise OSError("The capture worker stopped.")
+            if deadline is not None and time.monotonic() > deadline:
+                raise OSError("No audio arrived from the capture worker.")
+            time.sleep(pause)
+
+        return self.ring.Read(size)
+
+    def Captured_At(self, index: int) -> float:
+        """
+        Returns when the byte at a ring index was captured, in time.monotonic() seconds.
+        """
+
+        # The worker records when its last callback delivered the byte before CLOCK_INDEX
+        bytesPerSecond: int = self.sampleRate * self.sampleWidth * self.channels
+        return self.ring.Get(CLOCK_NS) / 1e9 - (self.ring.Get(CLOCK_INDEX) - index) / bytesPerSecond
+
+class Playback_Process(Audio_Worker):
+    """
+    Plays 16-bit PCM on a speaker from a worker process.
+    """
+
+    def __init__(
+        self,
+        deviceIndex: int | None = None,
+        sampleRate: int = 24000,
+        channels: int = 1,
+        bufferSeconds: float = 4.0,
+        chunkSize: int = 1024,
+        echoReference: 'Echo_Reference | None' = None
+    ):
+        """
+        Parameters:
+            deviceIndex (int | None): The output device. Defaults to the system's default output.
+            sampleRate (int): The sample rate of the audio played.
+            channels (int): The number of channels of the audio played.
+            bufferSeconds (float): The seconds of audio the ring holds.
+            chunkSize (int): The number of frames per device callback.
+            echoReference (Echo_Reference | None): Receives every mono clip with the time it starts playing, so capture can remove its echo.
+        """
+
+        super().__init__('playback', deviceIndex, sampleRate, channels, bufferSeconds, chunkSize)
+        self.echoReference = echoReference
+
+    def Plays_At(self, index: int) -> float:
+        """
+        Returns when the byte at a ring index will start playing, in time.monotonic() seconds.
+        """
+
+        bytesPerSecond: int = self.sampleRate * self.sampleWidth * self.channels
+        lastCallback: float = self.ring.Get(CLOCK_NS) / 1e9
+
+        # An idle ring is read again at the next callback
+        if self.ring.Available() == 0:
+            return max(time.monotonic(), lastCallback + self.chunkSize / self.sampleRate)
+        return lastCallback + (index - self.ring.Get(CLOCK_INDEX)) / bytesPerSecond
+
+    def Play(self, data: bytes, wait: bool = True) -> None:
+        """
+        Queues audio for playback, waiting for space in the ring as it plays.
+
+        Parameters:
+            data (bytes): 16-bit PCM at the player's sample rate and channels.
+            wait (bool): Whether to wait until the audio has finished playing.
+
+        Raises:
+            OSError: If the worker stopped.
+        """
+
+        if self.echoReference is not None and self.channels == 1:
+            self.echoReference.Publish(data, self.sampleRate, self.Plays_At(self.ring.Get(WRITE_INDEX)))
+
+        view: memoryview = memoryview(data)
+        pause: float = max(0.001, self.chunkSize / self.sampleRate / 2)
+
+        while len(view) > 0:
+            written: int = self.ring.Write(view, partial=True)
+            view = view[written:]
+            if len(view) > 0:
+                if not self.Is_Alive():
+                    raise OSError("The playback worker stopped.")
+                time.sleep(pause)
+
+        # Running dry at the end of the clip is not an underrun
+        self.ring.Set(CLIP_END, self.ring.Get(WRITE_INDEX))
+
+        if wait:
+            self.Wait()
+
+    def Wait(self) -> None:
+        """
+        Waits until every queued frame has been played.
+        """
+
+        pause: float = max(0.001, self.chunkSize / self.sampleRate / 2)
+        while self.ring.Available() > 0 and self.Is_Alive():
+            time.sleep(pause)
+
+class _Ring_Stream:
+    """
+    The blocking stream read by sr.Recognizer.
+    """
+
+    def __init__(self, capture: Capture_Process):
+        self.capture = capture
+
+    def read(self, size: int) -> bytes:
+        return self.capture.Read(size * self.capture.sampleWidth)
+
+    def End_Time(self) -> float:
+        """
+        Returns when the last byte read was captured, so echo suppression can line it up with playback.
+        """
+
+        return self.capture.Captured_At(self.capture.ring.Get(READ_INDEX))
+
+    def close(self) -> None:
+        self.capture.Detach()
+
+# One capture worker per device, kept running between utterances
+_captureProcesses: dict[tuple[int | None, int | None], Capture_Process] = {}
+
+def Get_Capture_Process(deviceIndex: int | None = None, sampleRate: int | None = None, chunkSize: int = 1024) -> Capture_Process:
+    """
+    Returns the running capture worker of a device, starting it if needed.
+    """
+
+    key: tuple[int | None, int | None] = (deviceIndex, sampleRate)
+    capture: Capture_Process | None = _captureProcesses.get(key)
+
+    if capture is None or not capture.Is_Alive():
+        if capture is not None:
+            capture.Stop()
+        capture = Capture_Process(deviceIndex, sampleRate, chunkSize)
+        capture.Start()
+        _captureProcesses[key] = capture
+
+    return capture
+
+def Stop_Capture_Processes() -> None:
+    """
+    Stops every capture worker.
+    """
+
+    for capture in _captureProcesses.values():
+        capture.Stop()
+    _captureProcesses.clear()
+
+class Process_Microphone(sr.AudioSource):
+    """
+    A drop-in replacement for sr.Microphone that reads from a capture worker.
+    The worker keeps running after the context exits, so reopening the microphone is instant.
+    """
+
+    def __init__(self, device_index: int | None = None, sample_rate: int | None = None, chunk_size: int = 1024):
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+
+        # Attributes read by sr.Recognizer
+        self.SAMPLE_WIDTH: int = 2
+        self.SAMPLE_RATE: int | None = sample_rate
+        self.CHUNK: int = chunk_size
+        self.stream: _Ring_Stream | None = None
+
+    def __enter__(self) -> 'Process_Microphone':
+        capture: Capture_Process = Get_Capture_Process(self.device_index, self.sample_rate, self.CHUNK)
+        self.SAMPLE_RATE = capture.sampleRate
+
+        capture.Attach()
+        self.stream = _Ring_Stream(capture)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stream.close()
+        self.stream = None
+
+"""
+Worker Processes
+"""
+def _Watch_Parent(ring: Shared_Ring_Buffer) -> None:
+    # stdin closes when the main process stops the worker or exits
+    try:
+        sys.stdin.buffer.read()
+    except OSError:
+        pass
+    ring.Set(STATE, STOPPING)
+
+def _Run_Worker(role: str, ringName: str, capacity: int, deviceIndex: int, sampleRate: int, channels: int, chunkSize: int) -> None:
+    import pyaudio
+
+    ring: Shared_Ring_Buffer = Shared_Ring_Buffer.Attach(ringName, capacity)
+    audio = pyaudio.PyAudio()
+    stream = None
+
+    try:
+        device: dict = audio.get_device_info_by_index(deviceIndex) if deviceIndex >= 0 else (
+            audio.get_default_input_device_info() if role == 'capture' else audio.get_default_output_device_info()
+        )
+        sampleRate = sampleRate if sampleRate > 0 else int(device['defaultSampleRate'])
+        frameBytes: int = 2 * channels
+
+        ring.Set(SAMPLE_RATE, sampleRate)
+        ring.Set(SAMPLE_WIDTH, 2)
+        ring.Set(CHANNELS, channels)
+
+        if role == 'capture':
+            def Callback(inData, frameCount, timeInfo, status):
+                if status & pyaudio.paInputOverflow:
+                    ring.Add(DEVICE_XRUNS)
+                if ring.Get(CONSUMING):
+                    ring.Write(inData)
+
+                # When the newest byte was captured, read by the main process to line audio up with playback
+                ring.Set(CLOCK_INDEX, ring.Get(WRITE_INDEX))
+                ring.Set(CLOCK_NS, time.monotonic_ns())
+                return None, pyaudio.paContinue
+
+        else:
+            playing: list[bool] = [False]
+
+            def Callback(inData, frameCount, timeInfo, status):
+                if status & pyaudio.paOutputUnderflow:
+                    ring.Add(DEVICE_XRUNS)
+
+                size: int = frameCount * frameBytes
+
+                # When the next byte starts playing, read by the main process to publish the echo reference
+                ring.Set(CLOCK_INDEX, ring.Get(READ_INDEX))
+                ring.Set(CLOCK_NS, time.monotonic_ns())
+                data: bytes = ring.Read(size)
+
+                # Running dry in the middle of a clip is an underrun, silence after a clip is not
+                if len(data) < size:
+                    if (playing[0] or len(data) > 0) and ring.Get(READ_INDEX) != ring.Get(CLIP_END):
+                        ring.Add(UNDERRUNS)
+                    data += bytes(size - len(data))
+                playing[0] = ring.Available() > 0
+
+                return data, pyaudio.paContinue
+
+        stream = audio.open(
+            format=pyaudio.paInt16,
+            channels=channels,
+            rate=sampleRate,
+            input=role == 'capture',
+            output=role == 'playback',
+            input_device_index=deviceIndex if role == 'capture' and deviceIndex >= 0 else None,
+            output_device_index=deviceIndex if role == 'playback' and deviceIndex >= 0 else None,
+            frames_per_buffer=chunkSize,
+            stream_callback=Callback
+        )
+
+        ring.Set(STATE, READY)
+        Thread(target=_Watch_Parent, args=(ring,), daemon=True).start()
+
+        # The device callbacks do the work, this thread only waits to be stopped
+        while ring.Get(STATE) == READY and stream.is_active():
+            time.sleep(0.05)
+
+    except Exception as e:
+        print(f"|| Audio {role} worker failed: {e} ||", file=sys.stderr, flush=True)
+        ring.Set(STATE, FAILED)
+
+    finally:
+        if stream is not None:
+            stream.stop_stream()
+            stream.close()
+        audio.terminate()
+        ring.Close()
+
+if __name__ == '__main__':
+    _Run_Worker(
+        role=sys.argv[1],
+        ringName=sys.argv[2],
+        capacity=int(sys.argv[3]),
+        deviceIndex=int(sys.argv[4]),
+        sampleRate=int(sys.argv[5]),
+        channels=int(sys.argv[6]),
+        chunkSize=int(sys.argv[7])
+    )
@@ -0,0 +1,281 @@
+"""
+Capture Sources
+
+Audio sources that feed recorded audio through the same listening and transcription path as
+the microphone. A source reads a WAV or raw PCM file, or every clip in a directory one after
+another, either in real time or as fast as the pipeline can consume it.
+
+A clip may have a reference track next to it, e.g. clip01.ref.wav for clip01.wav, holding what the
+assistant was playing while the clip was recorded, sample for sample. Replays pass it to echo suppression.
+"""
+# Imports
+import speech_recognition as sr
+import wave
+import time
+import os
+
+# File extensions read by the clip directory source
+AUDIO_EXTENSIONS: tuple[str, ...] = ('.wav', '.pcm', '.raw')
+
+# Added before the extension of a clip's reference track
+REFERENCE_SUFFIX: str = '.ref'
+
+class Clip:
+    """
+    The audio of one file, as 16-bit or other fixed-width mono PCM.
+    """
+
+    def __init__(self, path: str, data: bytes, sampleRate: int, sampleWidth: int, reference: bytes | None = None):
+        self.path = path
+        self.data = data
+        self.sampleRate = sampleRate
+        self.sampleWidth = sampleWidth
+        self.reference = reference
+
+    @classmethod
+    def Load(cls, path: str, sampleRate: int = 16000, sampleWidth: int = 2) -> 'Clip':
+        """
+        Loads a WAV file, or a raw PCM file with the given format, with its reference track if it has one.
+        Stereo WAV files are mixed down to mono.
+
+        Parameters:
+            path (str): The file to load.
+            sampleRate (int): The sample rate of raw PCM files.
+            sampleWidth (int): The sample width in bytes of raw PCM files.
+
+        Returns:
+            Clip: The clip.
+
+        Raises:
+            ValueError: If the reference track's format differs from the clip's.
+        """
+
+        clip: Clip = cls._Load_Audio(path, sampleRate, sampleWidth)
+
+        base: str = os.path.splitext(path)[0]
+        for extension in AUDIO_EXTENSIONS:
+            referencePath: str = base + REFERENCE_SUFFIX + extension
+            if not os.path.exists(referencePath):
+                continue
+
+            reference: Clip = cls._Load_Audio(referencePath, clip.sampleRate, clip.sampleWidth)
+            if (reference.sampleRate, reference.sampleWidth) != (clip.sampleRate, clip.sampleWidth):
+                raise ValueError(f"The reference track {referencePath} does not match the format of {path}")
+
+            # The reference covers the clip exactly, silent where it ran short
+            clip.reference = reference.data[:len(clip.data)] + b'\x00' * max(0, len(clip.data) - len(reference.data))
+            break
+
+        return clip
+
+    @classmethod
+    def _Load_Audio(cls, path: str, sampleRate: int, sampleWidth: int) -> 'Clip':
+        if not path.lower().endswith('.wav'):
+            with open(path, 'rb') as file:
+                return cls(path, file.read(), sampleRate, sampleWidth)
+
+        with wave.open(path, 'rb') as file:
+            data: bytes = file.readframes(file.getnframes())
+            channels: int = file.getnchannels()
+            sampleRate = file.getframerate()
+            sampleWidth = file.getsampwidth()
+
+        if channels > 1:
+            # Average the channels of each frame
+            from SpeechEncoding import _Read_Samples, _Write_Samples
+            samples = _Read_Samples(data, sampleWidth)
+            data = _Write_Samples(samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1), sampleWidth)
+
+        return cls(path, data, sampleRate, sampleWidth)
+
+class Replay_Stream:
+    """
+    Reads clips in order, optionally pacing reads to real time, with silence before each clip and after the last.
+    """
+
+    def __init__(self, clips: list[Clip], realTime: bool, gapSeconds: float):
+        self.clips = clips
+        self.realTime = realTime
+        self.gapSeconds = gapSeconds
+
+        # Default attributes
+        self.clipIndex: int = 0
+        self.position: int = 0
+        self.lastClipIndex: int = 0
+        self.bytesRead: int = 0
+        self.exhausted: bool = len(clips) == 0
+        self.lastReference: bytes | None = None
+        self.startTime: float = time.monotonic()
+
+        # Silence before each clip lets the listening path calibrate, and silence after the last clip closes its final phrase
+        first: Clip | None = clips[0] if len(clips) > 0 else None
+        self.sampleWidth: int = first.sampleWidth if first is not None else 1
+        self.bytesPerSecond: int = first.sampleRate * first.sampleWidth if first is not None else 1
+        self.gap: bytes = b'\x00' * (int(gapSeconds * first.sampleRate) * first.sampleWidth) if first is not None else b''
+
+    def _Segment_Length(self, index: int) -> int:
+        trailing: int = len(self.gap) if index == len(self.clips) - 1 else 0
+        return len(self.gap) + len(self.clips[index].data) + trailing
+
+    def _Slice(self, index: int, start: int, end: int, reference: bool = False) -> bytes:
+        """
+        Returns bytes `start` to `end` of a clip with its silence around it, without joining the clip and the silence.
+        """
+
+        audio: bytes = self.clips[index].reference if reference else self.clips[index].data
+        end = min(end, self._Segment_Length(index))
+        gap: int = len(self.gap)
+
+        leading: int = max(0, min(end, gap) - start)
+        trailing: int = max(0, end - max(start, gap + len(audio)))
+        return b'\x00' * leading + audio[max(0, start - gap):max(0, end - gap)] + b'\x00' * trailing
+
+    def Current_Clip(self) -> Clip | None:
+        """
+        Returns the clip whose audio was read last, ignoring the silence between clips.
+        """
+
+        if len(self.clips) == 0:
+            return None
+        return self.clips[self.lastClipIndex]
+
+    def read(self, size: int) -> bytes:
+        data: bytes = b''
+        self.lastReference = None
+
+        if self.clipIndex < len(self.clips):
+            data = self._Slice(self.clipIndex, self.position, self.position + size)
+
+            # What was playing while this audio was recorded
+            if self.clips[self.clipIndex].reference is not None:
+                self.lastReference = self._Slice(self.clipIndex, self.position, self.position + size, reference=True)
+
+            # Track the clip of the last audio that was not silence between clips
+            clipEnd: int = len(self.gap) + len(self.clips[self.clipIndex].data)
+            if self.position + len(data) > len(self.gap) and self.position < clipEnd:
+                self.lastClipIndex = self.clipIndex
+
+            # A read never spans two clips
+            self.position += len(data)
+            if self.position >= self._Segment_Length(self.clipIndex):
+                self.clipIndex += 1
+                self.position = 0
+
+        data = data[:len(data) - len(data) % self.sampleWidth]
+        if self.lastReference is not None:
+            self.lastReference = self.lastReference[:len(data)]
+        self.bytesRead += len(data)
+
+        if len(data) == 0:
+            self.exhausted = True
+            return data
+
+        # Wait until the audio would have been captured
+        if self.realTime:
+            delay: float = self.startTime + self.bytesRead / self.bytesPerSecond - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        return data
+
+    def close(self) -> None:
+        self.exhausted = True
+
+class Replay_Source(sr.AudioSource):
+    """
+    An audio source that replays clips through speech_recognition's listening path in place of a microphone.
+    """
+
+    def __init__(self, clips: list[Clip], realTime: bool = False, gapSeconds: float = 3.0, chunkSize: int = 1024):
+        """
+        Parameters:
+            clips (list[Clip]): The clips to play, in order. They must share a sample rate and width.
+            realTime (bool): Whether reads are paced to real time. Otherwise audio is read as fast as it is consumed.
+            gapSeconds (float): The seconds of silence before each clip and after the last.
+            chunkSize (int): The number of frames per read, as with sr.Microphone.
+
+        Raises:
+            ValueError: If the clips have different formats.
+        """
+
+        formats: set[tuple[int, int]] = {(clip.sampleRate, clip.sampleWidth) for clip in clips}
+        if len(formats) > 1:
+            raise ValueError(f"Clips must share a sample rate and width, found {sorted(formats)}")
+
+        self.clips = clips
+        self.realTime = realTime
+        self.gapSeconds = gapSeconds
+
+        # Attributes read by sr.Recognizer
+        self.SAMPLE_RATE: int = clips[0].sampleRate if len(clips) > 0 else 16000
+        self.SAMPLE_WIDTH: int = clips[0].sampleWidth if len(clips) > 0 else 2
+        self.CHUNK: int = chunkSize
+        self.stream: Replay_Stream | None = None
+
+    def __enter__(self) -> 'Replay_Source':
+        self.stream = Replay_Stream(self.clips, self.realTime, self.gapSeconds)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stream.close()
+        self.stream = None
+
+    def Audio_Seconds(self) -> float:
+        """
+        Returns the number of seconds of audio read so far.
+        """
+
+        if self.stream is None:
+            return 0.0
+        return self.stream.bytesRead / (self.SAMPLE_RATE * self.SAMPLE_WIDTH)
+
+def File_Source(path: str, realTime: bool = False, sampleRate: int = 16000, sampleWidth: int = 2, gapSeconds: float = 3.0) -> Replay_Source:
+    """
+    Creates a source that replays one WAV or raw PCM file.
+
+    Parameters:
+        path (str): The file to replay.
+        realTime (bool): Whether reads are paced to real time.
+        sampleRate (int): The sample rate of a raw PCM file.
+        sampleWidth (int): The sample width in bytes of a raw PCM file.
+        gapSeconds (float): The seconds of silence before and after the file.
+
+    Returns:
+        Replay_Source: The source.
+    """
+
+    return Replay_Source([Clip.Load(path, sampleRate, sampleWidth)], realTime=realTime, gapSeconds=gapSeconds)
+
+def Clip_Directory_Source(
+    directory: str,
+    realTime: bool = False,
+    gapSeconds: float = 3.0,
+    sampleRate: int = 16000,
+    sampleWidth: int = 2
+) -> Replay_Source:
+    """
+    Creates a source that replays every WAV and raw PCM file in a directory, in name order.
+
+    Parameters:
+        directory (str): The directory of clips.
+        realTime (bool): Whether reads are paced to real time.
+        gapSeconds (float): The seconds of silence before each clip and after the last. The listening path calibrates
+            on 2 seconds of audio before every phrase, so shorter gaps cut into the start of the clips.
+        sampleRate (int): The sample rate of raw PCM files.
+        sampleWidth (int): The sample width in bytes of raw PCM files.
+
+    Returns:
+        Replay_Source: The source.
+    """
+
+    paths: list[str] = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(AUDIO_EXTENSIONS)
+        and not os.path.splitext(name)[0].lower().endswith(REFERENCE_SUFFIX)
+    )
+
+    return Replay_Source(
+        [Clip.Load(path, sampleRate, sampleWidth) for path in paths],
+        realTime=realTime,
+        gapSeconds=gapSeconds
+    )
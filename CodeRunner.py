@@ -0,0 +1,400 @@
+"""
+Sandboxed Code Runner
+
+Runs Python snippets in a pool of pre-started worker processes. On POSIX systems each snippet
+runs in a child forked from an already started worker, under CPU time, memory, file size and
+wall-clock limits, so no interpreter startup is paid per snippet. On systems without fork the
+worker starts a fresh interpreter per snippet and only the wall-clock limit applies.
+
+The sandbox limits resources and runs in an empty temporary directory. It does not block
+network or file system access outside that directory.
+"""
+# Imports
+from queue import Queue, Empty
+from threading import Lock, Timer
+import subprocess
+import select
+import json
+import time
+import sys
+import os
+
+# Platform support for the fork based sandbox
+HAS_FORK: bool = hasattr(os, 'fork')
+
+# Seconds a worker may take beyond a snippet's wall-clock limit to answer, before it is replaced
+ANSWER_GRACE_SECONDS: float = 5.0
+
+class Code_Runner_Pool:
+    def __init__(
+        self,
+        workers: int = 2,
+        cpuSeconds: int = 5,
+        memoryMB: int = 256,
+        wallSeconds: float = 10.0,
+        maxOutputChars: int = 8000,
+    ):
+        """
+        Parameters:
+            workers (int): The number of worker processes to pre-start.
+            cpuSeconds (int): The CPU time limit of a snippet in seconds.
+            memoryMB (int): The address space limit of a snippet in megabytes.
+            wallSeconds (float): The wall-clock limit of a snippet in seconds.
+            maxOutputChars (int): The number of characters kept from each of stdout and stderr.
+        """
+
+        # User defined attributes
+        self.workers = workers
+        self.cpuSeconds = cpuSeconds
+        self.memoryMB = memoryMB
+        self.wallSeconds = wallSeconds
+        self.maxOutputChars = maxOutputChars
+
+        # Default attributes
+        self.idleWorkers: Queue[subprocess.Popen] = Queue()
+        self.allWorkers: list[subprocess.Popen] = []
+        self.counters: dict[str, int] = {
+            'runs': 0,
+            'timeouts': 0,
+            'nonZeroExits': 0,
+            'workerRestarts': 0,
+        }
+        self._lock = Lock()
+
+        # Pre-start the workers
+        for _ in range(workers):
+            self.idleWorkers.put(self._Start_Worker())
+
+    # # # #
+    #
+    # Worker Management Methods
+    #
+    # # # #
+
+    def _Start_Worker(self) -> subprocess.Popen:
+        """
+        Starts a worker process that waits for snippets on its stdin.
+        """
+
+        worker: subprocess.Popen = subprocess.Popen(
+            [sys.executable, '-I', '-u', os.path.abspath(__file__), '--worker'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8'
+        )
+
+        with self._lock:
+            self.allWorkers.append(worker)
+
+        return worker
+
+    def _Replace_Worker(self, worker: subprocess.Popen) -> subprocess.Popen:
+        """
+        Stops a broken worker and starts a new one in its place.
+        """
+
+        worker.kill()
+        worker.wait()
+
+        with self._lock:
+            self.allWorkers.remove(worker)
+            self.counters['workerRestarts'] += 1
+
+        return self._Start_Worker()
+
+    def _Read_Answer(self, worker: subprocess.Popen, timeout: float) -> str | None:
+        """
+        Reads a worker's answer, or returns None if it does not answer within `timeout` seconds.
+        An empty string means the worker stopped.
+        """
+
+        # select only waits on sockets on Windows, so a worker there is stopped at the deadline instead
+        if os.name == 'nt':
+            deadline: float = time.monotonic() + timeout
+            timer: Timer = Timer(timeout, worker.kill)
+            timer.start()
+            try:
+                answer: str = worker.stdout.readline()
+            finally:
+                timer.cancel()
+            return None if answer == '' and time.monotonic() >= deadline else answer
+
+        ready, _, _ = select.select([worker.stdout], [], [], timeout)
+        return worker.stdout.readline() if len(ready) > 0 else None
+
+    def Close(self) -> None:
+        """
+        Stops every worker process.
+        """
+
+        with self._lock:
+            workers: list[subprocess.Popen] = list(self.allWorkers)
+            self.allWorkers.clear()
+
+        for worker in workers:
+            worker.kill()
+            worker.wait()
+
+        # Drop the stopped workers from the idle queue
+        while True:
+            try:
+                self.idleWorkers.get_nowait()
+            except Empty:
+                break
+
+    # # # #
+    #
+    # Execution Methods
+    #
+    # # # #
+
+    def Run(self, codeSnippet: str) -> dict[str, any]:
+        """
+        Runs a code snippet on the next idle worker.
+
+        Parameters:
+            codeSnippet (str): The Python source to run.
+
+        Returns:
+            dict[str, any]: The snippet's stdout, stderr, exitStatus, timedOut flag and run time in seconds.
+            A negative exitStatus is the number of the signal that stopped the snippet.
+        """
+
+        job: dict[str, any] = {
+            'code': codeSnippet,
+            'cpuSeconds': self.cpuSeconds,
+            'memoryBytes': self.memoryMB * 1024 * 1024,
+            'wallSeconds': self.wallSeconds,
+            'maxOutputChars': self.maxOutputChars,
+        }
+
+        worker: subprocess.Popen = self.idleWorkers.get()
+        try:
+            worker.stdin.write(json.dumps(job) + '\n')
+            worker.stdin.flush()
+            response: str | None = self._Read_Answer(worker, self.wallSeconds + ANSWER_GRACE_SECONDS)
+
+        except (BrokenPipeError, OSError):
+            response = ''
+
+        # Replace a worker that died or stopped answering
+        if response is None or response == '':
+            self.idleWorkers.put(self._Replace_Worker(worker))
+            with self._lock:
+                self.counters['runs'] += 1
+                if response is None:
+                    self.counters['timeouts'] += 1
+
+            return {
+                'stdout': '',
+                'stderr': 'The code runner worker stopped unexpectedly.' if response == '' else 'The code runner worker did not answer in time.',
+                'exitStatus': -1 if response == '' else -9,
+                'timedOut': response is None,
+                'seconds': 0.0 if response == '' else self.wallSeconds + ANSWER_GRACE_SECONDS,
+            }
+
+        self.idleWorkers.put(worker)
+        result: dict[str, any] = json.loads(response)
+
+        with self._lock:
+            self.counters['runs'] += 1
+            if result['timedOut']:
+                self.counters['timeouts'] += 1
+            elif result['exitStatus'] != 0:
+                self.counters['nonZeroExits'] += 1
+
+        return result
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the pool's counters.
+
+        Returns:
+            dict[str, any]: The pool's metrics.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = dict(self.counters)
+            metrics['workers'] = len(self.allWorkers)
+
+        metrics['idleWorkers'] = self.idleWorkers.qsize()
+        return metrics
+
+"""
+Worker Process
+"""
+def _Truncate(text: str, maxChars: int) -> str:
+    if len(text) <= maxChars:
+        return text
+    return text[:maxChars] + "\n... [output truncated]"
+
+def _Run_Forked(job: dict[str, any]) -> dict[str, any]:
+    """
+    Runs a snippet in a forked child under resource limits.
+    """
+
+    import resource
+    import selectors
+    import signal
+    import tempfile
+
+    stdoutRead, stdoutWrite = os.pipe()
+    stderrRead, stderrWrite = os.pipe()
+    workDirectory: str = tempfile.mkdtemp(prefix='jarvis_snippet_')
+    startTime: float = time.monotonic()
+
+    pid: int = os.fork()
+    if pid == 0:
+        # Child: apply the limits, redirect output and run the snippet
+        try:
+            os.setsid()
+            resource.setrlimit(resource.RLIMIT_CPU, (job['cpuSeconds'], job['cpuSeconds']))
+            resource.setrlimit(resource.RLIMIT_AS, (job['memoryBytes'], job['memoryBytes']))
+            resource.setrlimit(resource.RLIMIT_FSIZE, (job['memoryBytes'], job['memoryBytes']))
+            os.chdir(workDirectory)
+
+            devNull: int = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devNull, 0)
+            os.dup2(stdoutWrite, 1)
+            os.dup2(stderrWrite, 2)
+            for fd in (devNull, stdoutRead, stdoutWrite, stderrRead, stderrWrite):
+                os.close(fd)
+            sys.stdin = open(0, 'r', closefd=False)
+            sys.stdout = open(1, 'w', buffering=1, closefd=False)
+            sys.stderr = open(2, 'w', buffering=1, closefd=False)
+
+            exitStatus: int = 0
+            try:
+                exec(compile(job['code'], '<snippet>', 'exec'), {'__name__': '__main__'})
+
+            except SystemExit as e:
+                exitStatus = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                exitStatus = 1
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exitStatus)
+
+        finally:
+            os._exit(1)
+
+    # Worker: collect the child's output until it exits or runs out of time
+    os.close(stdoutWrite)
+    os.close(stderrWrite)
+
+    outputs: dict[int, bytearray] = {stdoutRead: bytearray(), stderrRead: bytearray()}
+    byteLimit: int = job['maxOutputChars'] * 4
+    timedOut: bool = False
+
+    selector = selectors.DefaultSelector()
+    selector.register(stdoutRead, selectors.EVENT_READ)
+    selector.register(stderrRead, selectors.EVENT_READ)
+
+    deadline: float = startTime + job['wallSeconds']
+    openPipes: int = 2
+    status: int | None = None
+    while status is None:
+        remaining: float = deadline - time.monotonic()
+        if remaining <= 0:
+            timedOut = True
+            break
+
+        if openPipes > 0:
+            for key, _ in selector.select(timeout=remaining):
+                chunk: bytes = os.read(key.fd, 65536)
+                if chunk == b'':
+                    selector.unregister(key.fd)
+                    openPipes -= 1
+                elif len(outputs[key.fd]) < byteLimit:
+                    outputs[key.fd] += chunk
+
+        # The pipes close when the snippet exits, but also when it closes them itself, so poll for its exit
+        else:
+            exitedPID, exitStatus = os.waitpid(pid, os.WNOHANG)
+            if exitedPID != 0:
+                status = exitStatus
+            else:
+                time.sleep(min(remaining, 0.01))
+
+    # Stop the snippet and anything it started, then reap it
+    if status is None:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        _, status = os.waitpid(pid, 0)
+
+    selector.close()
+    os.close(stdoutRead)
+    os.close(stderrRead)
+
+    import shutil
+    shutil.rmtree(workDirectory, ignore_errors=True)
+
+    if os.WIFSIGNALED(status):
+        exitStatus: int = -os.WTERMSIG(status)
+    else:
+        exitStatus: int = os.WEXITSTATUS(status)
+
+    return {
+        'stdout': _Truncate(outputs[stdoutRead].decode('utf-8', 'replace'), job['maxOutputChars']),
+        'stderr': _Truncate(outputs[stderrRead].decode('utf-8', 'replace'), job['maxOutputChars']),
+        'exitStatus': exitStatus,
+        'timedOut': timedOut,
+        'seconds': time.monotonic() - startTime,
+    }
+
+def _Run_Subprocess(job: dict[str, any]) -> dict[str, any]:
+    """
+    Runs a snippet in a fresh interpreter, for systems without fork.
+    """
+
+    import tempfile
+
+    startTime: float = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix='jarvis_snippet_') as workDirectory:
+        try:
+            completed = subprocess.run(
+                [sys.executable, '-I', '-c', job['code']],
+                cwd=workDirectory,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                timeout=job['wallSeconds']
+            )
+            stdout, stderr, exitStatus, timedOut = completed.stdout, completed.stderr, completed.returncode, False
+
+        except subprocess.TimeoutExpired as e:
+            stdout = e.stdout.decode('utf-8', 'replace') if isinstance(e.stdout, bytes) else (e.stdout or '')
+            stderr = e.stderr.decode('utf-8', 'replace') if isinstance(e.stderr, bytes) else (e.stderr or '')
+            exitStatus, timedOut = -9, True
+
+    return {
+        'stdout': _Truncate(stdout, job['maxOutputChars']),
+        'stderr': _Truncate(stderr, job['maxOutputChars']),
+        'exitStatus': exitStatus,
+        'timedOut': timedOut,
+        'seconds': time.monotonic() - startTime,
+    }
+
+def _Worker_Loop() -> None:
+    """
+    Answers one JSON job per line on stdin with one JSON result per line on stdout.
+    """
+
+    for line in sys.stdin:
+        job: dict[str, any] = json.loads(line)
+        result: dict[str, any] = _Run_Forked(job) if HAS_FORK else _Run_Subprocess(job)
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+if __name__ == '__main__' and '--worker' in sys.argv:
+    _Worker_Loop()
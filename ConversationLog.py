@@ -0,0 +1,412 @@
+"""
+Conversation Log
+
+Writes every utterance, message, tool call and run timing to a local append-only SQLite database
+with a full-text index, so past conversations can be searched and summarized without any API
+calls, and a new thread can be started from the context of an old one.
+
+Events are queued and written in batches by a background thread, so logging never waits on disk.
+The database uses write-ahead logging, so it can be read while it is written.
+
+Usage:
+    python ConversationLog.py search "weather tomorrow"
+    python ConversationLog.py stats --days 30
+"""
+# Imports
+from argparse import ArgumentParser
+from threading import Lock, Thread
+from queue import Queue, Empty
+from uuid import uuid4
+import sqlite3
+import json
+import time
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    thread TEXT,
+    threadID TEXT,
+    kind TEXT NOT NULL,
+    role TEXT,
+    content TEXT NOT NULL DEFAULT '',
+    data TEXT,
+    createdAt REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_thread ON events (thread, id);
+CREATE INDEX IF NOT EXISTS events_kind ON events (kind, createdAt);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    content,
+    content='events',
+    content_rowid='id',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+# Marks the end of the queue
+_STOP: object = object()
+
+class Conversation_Log:
+    def __init__(
+        self,
+        path: str = 'conversations.db',
+        sessionID: str | None = None,
+        flushInterval: float = 0.25,
+        maxBatch: int = 500
+    ):
+        """
+        Parameters:
+            path (str): The database file.
+            sessionID (str | None): The ID of this session. Defaults to a new random ID.
+            flushInterval (float): The most seconds an event waits in the queue before it is written.
+            maxBatch (int): The most events written in one transaction.
+        """
+
+        # User defined attributes
+        self.path = path
+        self.sessionID = sessionID if sessionID is not None else uuid4().hex
+        self.flushInterval = flushInterval
+        self.maxBatch = maxBatch
+
+        # Default attributes
+        self.counters: dict[str, float] = {
+            'logged': 0,
+            'written': 0,
+            'batches': 0,
+            'maxBatch': 0,
+            'writeSeconds': 0.0,
+            'writeErrors': 0,
+        }
+        self._queue: Queue = Queue()
+        self._readLock = Lock()
+
+        # The writer owns its own connection, reads share a second one
+        connection: sqlite3.Connection = self._Connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+        self._reader: sqlite3.Connection = self._Connect(checkSameThread=False)
+
+        self._writer: Thread = Thread(target=self._Write_Loop, name='Conversation_Log_Writer', daemon=True)
+        self._writer.start()
+
+    def _Connect(self, checkSameThread: bool = True) -> sqlite3.Connection:
+        connection: sqlite3.Connection = sqlite3.connect(self.path, check_same_thread=checkSameThread)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    # # # #
+    #
+    # Writing Methods
+    #
+    # # # #
+
+    def Log(
+        self,
+        kind: str,
+        content: str = '',
+        threadName: str | None = None,
+        threadID: str | None = None,
+        role: str | None = None,
+        **data: any
+    ) -> None:
+        """
+        Queues an event to be written. Never blocks.
+
+        Parameters:
+            kind (str): The kind of event, e.g. "utterance", "message", "tool_call", "tool_output" or "run".
+            content (str): The searchable text of the event.
+            threadName (str | None): The name of the thread the event belongs to.
+            threadID (str | None): The ID of the thread the event belongs to.
+            role (str | None): The author of a message, "user" or "assistant".
+            **data (any): Other details, stored as JSON.
+        """
+
+        self.counters['logged'] += 1
+        self._queue.put((
+            self.sessionID,
+            threadName,
+            threadID,
+            kind,
+            role,
+            content if content is not None else '',
+            json.dumps(data, default=str) if len(data) > 0 else None,
+            time.time()
+        ))
+
+    def _Write_Loop(self) -> None:
+        connection: sqlite3.Connection = self._Connect()
+
+        while True:
+            # Wait for the first event, then take whatever else arrived within the flush interval
+            item = self._queue.get()
+            batch: list[tuple] = []
+            stop: bool = item is _STOP
+            if not stop:
+                batch.append(item)
+
+            deadline: float = time.monotonic() + self.flushInterval
+            while not stop and len(batch) < self.maxBatch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Empty:
+                    break
+
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if len(batch) > 0:
+                startTime: float = time.perf_counter()
+                try:
+                    with connection:
+                        connection.executemany(
+                            'INSERT INTO events (session, thread, threadID, kind, role, content, data, createdAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            batch
+                        )
+                    self.counters['written'] += len(batch)
+                except sqlite3.Error:
+                    self.counters['writeErrors'] += 1
+
+                self.counters['batches'] += 1
+                self.counters['maxBatch'] = max(self.counters['maxBatch'], len(batch))
+                self.counters['writeSeconds'] += time.perf_counter() - startTime
+
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+
+            if stop:
+                connection.close()
+                return
+
+    def Flush(self) -> None:
+        """
+        Waits until every queued event has been written.
+        """
+
+        self._queue.join()
+
+    def Close(self) -> None:
+        """
+        Writes the remaining events and closes the database.
+        """
+
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+        with self._readLock:
+            self._reader.close()
+
+    # # # #
+    #
+    # Reading Methods
+    #
+    # # # #
+
+    def _Query(self, sql: str, parameters: tuple | list = ()) -> list[dict[str, any]]:
+        with self._readLock:
+            rows: list[sqlite3.Row] = self._reader.execute(sql, parameters).fetchall()
+
+        events: list[dict[str, any]] = []
+        for row in rows:
+            event: dict[str, any] = dict(row)
+            if event.get('data'):
+                event['data'] = json.loads(event['data'])
+            events.append(event)
+
+        return events
+
+    def Search(
+        self,
+        query: str,
+        limit: int = 20,
+        threadName: str | None = None,
+        kinds: list[str] | None = None,
+        since: float | None = None
+    ) -> list[dict[str, any]]:
+        """
+        Finds the events that best match a full-text query.
+        Queries use FTS5 syntax. A query that is not valid FTS5 is searched as plain words.
+
+        Parameters:
+            query (str): The search query.
+            limit (int): The most events returned.
+            threadName (str | None): Only search this thread.
+            kinds (list[str] | None): Only search these kinds of events.
+            since (float | None): Only search events logged after this Unix time.
+
+        Returns:
+            list[dict[str, any]]: The matching events, best first, each with a highlighted snippet.
+        """
+
+        conditions: list[str] = ['events_fts MATCH ?']
+        parameters: list[any] = [query]
+        if threadName is not None:
+            conditions.append('events.thread = ?')
+            parameters.append(threadName)
+        if kinds is not None:
+            conditions.append(f"events.kind IN ({', '.join('?' * len(kinds))})")
+            parameters.extend(kinds)
+        if since is not None:
+            conditions.append('events.createdAt >= ?')
+            parameters.append(since)
+
+        sql: str = (
+            "SELECT events.*, snippet(events_fts, 0, '[', ']', '...', 12) AS snippet "
+            "FROM events_fts JOIN events ON events.id = events_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} ORDER BY bm25(events_fts) LIMIT ?"
+        )
+
+        try:
+            return self._Query(sql, parameters + [limit])
+        except sqlite3.OperationalError:
+            # Quote each word so punctuation is not read as query syntax
+            parameters[0] = ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+            return self._Query(sql, parameters + [limit])
+
+    def Recent_Messages(self, threadName: str, limit: int = 20) -> list[dict[str, any]]:
+        """
+        Returns the most recent messages of a thread, oldest first.
+        Messages logged under earlier sessions and earlier thread IDs with the same name are included,
+        and messages that were later deleted from the thread are left out.
+
+        Parameters:
+            threadName (str): The name of the thread.
+            limit (int): The most messages returned.
+
+        Returns:
+            list[dict[str, any]]: The messages.
+        """
+
+        events: list[dict[str, any]] = self._Query(
+            "SELECT * FROM events WHERE thread = ? AND kind = 'message' AND NOT EXISTS ("
+            "SELECT 1 FROM events AS deleted WHERE deleted.kind = 'message_deleted' "
+            "AND json_extract(deleted.data, '$.messageID') = json_extract(events.data, '$.messageID')"
+            ") ORDER BY id DESC LIMIT ?",
+            (threadName, limit)
+        )
+        return list(reversed(events))
+
+    def Build_Thread_Messages(self, threadName: str, maxMessages: int = 20, maxChars: int = 16000) -> list[dict[str, str]]:
+        """
+        Rebuilds a thread's recent context from the log, in the form accepted when a thread is created.
+
+        Parameters:
+            threadName (str): The name of the thread whose messages are used.
+            maxMessages (int): The most messages returned.
+            maxChars (int): The most characters of message text returned. The oldest messages are dropped first.
+
+        Returns:
+            list[dict[str, str]]: The messages, oldest first, each with a "role" and "content".
+        """
+
+        messages: list[dict[str, str]] = []
+        chars: int = 0
+
+        for event in reversed(self.Recent_Messages(threadName, maxMessages)):
+            if len(event['content']) == 0 or event['role'] not in ('user', 'assistant'):
+                continue
+
+            chars += len(event['content'])
+            if chars > maxChars:
+                break
+
+            messages.append({'role': event['role'], 'content': event['content']})
+
+        return list(reversed(messages))
+
+    def Stats(self, since: float | None = None) -> dict[str, any]:
+        """
+        Summarizes the log: events by kind, and runs, tokens, cost and run time by day.
+
+        Parameters:
+            since (float | None): Only count events logged after this Unix time.
+
+        Returns:
+            dict[str, any]: The summary.
+        """
+
+        since = since if since is not None else 0.0
+
+        kinds: dict[str, int] = {
+            row['kind']: row['count'] for row in self._Query(
+                'SELECT kind, COUNT(*) AS count FROM events WHERE createdAt >= ? GROUP BY kind',
+                (since,)
+            )
+        }
+
+        days: list[dict[str, any]] = self._Query(
+            "SELECT date(createdAt, 'unixepoch', 'localtime') AS day, "
+            "COUNT(*) AS runs, "
+            "COUNT(DISTINCT session) AS sessions, "
+            "SUM(json_extract(data, '$.totalTokens')) AS totalTokens, "
+            "SUM(json_extract(data, '$.costUSD')) AS costUSD, "
+            "AVG(json_extract(data, '$.seconds')) AS averageSeconds, "
+            "MAX(json_extract(data, '$.seconds')) AS maxSeconds "
+            "FROM events WHERE kind = 'run' AND createdAt >= ? GROUP BY day ORDER BY day",
+            (since,)
+        )
+
+        tools: dict[str, int] = {
+            row['tool']: row['count'] for row in self._Query(
+                "SELECT json_extract(data, '$.name') AS tool, COUNT(*) AS count "
+                "FROM events WHERE kind = 'tool_call' AND createdAt >= ? GROUP BY tool ORDER BY count DESC",
+                (since,)
+            )
+        }
+
+        return {'kinds': kinds, 'days': days, 'tools': tools}
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the writer's counters.
+
+        Returns:
+            dict[str, any]: The log metrics.
+        """
+
+        metrics: dict[str, any] = dict(self.counters)
+        metrics['queued'] = self._queue.qsize()
+        metrics['averageBatch'] = metrics['written'] / metrics['batches'] if metrics['batches'] > 0 else 0.0
+        metrics['averageWriteMs'] = 1000 * metrics['writeSeconds'] / metrics['batches'] if metrics['batches'] > 0 else 0.0
+        return metrics
+
+def Main() -> None:
+    parser = ArgumentParser(description='Search and summarize the local conversation log.')
+    parser.add_argument('--path', default='conversations.db', help='The database file.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    search = commands.add_parser('search', help='Full-text search over past conversations.')
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=20)
+    search.add_argument('--thread', default=None)
+    search.add_argument('--kind', action='append', default=None, help='Only search this kind of event. May be repeated.')
+
+    stats = commands.add_parser('stats', help='Summarize runs, tokens and cost by day.')
+    stats.add_argument('--days', type=float, default=None, help='Only count the last number of days.')
+
+    arguments = parser.parse_args()
+    log: Conversation_Log = Conversation_Log(arguments.path)
+
+    try:
+        if arguments.command == 'search':
+            for event in log.Search(arguments.query, arguments.limit, arguments.thread, arguments.kind):
+                when: str = time.strftime('%Y-%m-%d %H:%M', time.localtime(event['createdAt']))
+                author: str = event['role'] or event['kind']
+                print(f"{when} {event['thread'] or '-'} {author}: {event['snippet']}")
+
+        else:
+            since: float | None = time.time() - arguments.days * 86400 if arguments.days is not None else None
+            print(json.dumps(log.Stats(since), indent=2))
+
+    finally:
+        log.Close()
+
+if __name__ == '__main__':
+    Main()
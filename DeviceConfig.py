@@ -0,0 +1,283 @@
+"""
+Audio Device Configuration
+
+Saves the chosen capture and playback devices by name, since device indexes change between
+boots, and finds them again on startup without asking the user. When the saved microphone is
+missing, every input device is sampled at the same time and the one with the strongest live
+signal is chosen.
+"""
+# Imports
+from array import array
+import json
+import math
+import time
+import os
+
+# Name fragments of inputs that capture what the computer plays rather than a microphone
+LOOPBACK_NAMES: tuple[str, ...] = (
+    'monitor', 'loopback', 'stereo mix', 'what u hear', 'wave out', 'blackhole', 'soundflower', 'virtual cable', 'cable output'
+)
+
+def Is_Loopback(name: str) -> bool:
+    """
+    Returns whether an input device's name marks it as a loopback or monitor of an output.
+    """
+
+    return any(fragment in name.lower() for fragment in LOOPBACK_NAMES)
+
+def _Open_PyAudio():
+    import pyaudio
+    return pyaudio, pyaudio.PyAudio()
+
+def List_Devices(kind: str = 'input') -> list[dict[str, any]]:
+    """
+    Lists the audio devices of one kind.
+
+    Parameters:
+        kind (str): 'input' for capture devices or 'output' for playback devices.
+
+    Returns:
+        list[dict[str, any]]: Each device's index, name, host API name and default sample rate.
+    """
+
+    _, audio = _Open_PyAudio()
+    channelKey: str = 'maxInputChannels' if kind == 'input' else 'maxOutputChannels'
+
+    try:
+        devices: list[dict[str, any]] = []
+        for index in range(audio.get_device_count()):
+            info: dict[str, any] = audio.get_device_info_by_index(index)
+            if info.get(channelKey, 0) <= 0:
+                continue
+
+            devices.append({
+                'index': index,
+                'name': info['name'],
+                'hostApi': audio.get_host_api_info_by_index(info['hostApi'])['name'],
+                'sampleRate': int(info.get('defaultSampleRate', 16000)),
+            })
+
+        return devices
+
+    finally:
+        audio.terminate()
+
+def Find_Device(name: str, kind: str = 'input', hostApi: str | None = None) -> dict[str, any] | None:
+    """
+    Finds a device by name. An exact name match is preferred, then a case-insensitive partial match.
+
+    Parameters:
+        name (str): The saved device name.
+        kind (str): 'input' or 'output'.
+        hostApi (str | None): The saved host API name, preferred when several devices share a name.
+
+    Returns:
+        dict[str, any] | None: The device, or None if no device matches.
+    """
+
+    devices: list[dict[str, any]] = List_Devices(kind)
+
+    exact: list[dict[str, any]] = [device for device in devices if device['name'] == name]
+    partial: list[dict[str, any]] = [
+        device for device in devices
+        if name.lower() in device['name'].lower() or device['name'].lower() in name.lower()
+    ]
+
+    for candidates in (exact, partial):
+        if len(candidates) == 0:
+            continue
+
+        for device in candidates:
+            if hostApi is None or device['hostApi'] == hostApi:
+                return device
+        return candidates[0]
+
+    return None
+
+def Probe_Input_Devices(seconds: float = 0.5, sampleRate: int = 16000) -> list[dict[str, any]]:
+    """
+    Samples every input device at the same time and measures its signal level.
+    The streams run in callback mode, so probing takes about `seconds` however many devices there are.
+    Each device is opened at its own default sample rate, which many only support, and the level does
+    not depend on the rate, so the samples are not resampled.
+
+    Parameters:
+        seconds (float): How long to sample each device.
+        sampleRate (int): The sample rate of devices that do not report a default one, or fail to open at it.
+
+    Returns:
+        list[dict[str, any]]: The devices that could be opened with their RMS level, loudest first.
+        Loopback and monitor inputs, which pick up the assistant's own playback, are flagged and listed last.
+    """
+
+    pyaudio, audio = _Open_PyAudio()
+    devices: list[dict[str, any]] = []
+    streams: list = []
+
+    def Make_Callback(device: dict[str, any]):
+        def Callback(data, frameCount, timeInfo, status):
+            samples = array('h', data)
+            device['sumSquares'] += sum(sample * sample for sample in samples)
+            device['samples'] += len(samples)
+            return None, pyaudio.paContinue
+        return Callback
+
+    try:
+        for index in range(audio.get_device_count()):
+            info: dict[str, any] = audio.get_device_info_by_index(index)
+            if info.get('maxInputChannels', 0) <= 0:
+                continue
+
+            device: dict[str, any] = {
+                'index': index,
+                'name': info['name'],
+                'hostApi': audio.get_host_api_info_by_index(info['hostApi'])['name'],
+                'loopback': Is_Loopback(info['name']),
+                'sumSquares': 0,
+                'samples': 0,
+            }
+
+            # Try the device's own rate first, then the requested one.
+            # Skip devices that are busy, unplugged or do not support the format.
+            rates: list[int] = list(dict.fromkeys([int(info.get('defaultSampleRate') or sampleRate), sampleRate]))
+            for rate in rates:
+                try:
+                    streams.append(audio.open(
+                        format=pyaudio.paInt16,
+                        channels=1,
+                        rate=rate,
+                        input=True,
+                        input_device_index=index,
+                        frames_per_buffer=max(256, rate // 16),
+                        stream_callback=Make_Callback(device)
+                    ))
+                except (OSError, ValueError):
+                    continue
+
+                device['sampleRate'] = rate
+                devices.append(device)
+                break
+
+        time.sleep(seconds)
+
+    finally:
+        for stream in streams:
+            try:
+                stream.stop_stream()
+                stream.close()
+            except OSError:
+                pass
+        audio.terminate()
+
+    for device in devices:
+        device['rms'] = math.sqrt(device.pop('sumSquares') / device['samples']) if device['samples'] > 0 else 0.0
+        device['live'] = device.pop('samples') > 0
+
+    return sorted(devices, key=lambda device: (not device['loopback'], device['live'], device['rms']), reverse=True)
+
+class Device_Config:
+    def __init__(self, configPath: str = 'devices.json'):
+        """
+        Parameters:
+            configPath (str): The JSON file the chosen devices are saved to.
+        """
+
+        # User defined attributes
+        self.configPath = configPath
+
+        # Default attributes
+        self.config: dict[str, dict[str, any]] = {}
+        self.Load()
+
+    def Load(self) -> dict[str, dict[str, any]]:
+        """
+        Loads the saved devices. A missing or unreadable file counts as no saved devices.
+
+        Returns:
+            dict[str, dict[str, any]]: The saved devices by kind.
+        """
+
+        try:
+            with open(self.configPath, 'r', encoding='utf-8') as file:
+                self.config = json.load(file)
+        except (OSError, ValueError):
+            self.config = {}
+
+        return self.config
+
+    def Save(self) -> None:
+        """
+        Saves the devices, replacing the file in one step.
+        """
+
+        with open(self.configPath + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.config, file, indent=2)
+        os.replace(self.configPath + '.tmp', self.configPath)
+
+    def Set_Device(self, kind: str, device: dict[str, any]) -> None:
+        """
+        Saves a device by name.
+
+        Parameters:
+            kind (str): 'input' or 'output'.
+            device (dict[str, any]): The device, as returned by List_Devices.
+        """
+
+        self.config[kind] = {'name': device['name'], 'hostApi': device.get('hostApi')}
+        self.Save()
+
+    def Resolve_Input(self, probeSeconds: float = 0.5) -> dict[str, any]:
+        """
+        Finds the saved microphone by name, or probes every input device and saves the loudest live one.
+
+        Parameters:
+            probeSeconds (float): How long to sample the devices when probing.
+
+        Returns:
+            dict[str, any]: The microphone, with its current index.
+
+        Raises:
+            RuntimeError: If there is no usable input device.
+        """
+
+        saved: dict[str, any] | None = self.config.get('input')
+        if saved is not None:
+            device: dict[str, any] | None = Find_Device(saved['name'], 'input', saved.get('hostApi'))
+            if device is not None:
+                return device
+
+        # A loopback input is loudest while anything plays, but it never hears the user
+        probed: list[dict[str, any]] = [device for device in Probe_Input_Devices(probeSeconds) if not device['loopback']]
+        if len(probed) == 0:
+            raise RuntimeError("No usable input device was found.")
+
+        device: dict[str, any] = probed[0]
+        self.Set_Device('input', device)
+        return device
+
+    def Resolve_Output(self) -> dict[str, any] | None:
+        """
+        Finds the saved playback device by name, or saves the system's default playback device.
+
+        Returns:
+            dict[str, any] | None: The playback device, or None if there is none.
+        """
+
+        saved: dict[str, any] | None = self.config.get('output')
+        if saved is not None:
+            device: dict[str, any] | None = Find_Device(saved['name'], 'output', saved.get('hostApi'))
+            if device is not None:
+                return device
+
+        _, audio = _Open_PyAudio()
+        try:
+            defaultName: str = audio.get_default_output_device_info()['name']
+        except OSError:
+            return None
+        finally:
+            audio.terminate()
+
+        device: dict[str, any] | None = Find_Device(defaultName, 'output')
+        if device is not None:
+            self.Set_Device('output', device)
+        return device
@@ -0,0 +1,588 @@
+"""
+Echo Suppression
+
+Keeps the assistant from hearing itself. The playback stage publishes what it plays to an
+Echo_Reference, and the capture stage passes the microphone through an Echo_Suppressor before
+the wake word and speech recognition stages see it.
+
+While a reference signal plays, a partitioned-block frequency-domain NLMS filter estimates the
+echo and subtracts it, after the delay between playing and hearing is found by cross-correlation.
+What is left is gated. Frames that are only residual echo are replaced by comfort noise at the
+room's noise floor, so the listening path neither starts a phrase nor calibrates to silence, and
+frames clearly louder than the estimated echo pass through as the user talking over the assistant.
+Playback whose signal is unknown, such as a system speech engine, is only gated.
+"""
+# Imports
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Iterator
+import numpy as np
+import time
+import math
+
+# Reference signals are kept this long, long enough to cover any capture delay
+KEEP_SECONDS: float = 30.0
+
+class Echo_Canceller:
+    """
+    A partitioned-block frequency-domain NLMS filter that estimates the echo of a reference signal.
+    """
+
+    def __init__(self, blockSize: int, partitions: int, stepSize: float = 0.5, regularization: float = 0.01):
+        """
+        Parameters:
+            blockSize (int): The number of samples per block, and per filter partition.
+            partitions (int): The number of partitions. The filter spans blockSize * partitions samples.
+            stepSize (float): The NLMS step size, between 0 and 1.
+            regularization (float): Added to each bin's power as a fraction of the mean power, so bins with almost no signal do not take huge steps.
+        """
+
+        # User defined attributes
+        self.blockSize = blockSize
+        self.partitions = partitions
+        self.stepSize = stepSize
+        self.regularization = regularization
+
+        # After a reset the step grows from half to the full step over this many blocks, while the filter fills
+        self.rampBlocks: int = 2 * partitions
+
+        self.Reset()
+
+    def Reset(self) -> None:
+        """
+        Forgets the echo path.
+        """
+
+        bins: int = self.blockSize + 1
+        self.weights: np.ndarray = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self.spectra: np.ndarray = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self.power: np.ndarray = np.zeros(bins)
+        self.previous: np.ndarray = np.zeros(self.blockSize)
+        self.blocks: int = 0
+
+    def Estimate(self, reference: np.ndarray) -> np.ndarray:
+        """
+        Adds a block of the reference and returns the echo it predicts for the same block.
+
+        Parameters:
+            reference (np.ndarray): The next blockSize samples of the reference, already delayed.
+
+        Returns:
+            np.ndarray: The estimated echo.
+        """
+
+        # Overlap-save keeps the previous block in front of the current one
+        self.spectra = np.roll(self.spectra, 1, axis=0)
+        self.spectra[0] = np.fft.rfft(np.concatenate((self.previous, reference)))
+        self.previous = reference
+
+        # Each bin is normalized by its own smoothed power, which is what makes the filter converge quickly.
+        # The first block seeds it, since smoothing up from zero would make the first steps about ten times too large
+        power: np.ndarray = np.abs(self.spectra[0]) ** 2
+        self.power = power if self.blocks == 0 else 0.9 * self.power + 0.1 * power
+        self.blocks += 1
+
+        return np.fft.irfft(np.sum(self.weights * self.spectra, axis=0))[self.blockSize:]
+
+    def Adapt(self, error: np.ndarray) -> None:
+        """
+        Moves the filter toward the echo, given the error left by the last estimate.
+        """
+
+        errorSpectrum: np.ndarray = np.fft.rfft(np.concatenate((np.zeros(self.blockSize), error)))
+
+        # The filter's input is the reference across every partition, including those still empty after a reset
+        power: np.ndarray = self.partitions * self.power
+        power = power + self.regularization * np.mean(power) + 1e-10
+
+        stepSize: float = self.stepSize * (0.5 + 0.5 * min(1.0, self.blocks / self.rampBlocks))
+        gradient: np.ndarray = stepSize * np.conj(self.spectra) * errorSpectrum / power
+
+        # Constrain each partition to a causal block, so the partitions stay independent
+        impulse: np.ndarray = np.fft.irfft(gradient, axis=1)
+        impulse[:, self.blockSize:] = 0.0
+        self.weights += np.fft.rfft(impulse, axis=1)
+
+def Estimate_Delay(near: np.ndarray, far: np.ndarray, maxDelay: int) -> tuple[int, float]:
+    """
+    Finds how many samples the reference arrives late in the capture, by phase-transform cross-correlation.
+
+    Parameters:
+        near (np.ndarray): The captured samples.
+        far (np.ndarray): The reference samples ending at the same time, with maxDelay more samples before.
+        maxDelay (int): The largest delay searched.
+
+    Returns:
+        tuple[int, float]: The delay, and how far the correlation peak stands above the rest.
+    """
+
+    size: int = 1 << (len(far) + len(near)).bit_length()
+    cross: np.ndarray = np.fft.rfft(near, size) * np.conj(np.fft.rfft(far, size))
+    correlation: np.ndarray = np.fft.irfft(cross / (np.abs(cross) + 1e-12), size)
+
+    # The capture sample near[i] lines up with far[i + maxDelay - delay], at a circular lag of delay - maxDelay
+    lags: np.ndarray = np.abs(np.concatenate((correlation[size - maxDelay:], correlation[:1])))
+    peak: int = int(np.argmax(lags))
+    return peak, float(lags[peak] / (np.mean(lags) + 1e-12))
+
+class Echo_Suppressor:
+    """
+    Removes the echo of a reference signal from 16-bit mono capture, then gates what is left.
+    """
+
+    def __init__(
+        self,
+        sampleRate: int,
+        filterSeconds: float = 0.064,
+        maxDelaySeconds: float = 0.4,
+        tailSeconds: float = 0.3,
+        bargeInRatio: float = 2.0,
+        bargeInLevel: float = 0.01,
+        stepSize: float = 0.5,
+        seed: int | None = None
+    ):
+        """
+        Parameters:
+            sampleRate (int): The capture sample rate.
+            filterSeconds (float): How long an echo the filter models after the delay.
+            maxDelaySeconds (float): The largest delay between playing and hearing that is searched for.
+            tailSeconds (float): The seconds capture stays gated after the reference falls silent, for reverberation.
+            bargeInRatio (float): How many times louder than the estimated echo and the noise floor the capture must be to pass through.
+            bargeInLevel (float): The quietest RMS level, as a fraction of full scale, that passes through while the reference plays.
+            stepSize (float): The NLMS step size, between 0 and 1.
+            seed (int | None): Seeds the comfort noise, for repeatable replays.
+        """
+
+        # User defined attributes
+        self.sampleRate = sampleRate
+        self.bargeInRatio = bargeInRatio
+        self.bargeInLevel = bargeInLevel
+
+        # Blocks of about 16 ms
+        self.blockSize: int = 1 << round(math.log2(sampleRate * 0.016))
+        self.maxDelay: int = int(maxDelaySeconds * sampleRate)
+        self.tail: int = int(tailSeconds * sampleRate)
+        self.canceller: Echo_Canceller = Echo_Canceller(
+            self.blockSize,
+            max(1, math.ceil(filterSeconds * sampleRate / self.blockSize)),
+            stepSize
+        )
+
+        # Default attributes
+        self.metrics: dict[str, float] = {
+            'blocks': 0,
+            'echoBlocks': 0,
+            'gatedBlocks': 0,
+            'bargeInBlocks': 0,
+            'delayChanges': 0,
+            'seconds': 0.0,
+        }
+        self._random = np.random.default_rng(seed)
+        self._lock = Lock()
+        self.Reset()
+
+    def Reset(self) -> None:
+        """
+        Forgets the echo path, delay and noise floor.
+        """
+
+        self.canceller.Reset()
+        self.delay: int = 0
+        self.delayConfidence: float = 0.0
+        self.candidateDelay: int | None = None
+        self.echoGain: float = 1.0
+        self.noiseFloor: float = 0.0
+        self.erle: float = 0.0
+        self.activeUntil: int = 0
+        self.sampleCount: int = 0
+        self.sinceEstimate: int = 0
+
+        # The output trails the input by one block, so every read returns as many samples as it was given
+        self.output: np.ndarray = np.zeros(self.blockSize, dtype=np.float32)
+        self.nearPending: np.ndarray = np.zeros(0, dtype=np.float32)
+        self.farPending: np.ndarray = np.zeros(0, dtype=np.float32)
+        self.playingPending: np.ndarray = np.zeros(0, dtype=bool)
+
+        # Enough reference for the delay search and the filter, and a second of capture to match it against
+        self.window: int = self.sampleRate
+        self.farHistory: np.ndarray = np.zeros(self.window + self.maxDelay + self.blockSize, dtype=np.float32)
+        self.nearHistory: np.ndarray = np.zeros(self.window, dtype=np.float32)
+
+    def Process(self, data: bytes, reference: np.ndarray | None = None, playing: bool = False) -> bytes:
+        """
+        Suppresses the echo in a read of captured audio.
+
+        Parameters:
+            data (bytes): 16-bit mono PCM at the suppressor's sample rate.
+            reference (np.ndarray | None): What was playing during the same samples, as 16-bit samples at the same rate. None if unknown or silent.
+            playing (bool): Whether anything was playing, including audio whose signal is unknown.
+
+        Returns:
+            bytes: As much audio as was given, one block behind.
+        """
+
+        startTime: float = time.perf_counter()
+
+        near: np.ndarray = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768
+        far: np.ndarray = (
+            reference[:len(near)].astype(np.float32) / 32768 if reference is not None else np.zeros(0, dtype=np.float32)
+        )
+        if len(far) < len(near):
+            far = np.concatenate((far, np.zeros(len(near) - len(far), dtype=np.float32)))
+
+        with self._lock:
+            self.nearPending = np.concatenate((self.nearPending, near))
+            self.farPending = np.concatenate((self.farPending, far))
+            self.playingPending = np.concatenate((self.playingPending, np.full(len(near), playing)))
+
+            blocks: list[np.ndarray] = [self.output]
+            while len(self.nearPending) >= self.blockSize:
+                blocks.append(self._Process_Block(
+                    self.nearPending[:self.blockSize],
+                    self.farPending[:self.blockSize],
+                    bool(self.playingPending[:self.blockSize].any())
+                ))
+                self.nearPending = self.nearPending[self.blockSize:]
+                self.farPending = self.farPending[self.blockSize:]
+                self.playingPending = self.playingPending[self.blockSize:]
+
+            output: np.ndarray = np.concatenate(blocks)
+            self.output = output[len(near):]
+            output = output[:len(near)]
+
+            self.metrics['seconds'] += time.perf_counter() - startTime
+
+        return (np.clip(output * 32768, -32768, 32767)).astype('<i2').tobytes()
+
+    def _Process_Block(self, near: np.ndarray, far: np.ndarray, playing: bool) -> np.ndarray:
+        size: int = self.blockSize
+        self.metrics['blocks'] += 1
+        self.sampleCount += size
+
+        self.farHistory = np.concatenate((self.farHistory[size:], far))
+        self.nearHistory = np.concatenate((self.nearHistory[size:], near))
+
+        nearLevel: float = float(np.sqrt(np.mean(near ** 2)))
+        farLevel: float = float(np.sqrt(np.mean(far ** 2)))
+        if farLevel > 1e-4 or playing:
+            self.activeUntil = self.sampleCount + self.tail
+
+        # Nothing is playing: pass the audio on and learn the room's noise floor
+        if self.sampleCount > self.activeUntil:
+            rate: float = 0.1 if nearLevel < self.noiseFloor or self.noiseFloor == 0.0 else 0.01
+            self.noiseFloor += rate * (nearLevel - self.noiseFloor)
+            return near
+
+        # The reference as it arrives at the microphone, by the estimated delay
+        end: int = len(self.farHistory) - self.delay
+        delayed: np.ndarray = self.farHistory[end - size:end]
+        delayedLevel: float = float(np.sqrt(np.mean(delayed ** 2)))
+
+        if farLevel > 1e-4:
+            self.sinceEstimate += size
+            if self.sinceEstimate >= self.window // 2:
+                self.sinceEstimate = 0
+                self._Update_Delay()
+
+        echo: np.ndarray = self.canceller.Estimate(delayed)
+        error: np.ndarray = near - echo
+        errorLevel: float = float(np.sqrt(np.mean(error ** 2)))
+
+        # Speech is louder than any echo the reference could cause, while residual echo is not
+        expected: float = max(float(np.sqrt(np.mean(echo ** 2))), self.echoGain * delayedLevel)
+        bargeIn: bool = (
+            self.delayConfidence > 0.0
+            and errorLevel > self.bargeInRatio * expected
+            and errorLevel > max(self.bargeInRatio * self.noiseFloor, self.bargeInLevel)
+        )
+
+        if delayedLevel > 1e-4:
+            self.metrics['echoBlocks'] += 1
+
+            # Adapting during double talk would teach the filter the user's voice
+            if not bargeIn:
+                self.canceller.Adapt(error)
+                self.echoGain += 0.05 * (nearLevel / delayedLevel - self.echoGain)
+                self.erle += 0.05 * (10 * math.log10((nearLevel ** 2 + 1e-12) / (errorLevel ** 2 + 1e-12)) - self.erle)
+
+        if bargeIn:
+            self.metrics['bargeInBlocks'] += 1
+            return error.astype(np.float32)
+
+        # Comfort noise keeps the listening path calibrated to the room
+        self.metrics['gatedBlocks'] += 1
+        return self._random.normal(0.0, self.noiseFloor, size).astype(np.float32)
+
+    def _Update_Delay(self) -> None:
+        delay, confidence = Estimate_Delay(self.nearHistory, self.farHistory[-(self.window + self.maxDelay):], self.maxDelay)
+        if confidence < 10.0:
+            return
+
+        # Start the filter slightly before the strongest echo, so it models the path's onset
+        delay = max(0, delay - self.blockSize // 4)
+        tolerance: int = self.blockSize // 4
+
+        # A new delay must be found twice in a row, since moving it throws away what the filter learned
+        candidate: int | None = self.candidateDelay
+        self.candidateDelay = delay
+        if abs(delay - self.delay) <= tolerance:
+            self.delayConfidence = confidence
+            return
+        if self.delayConfidence > 0.0 and (candidate is None or abs(delay - candidate) > tolerance):
+            return
+
+        self.delay = delay
+        self.delayConfidence = confidence
+        self.canceller.Reset()
+        self.metrics['delayChanges'] += 1
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the number of blocks gated, passed as barge-in and cancelled, the echo delay and the echo return loss enhancement.
+
+        Returns:
+            dict[str, any]: The suppressor metrics.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = dict(self.metrics)
+
+        audioSeconds: float = metrics['blocks'] * self.blockSize / self.sampleRate
+        metrics['delayMs'] = 1000 * self.delay / self.sampleRate
+        metrics['erleDb'] = self.erle
+        metrics['noiseFloor'] = self.noiseFloor
+        metrics['cpuPercent'] = 100 * metrics['seconds'] / audioSeconds if audioSeconds > 0 else 0.0
+        return metrics
+
+class Echo_Reference:
+    """
+    What the assistant is playing, published by the playback stage and read by the capture stage.
+    Times are time.monotonic() seconds, which worker processes share.
+    """
+
+    def __init__(self, suppressorOptions: dict[str, any] | None = None):
+        """
+        Parameters:
+            suppressorOptions (dict[str, any] | None): Keyword arguments of the Echo_Suppressor created for each capture sample rate.
+        """
+
+        self.suppressorOptions = suppressorOptions or {}
+
+        # Default attributes
+        self.segments: list[dict[str, any]] = []
+        self.intervals: list[list[float]] = []
+        self.suppressors: dict[int, Echo_Suppressor] = {}
+        self._lock = Lock()
+
+    # # # #
+    #
+    # Playback Methods
+    #
+    # # # #
+
+    def Publish(self, data: bytes, sampleRate: int, startTime: float | None = None) -> None:
+        """
+        Records a signal that is about to play.
+
+        Parameters:
+            data (bytes): 16-bit mono PCM.
+            sampleRate (int): The signal's sample rate.
+            startTime (float | None): When the first sample plays. Defaults to now.
+        """
+
+        startTime = startTime if startTime is not None else time.monotonic()
+        samples: np.ndarray = np.frombuffer(data, dtype='<i2').astype(np.float32)
+
+        with self._lock:
+            self._Prune(startTime)
+            self.segments.append({
+                'start': startTime,
+                'end': startTime + len(samples) / sampleRate,
+                'sampleRate': sampleRate,
+                'samples': samples,
+                'resampled': {},
+            })
+
+    def Begin(self) -> None:
+        """
+        Marks the start of playback whose signal is unknown. Capture is gated until End is called.
+        """
+
+        with self._lock:
+            self._Prune(time.monotonic())
+            self.intervals.append([time.monotonic(), math.inf])
+
+    def End(self) -> None:
+        """
+        Marks the end of playback started with Begin.
+        """
+
+        with self._lock:
+            for interval in self.intervals:
+                if interval[1] == math.inf:
+                    interval[1] = time.monotonic()
+
+    @contextmanager
+    def Playing(self) -> Iterator[None]:
+        """
+        Gates capture while the block runs, for playback whose signal is unknown.
+        """
+
+        self.Begin()
+        try:
+            yield
+        finally:
+            self.End()
+
+    def _Prune(self, now: float) -> None:
+        self.segments = [segment for segment in self.segments if segment['end'] > now - KEEP_SECONDS]
+        self.intervals = [interval for interval in self.intervals if interval[1] > now - KEEP_SECONDS]
+
+    # # # #
+    #
+    # Capture Methods
+    #
+    # # # #
+
+    def Window(self, sampleRate: int, frames: int, endTime: float | None = None) -> tuple[np.ndarray | None, bool]:
+        """
+        Returns what was playing while some audio was captured.
+
+        Parameters:
+            sampleRate (int): The capture sample rate.
+            frames (int): The number of captured samples.
+            endTime (float | None): When the last sample was captured. Defaults to now.
+
+        Returns:
+            tuple[np.ndarray | None, bool]: The reference at the capture rate, or None if no signal was playing, and whether anything was playing.
+        """
+
+        endTime = endTime if endTime is not None else time.monotonic()
+        startTime: float = endTime - frames / sampleRate
+        window: np.ndarray | None = None
+
+        with self._lock:
+            playing: bool = any(start < endTime and end > startTime for start, end in self.intervals)
+
+            for segment in self.segments:
+                if segment['start'] >= endTime or segment['end'] <= startTime:
+                    continue
+
+                samples: np.ndarray = self._Resampled(segment, sampleRate)
+                offset: int = round((segment['start'] - startTime) * sampleRate)
+                first: int = max(0, offset)
+                last: int = min(frames, offset + len(samples))
+                if first >= last:
+                    continue
+
+                if window is None:
+                    window = np.zeros(frames, dtype=np.float32)
+                window[first:last] = samples[first - offset:last - offset]
+                playing = True
+
+        return window, playing
+
+    def _Resampled(self, segment: dict[str, any], sampleRate: int) -> np.ndarray:
+        # Linear interpolation is enough, the speaker and room filter the signal far more
+        if segment['sampleRate'] == sampleRate:
+            return segment['samples']
+
+        if sampleRate not in segment['resampled']:
+            samples: np.ndarray = segment['samples']
+            count: int = int(len(samples) * sampleRate / segment['sampleRate'])
+            positions: np.ndarray = np.arange(count) * (segment['sampleRate'] / sampleRate)
+            segment['resampled'][sampleRate] = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+        return segment['resampled'][sampleRate]
+
+    def Suppressor(self, sampleRate: int) -> Echo_Suppressor:
+        """
+        Returns the suppressor of a capture sample rate, kept so its echo path survives between utterances.
+        """
+
+        with self._lock:
+            if sampleRate not in self.suppressors:
+                self.suppressors[sampleRate] = Echo_Suppressor(sampleRate, **self.suppressorOptions)
+            return self.suppressors[sampleRate]
+
+    def Suppress(self, data: bytes, sampleRate: int, endTime: float | None = None) -> bytes:
+        """
+        Suppresses the echo in a read of captured audio.
+
+        Parameters:
+            data (bytes): 16-bit mono PCM.
+            sampleRate (int): The capture sample rate.
+            endTime (float | None): When the last sample was captured. Defaults to now.
+
+        Returns:
+            bytes: As much audio as was given.
+        """
+
+        reference, playing = self.Window(sampleRate, len(data) // 2, endTime)
+        return self.Suppressor(sampleRate).Process(data, reference, playing)
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the metrics of each suppressor by sample rate.
+
+        Returns:
+            dict[str, any]: The suppressor metrics.
+        """
+
+        with self._lock:
+            suppressors: dict[int, Echo_Suppressor] = dict(self.suppressors)
+        return {str(sampleRate): suppressor.Get_Metrics() for sampleRate, suppressor in suppressors.items()}
+
+class Echo_Suppressed_Stream:
+    """
+    Wraps the stream of an audio source, so sr.Recognizer reads audio with the echo suppressed.
+    Other attributes are read from the wrapped stream.
+    """
+
+    def __init__(self, stream, suppressor: Echo_Suppressor, reference: Callable[[int], tuple[np.ndarray | None, bool]]):
+        """
+        Parameters:
+            stream: The wrapped stream, with a read method returning 16-bit mono PCM.
+            suppressor (Echo_Suppressor): The suppressor.
+            reference (Callable[[int], tuple[np.ndarray | None, bool]]): Returns what was playing during the samples just read, given their number.
+        """
+
+        self.stream = stream
+        self.suppressor = suppressor
+        self.reference = reference
+
+    def read(self, size: int) -> bytes:
+        data: bytes = self.stream.read(size)
+        reference, playing = self.reference(len(data) // 2)
+        return self.suppressor.Process(data, reference, playing)
+
+    def close(self) -> None:
+        self.stream.close()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+def Suppress_Source(source, reference: Echo_Reference) -> None:
+    """
+    Suppresses the echo of an open audio source, such as sr.Microphone, in place.
+    Streams that know when their audio was captured, such as a capture worker's, are lined up by that time.
+
+    Parameters:
+        source (sr.AudioSource): The open source, with 16-bit samples.
+        reference (Echo_Reference): What the assistant is playing.
+
+    Raises:
+        ValueError: If the source's samples are not 16-bit.
+    """
+
+    if source.SAMPLE_WIDTH != 2:
+        raise ValueError(f"Echo suppression needs 16-bit audio, the source has {source.SAMPLE_WIDTH * 8}-bit samples")
+
+    sampleRate: int = source.SAMPLE_RATE
+    End_Time: Callable[[], float] = getattr(source.stream, 'End_Time', time.monotonic)
+
+    source.stream = Echo_Suppressed_Stream(
+        source.stream,
+        reference.Suppressor(sampleRate),
+        lambda frames: reference.Window(sampleRate, frames, End_Time())
+    )
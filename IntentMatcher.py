@@ -0,0 +1,268 @@
+"""
+Local Intent Matching
+
+Recognizes simple commands, such as "Jarvis open YouTube", from the transcript alone and calls
+the matching JarvisFunctions tool directly, without an assistant run. Only commands that fully
+match a pattern and resolve to concrete arguments are handled. Everything else is left to the
+assistant.
+"""
+# Imports
+from threading import Lock
+from typing import Callable
+from urllib.parse import quote_plus
+import time
+import re
+
+# Spoken site names and their URLs
+KNOWN_SITES: dict[str, str] = {
+    'youtube': 'https://www.youtube.com',
+    'google': 'https://www.google.com',
+    'gmail': 'https://mail.google.com',
+    'google maps': 'https://maps.google.com',
+    'maps': 'https://maps.google.com',
+    'github': 'https://github.com',
+    'wikipedia': 'https://www.wikipedia.org',
+    'reddit': 'https://www.reddit.com',
+    'amazon': 'https://www.amazon.com',
+    'netflix': 'https://www.netflix.com',
+    'spotify': 'https://open.spotify.com',
+    'twitter': 'https://x.com',
+    'stack overflow': 'https://stackoverflow.com',
+    'chatgpt': 'https://chatgpt.com',
+}
+
+# Search URLs by spoken site name
+SEARCH_SITES: dict[str, str] = {
+    'google': 'https://www.google.com/search?q={}',
+    'youtube': 'https://www.youtube.com/results?search_query={}',
+    'wikipedia': 'https://en.wikipedia.org/w/index.php?search={}',
+    'amazon': 'https://www.amazon.com/s?k={}',
+    'github': 'https://github.com/search?q={}',
+}
+
+# Top-level domains a spoken name may end in to be opened as a domain. Country codes that are
+# also common file extensions, such as .py, .sh, .rs and .md, are left out, so "open main.py" is not a website.
+KNOWN_TLDS: set[str] = {
+    'com', 'org', 'net', 'edu', 'gov', 'mil', 'int', 'info', 'biz', 'io', 'ai', 'app', 'dev', 'co', 'me',
+    'tv', 'gg', 'fm', 'xyz', 'site', 'online', 'tech', 'blog', 'news', 'shop', 'store', 'cloud',
+    'uk', 'us', 'ca', 'au', 'nz', 'ie', 'de', 'fr', 'es', 'it', 'nl', 'be', 'ch', 'at', 'se', 'no', 'dk',
+    'fi', 'eu', 'jp', 'kr', 'cn', 'in', 'br', 'mx', 'ar', 'za', 'ru',
+}
+
+# Words around a command that do not change its meaning
+FILLER_PATTERN: str = r"(?:(?:hey|ok|okay)\s+)?(?:jarvis\s*)?(?:(?:can|could|would)\s+you\s+)?(?:please\s+)?"
+
+def _Normalize(text: str) -> str:
+    text = text.lower().replace(' dot ', '.')
+    return ' '.join(re.sub(r"[^\w\s.'-]", ' ', text).split()).strip('. ')
+
+def _Resolve_Site(site: str) -> tuple[str, str] | None:
+    """
+    Returns the URL and display name of a spoken site, or None if it is not a known site or domain.
+    A name is only taken as a domain if it ends in a known top-level domain.
+    """
+
+    site = re.sub(r'^(?:the\s+)?', '', site).removesuffix(' website').removesuffix(' site').strip()
+    if site in KNOWN_SITES:
+        return KNOWN_SITES[site], site.title()
+
+    if re.fullmatch(r'[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}', site) and site.rsplit('.', 1)[1] in KNOWN_TLDS:
+        return f"https://{site}", site
+
+    return None
+
+def _Open_Site_Arguments(match: re.Match) -> tuple[dict[str, any], str] | None:
+    resolved: tuple[str, str] | None = _Resolve_Site(match.group('site'))
+    if resolved is None:
+        return None
+
+    url, name = resolved
+    return {'url': url}, f"Opening {name}."
+
+def _Search_Site_Arguments(match: re.Match) -> tuple[dict[str, any], str] | None:
+    site: str = match.group('site')
+    query: str = match.group('query').strip()
+    if site not in SEARCH_SITES or len(query) == 0:
+        return None
+
+    return {'url': SEARCH_SITES[site].format(quote_plus(query))}, f"Searching {site.title()}."
+
+class Intent:
+    """
+    A command that can be handled locally by calling one tool.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        functionName: str,
+        patterns: list[str],
+        resolveArguments: Callable[[re.Match], tuple[dict[str, any], str] | None],
+    ):
+        """
+        Parameters:
+            name (str): The name of the intent.
+            functionName (str): The name of the JarvisFunctions tool it calls.
+            patterns (list[str]): Regular expressions that must match the whole normalized command.
+            resolveArguments (Callable[[re.Match], tuple[dict[str, any], str] | None]): Turns a pattern match into the tool's arguments and a spoken confirmation, or None if the match is not concrete enough.
+        """
+
+        self.name = name
+        self.functionName = functionName
+        self.patterns: list[re.Pattern] = [re.compile(FILLER_PATTERN + pattern) for pattern in patterns]
+        self.resolveArguments = resolveArguments
+
+class Intent_Match:
+    """
+    A command matched to an intent with resolved arguments.
+    """
+
+    def __init__(self, intent: Intent, text: str, arguments: dict[str, any], confirmation: str):
+        self.intent = intent
+        self.text = text
+        self.arguments = arguments
+        self.confirmation = confirmation
+
+# Intents handled locally by default
+DEFAULT_INTENTS: list[Intent] = [
+    Intent(
+        name='search_site',
+        functionName='Open_Webpage',
+        patterns=[
+            r"(?:search|look up)\s+(?P<site>[a-z]+)\s+for\s+(?P<query>.+)",
+            r"(?:search|look up)\s+(?:for\s+)?(?P<query>.+?)\s+on\s+(?P<site>[a-z]+)",
+        ],
+        resolveArguments=_Search_Site_Arguments
+    ),
+    Intent(
+        name='open_site',
+        functionName='Open_Webpage',
+        patterns=[
+            r"(?:open|launch|go to|pull up|bring up)\s+(?P<site>.+?)(?:\s+for me)?(?:\s+please)?",
+        ],
+        resolveArguments=_Open_Site_Arguments
+    ),
+]
+
+class Intent_Matcher:
+    def __init__(
+        self,
+        intents: list[Intent] | None = None,
+        functions: dict[str, Callable[..., str]] | None = None,
+    ):
+        """
+        Parameters:
+            intents (list[Intent] | None): The intents to recognize, in priority order. Defaults to DEFAULT_INTENTS.
+            functions (dict[str, Callable[..., str]] | None): The tools by name. Defaults to the JarvisFunctions tools.
+        """
+
+        if functions is None:
+            import JarvisFunctions
+            functions = {
+                'Open_Webpage': JarvisFunctions.Open_Webpage,
+            }
+
+        # User defined attributes
+        self.intents = intents if intents is not None else DEFAULT_INTENTS
+        self.functions = functions
+
+        # Default attributes
+        self.counters: dict[str, float] = {
+            'commands': 0,
+            'handledLocally': 0,
+            'passedToAssistant': 0,
+            'failures': 0,
+            'localSeconds': 0.0,
+        }
+        self._lock = Lock()
+
+    def Match(self, text: str) -> Intent_Match | None:
+        """
+        Matches a command to the first intent that fully matches it and resolves to concrete arguments.
+
+        Parameters:
+            text (str): The transcribed command.
+
+        Returns:
+            Intent_Match | None: The match, or None if the command should go to the assistant.
+        """
+
+        normalized: str = _Normalize(text)
+
+        for intent in self.intents:
+            if intent.functionName not in self.functions:
+                continue
+
+            for pattern in intent.patterns:
+                match: re.Match | None = pattern.fullmatch(normalized)
+                if match is None:
+                    continue
+
+                resolved: tuple[dict[str, any], str] | None = intent.resolveArguments(match)
+                if resolved is not None:
+                    return Intent_Match(intent, text, *resolved)
+
+        return None
+
+    def Handle(self, text: str) -> tuple[Intent_Match, str] | None:
+        """
+        Calls the tool of a matched command.
+
+        Parameters:
+            text (str): The transcribed command.
+
+        Returns:
+            tuple[Intent_Match, str] | None: The match and the tool's output, or None if the command should go to the assistant.
+        """
+
+        startTime: float = time.perf_counter()
+        match: Intent_Match | None = self.Match(text)
+
+        if match is None:
+            with self._lock:
+                self.counters['commands'] += 1
+                self.counters['passedToAssistant'] += 1
+            return None
+
+        output: str = self.functions[match.intent.functionName](**match.arguments)
+
+        with self._lock:
+            self.counters['commands'] += 1
+            self.counters['handledLocally'] += 1
+            self.counters['localSeconds'] += time.perf_counter() - startTime
+            if output.startswith('Failed'):
+                self.counters['failures'] += 1
+
+        return match, output
+
+    def Describe(self, match: Intent_Match, output: str) -> str:
+        """
+        Describes a locally handled command, as a note for the assistant's thread.
+
+        Parameters:
+            match (Intent_Match): The handled command.
+            output (str): The tool's output.
+
+        Returns:
+            str: The note.
+        """
+
+        arguments: str = ', '.join(f"{key}={value!r}" for key, value in match.arguments.items())
+        return (
+            f"[Handled locally] The user said \"{match.text}\". "
+            f"{match.intent.functionName}({arguments}) was called and returned: {output}"
+        )
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the matcher's counters and the share of commands handled locally.
+
+        Returns:
+            dict[str, any]: The matcher's metrics.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = dict(self.counters)
+
+        metrics['localRate'] = metrics['handledLocally'] / metrics['commands'] if metrics['commands'] > 0 else 0.0
+        return metrics
@@ -32,6 +32,40 @@ def Get_Function_Details() -> list[dict[str, any]]:
                 "required": ["codeSnippet"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "Run_Code_Snippet",
+            "description": "This function runs the given Python code snippet in a sandbox with CPU time, memory and time limits. Returns a JSON object with the snippet's stdout, stderr, exitStatus and timedOut flag.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "codeSnippet": {
+                        "type": "string",
+                        "description": "The Python code snippet to run.",
+                    }
+                },
+                "required": ["codeSnippet"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "Fetch_Webpage",
+            "description": "This function downloads the given URL and returns the page's title and main readable text, truncated to a token budget. Returns 'Failed' with a reason if the page could not be fetched.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "url": {
+                        "type": "string",
+                        "description": "The URL to fetch.",
+                    }
+                },
+                "required": ["url"]
+            }
+        }
     }]
 
     return functions
@@ -46,4 +80,39 @@ def Write_Code_Snippet(codeSnippet: str) -> str:
             file.write(codeSnippet)
         return 'Success'
     except Exception as e:
-        return f'Failed: {e}'
\ No newline at end of file
+        return f'Failed: {e}'
+
+# The shared code runner pool, created by Start_Code_Runner or on first use
+_codeRunnerPool = None
+
+def Start_Code_Runner(workers: int = 2):
+    from CodeRunner import Code_Runner_Pool
+    global _codeRunnerPool
+
+    # Pre-start the workers so the first snippet does not wait on interpreter startup
+    if _codeRunnerPool is None:
+        _codeRunnerPool = Code_Runner_Pool(workers=workers)
+    return _codeRunnerPool
+
+def Run_Code_Snippet(codeSnippet: str) -> str:
+    from json import dumps
+    try:
+        return dumps(Start_Code_Runner().Run(codeSnippet))
+    except Exception as e:
+        return f'Failed: {e}'
+
+# The shared web fetcher and its connection pool, created on first use
+_webFetcher = None
+
+def Fetch_Webpage(url: str) -> str:
+    from WebFetch import Web_Fetcher
+    global _webFetcher
+
+    if _webFetcher is None:
+        _webFetcher = Web_Fetcher()
+
+    try:
+        page: dict[str, any] = _webFetcher.Fetch(url)
+        return f"Title: {page['title']}\nURL: {page['url']}\n\n{page['text']}"
+    except Exception as e:
+        return f'Failed: {e}'
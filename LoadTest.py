@@ -0,0 +1,112 @@
+"""
+Jarvis Server Load Generator
+
+Opens an increasing number of concurrent sessions against a running Server.py and
+reports throughput and latency at each level.
+
+    python LoadTest.py --url http://127.0.0.1:8765 --levels 1,2,4,8,16 --turns 3
+
+The server's token is read from JARVIS_SERVER_TOKEN, or passed with --token.
+"""
+# Imports
+from aiohttp import ClientSession, WSMsgType
+from argparse import ArgumentParser
+from statistics import median
+from os import environ
+import asyncio
+import time
+
+def Percentile(samples: list[float], quantile: float) -> float:
+    """
+    Returns the given quantile of a list of samples, or 0 if there are none.
+    """
+
+    if len(samples) == 0:
+        return 0.0
+
+    ordered: list[float] = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+async def Run_Session(http: ClientSession, url: str, turns: int, prompt: str, results: dict[str, list]) -> None:
+    """
+    Creates a session and sends its turns one after another, recording each turn's timings.
+    """
+
+    async with http.post(f"{url}/sessions") as response:
+        sessionID: str = (await response.json())['session']
+
+    try:
+        async with http.ws_connect(f"{url}/sessions/{sessionID}/ws") as socket:
+            for _ in range(turns):
+                startTime: float = time.perf_counter()
+                firstDelta: float | None = None
+
+                await socket.send_json({"type": "message", "text": prompt})
+
+                async for message in socket:
+                    if message.type != WSMsgType.TEXT:
+                        continue
+
+                    event: dict = message.json()
+                    if event['type'] == 'delta' and firstDelta is None:
+                        firstDelta = time.perf_counter() - startTime
+
+                    elif event['type'] == 'done':
+                        results['latency'].append(time.perf_counter() - startTime)
+                        results['firstDelta'].append(firstDelta if firstDelta is not None else 0.0)
+                        break
+
+                    elif event['type'] == 'error':
+                        results['errors'].append(event['message'])
+                        break
+
+    finally:
+        async with http.delete(f"{url}/sessions/{sessionID}"):
+            pass
+
+async def Run_Level(url: str, token: str, concurrency: int, turns: int, prompt: str) -> dict[str, float]:
+    """
+    Runs one load level and summarizes it.
+    """
+
+    results: dict[str, list] = {'latency': [], 'firstDelta': [], 'errors': []}
+
+    async with ClientSession(headers={'Authorization': f"Bearer {token}"}) as http:
+        startTime: float = time.perf_counter()
+        await asyncio.gather(*[
+            Run_Session(http, url, turns, prompt, results)
+            for _ in range(concurrency)
+        ])
+        elapsed: float = time.perf_counter() - startTime
+
+    return {
+        'sessions': concurrency,
+        'turns': len(results['latency']),
+        'errors': len(results['errors']),
+        'turnsPerSecond': len(results['latency']) / elapsed if elapsed > 0 else 0.0,
+        'firstDeltaP50': median(results['firstDelta']) if results['firstDelta'] else 0.0,
+        'latencyP50': median(results['latency']) if results['latency'] else 0.0,
+        'latencyP95': Percentile(results['latency'], 0.95),
+    }
+
+async def Main() -> None:
+    parser = ArgumentParser(description='Load test a running Jarvis server.')
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--levels', default='1,2,4,8,16')
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--prompt', default='Jarvis, reply with one short sentence.')
+    parser.add_argument('--token', default=environ.get('JARVIS_SERVER_TOKEN', ''))
+    arguments = parser.parse_args()
+
+    print(f"{'sessions':>8} {'turns':>6} {'errors':>6} {'turns/s':>8} {'ttfd p50':>9} {'p50':>7} {'p95':>7}")
+    for level in [int(x) for x in arguments.levels.split(',')]:
+        summary: dict[str, float] = await Run_Level(arguments.url, arguments.token, level, arguments.turns, arguments.prompt)
+        print(
+            f"{summary['sessions']:>8} {summary['turns']:>6} {summary['errors']:>6} "
+            f"{summary['turnsPerSecond']:>8.2f} {summary['firstDeltaP50']:>8.2f}s "
+            f"{summary['latencyP50']:>6.2f}s {summary['latencyP95']:>6.2f}s",
+            flush=True
+        )
+
+if __name__ == '__main__':
+    asyncio.run(Main())
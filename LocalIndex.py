@@ -0,0 +1,607 @@
+"""
+Local Embedding Index
+
+Chunks documents, embeds the chunks in batches and keeps the embeddings in a memory-mapped NumPy
+matrix on disk, so relevant passages can be found locally and attached to the user's message
+before the run starts, instead of only through the file_search tool inside the run.
+
+Rows are unit length, so cosine similarity is a matrix-vector product. Files are indexed
+incrementally: an unchanged file is skipped, and a changed file's old rows are masked out and its
+new rows appended. The matrix is compacted once most of it is masked.
+"""
+# Imports
+from hashlib import sha256
+from threading import Lock
+from typing import Callable
+from openai import OpenAI
+from RequestPolicy import Request_Policy
+import numpy as np
+import json
+import time
+import os
+import re
+
+# File extensions read as plain text
+TEXT_EXTENSIONS: tuple[str, ...] = (
+    '.txt', '.md', '.rst', '.py', '.json', '.csv', '.html', '.htm', '.xml', '.yaml', '.yml', '.ini', '.cfg', '.log'
+)
+
+# The matrix and chunk files of every generation, as embeddings.f32 or embeddings.<generation>.f32
+GENERATION_FILE: re.Pattern = re.compile(r'^(?:embeddings|chunks)(?:\.(\d+))?\.(?:f32|jsonl)$')
+
+def Chunk_Text(text: str, chunkChars: int = 1200, overlapChars: int = 200) -> list[str]:
+    """
+    Splits text into overlapping chunks, preferring to cut at paragraph, then sentence, then word boundaries.
+
+    Parameters:
+        text (str): The text to split.
+        chunkChars (int): The maximum number of characters per chunk.
+        overlapChars (int): The number of characters repeated at the start of the next chunk.
+
+    Returns:
+        list[str]: The chunks.
+    """
+
+    text = re.sub(r'[ \t]+', ' ', text).strip()
+    chunks: list[str] = []
+    start: int = 0
+
+    while start < len(text):
+        end: int = min(start + chunkChars, len(text))
+
+        # Cut at the last boundary in the second half of the window
+        if end < len(text):
+            window: str = text[start:end]
+            for boundary in ('\n\n', '. ', '\n', ' '):
+                cut: int = window.rfind(boundary, chunkChars // 2)
+                if cut > 0:
+                    end = start + cut + len(boundary)
+                    break
+
+        chunk: str = text[start:end].strip()
+        if len(chunk) > 0:
+            chunks.append(chunk)
+
+        if end >= len(text):
+            break
+        # Start the overlap at a word boundary
+        start = max(end - overlapChars, start + 1)
+        space: int = text.find(' ', start, end)
+        if space != -1:
+            start = space + 1
+
+    return chunks
+
+def Read_Document(filePath: str) -> str:
+    """
+    Reads a text document.
+
+    Raises:
+        ValueError: If the file is not a supported text format.
+    """
+
+    if not filePath.lower().endswith(TEXT_EXTENSIONS):
+        raise ValueError(f"Unsupported document type: {filePath}")
+
+    with open(filePath, 'r', encoding='utf-8', errors='replace') as file:
+        return file.read()
+
+class Local_Embedding_Index:
+    def __init__(
+        self,
+        client: OpenAI | None = None,
+        directory: str = '.local_index',
+        model: str = 'text-embedding-3-small',
+        dimensions: int = 512,
+        batchSize: int = 256,
+        requestPolicy: Request_Policy | None = None,
+        embed: Callable[[list[str]], np.ndarray] | None = None,
+        chunkChars: int = 1200,
+        overlapChars: int = 200,
+    ):
+        """
+        Parameters:
+            client (OpenAI | None): The OpenAI client used for embeddings. Not needed if `embed` is provided.
+            directory (str): The directory of the index files.
+            model (str): The embedding model.
+            dimensions (int): The number of embedding dimensions.
+            batchSize (int): The number of chunks embedded per request.
+            requestPolicy (Request_Policy | None): The request policy for embedding requests.
+            embed (Callable[[list[str]], np.ndarray] | None): Embeds a batch of texts, in place of the OpenAI API.
+            chunkChars (int): The maximum number of characters per chunk.
+            overlapChars (int): The number of characters shared by neighbouring chunks.
+        """
+
+        # User defined attributes
+        self.client = client
+        self.directory = directory
+        self.model = model
+        self.dimensions = dimensions
+        self.batchSize = batchSize
+        self.requestPolicy = requestPolicy if requestPolicy is not None else Request_Policy()
+        self.embed = embed
+        self.chunkChars = chunkChars
+        self.overlapChars = overlapChars
+
+        # Default attributes
+        self.files: dict[str, dict[str, any]] = {}
+        self.texts: list[str] = []
+        self.owners: list[str | None] = []
+        self.maskedRows: set[int] = set()
+        self.count: int = 0
+        self.generation: int = 0
+        self.capacity: int = 0
+        self.matrix: np.memmap | None = None
+        self.counters: dict[str, float] = {
+            'embedRequests': 0,
+            'embeddedChunks': 0,
+            'embedSeconds': 0.0,
+            'filesIndexed': 0,
+            'filesSkipped': 0,
+            'queries': 0,
+            'querySeconds': 0.0,
+            'maxQuerySeconds': 0.0,
+            'compactions': 0,
+        }
+        self._lock = Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._Load()
+
+    # # # #
+    #
+    # Storage Methods
+    #
+    # # # #
+
+    def _Path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _Generation_Path(self, name: str, generation: int | None = None) -> str:
+        """
+        Returns the path of the matrix or chunk file of a generation. Each compaction writes a new generation,
+        so the files index.json points at stay valid until it is replaced.
+        """
+
+        generation = self.generation if generation is None else generation
+        if generation == 0:
+            return self._Path(name)
+
+        stem, extension = os.path.splitext(name)
+        return self._Path(f'{stem}.{generation}{extension}')
+
+    def _Remove_Stale_Files(self, keepGeneration: int | None) -> None:
+        """
+        Removes the matrix and chunk files of every generation but `keepGeneration`, left behind by a compaction.
+        """
+
+        for name in os.listdir(self.directory):
+            match: re.Match | None = GENERATION_FILE.match(name)
+            if match is not None and int(match.group(1) or 0) != keepGeneration:
+                os.remove(self._Path(name))
+
+    def _Open_Matrix(self, capacity: int) -> None:
+        """
+        Maps the embedding file with room for `capacity` rows, growing the file if needed.
+        """
+
+        matrixPath: str = self._Generation_Path('embeddings.f32')
+        requiredBytes: int = max(capacity, 1) * self.dimensions * 4
+
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+            self.matrix = None
+
+        with open(matrixPath, 'ab') as file:
+            if file.tell() < requiredBytes:
+                file.truncate(requiredBytes)
+
+        self.capacity = max(capacity, 1)
+        self.matrix = np.memmap(matrixPath, dtype=np.float32, mode='r+', shape=(self.capacity, self.dimensions))
+
+    def _Load(self) -> None:
+        try:
+            with open(self._Path('index.json'), 'r', encoding='utf-8') as file:
+                meta: dict[str, any] = json.load(file)
+            self.generation = meta.get('generation', 0)
+            with open(self._Generation_Path('chunks.jsonl'), 'r', encoding='utf-8') as file:
+                chunks: list[list] = [json.loads(line) for line in file]
+
+        except (OSError, ValueError):
+            meta, chunks = {}, []
+
+        # Start over if the index was built with a different model
+        if meta.get('model') != self.model or meta.get('dimensions') != self.dimensions:
+            meta, chunks = {}, []
+            self._Remove_Stale_Files(None)
+            if os.path.exists(self._Path('index.json')):
+                os.remove(self._Path('index.json'))
+
+        # Drop the files of a compaction that was interrupted, or finished without removing the previous generation
+        self.generation = meta.get('generation', 0)
+        self._Remove_Stale_Files(self.generation)
+
+        self.files = meta.get('files', {})
+        self.count = meta.get('count', 0)
+        self.owners = [owner for owner, _ in chunks][:self.count]
+        self.texts = [text for _, text in chunks][:self.count]
+        self.count = len(self.texts)
+
+        # Rows outside the current version of every file are masked
+        live: set[int] = set()
+        for info in self.files.values():
+            live.update(range(info['start'], info['start'] + info['chunks']))
+        self.maskedRows = set(range(self.count)) - live
+        for row in self.maskedRows:
+            self.owners[row] = None
+
+        self._Open_Matrix(max(self.count, 1024))
+
+    def _Save(self, newChunks: list[tuple[str | None, str]] | None = None, rewrite: bool = False) -> None:
+        """
+        Flushes the matrix and writes the metadata. New chunks are appended unless the chunk file is rewritten.
+        """
+
+        self.matrix.flush()
+
+        chunksPath: str = self._Generation_Path('chunks.jsonl')
+        if rewrite:
+            with open(chunksPath + '.tmp', 'w', encoding='utf-8') as file:
+                for owner, text in zip(self.owners, self.texts):
+                    file.write(json.dumps([owner, text]) + '\n')
+            os.replace(chunksPath + '.tmp', chunksPath)
+
+        elif newChunks:
+            with open(chunksPath, 'a', encoding='utf-8') as file:
+                for owner, text in newChunks:
+                    file.write(json.dumps([owner, text]) + '\n')
+
+        with open(self._Path('index.json.tmp'), 'w', encoding='utf-8') as file:
+            json.dump({
+                'model': self.model,
+                'dimensions': self.dimensions,
+                'generation': self.generation,
+                'count': self.count,
+                'files': self.files,
+            }, file)
+        os.replace(self._Path('index.json.tmp'), self._Path('index.json'))
+
+    # # # #
+    #
+    # Embedding Methods
+    #
+    # # # #
+
+    def _Embed_Batch(self, texts: list[str]) -> np.ndarray:
+        if self.embed is not None:
+            return np.asarray(self.embed(texts), dtype=np.float32)
+
+        response = self.requestPolicy.Execute(
+            'embeddings.create',
+            self.client.embeddings.create,
+            idempotent=True,
+            model=self.model,
+            dimensions=self.dimensions,
+            input=texts
+        )
+        return np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype=np.float32)
+
+    def Embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Embeds texts in batches of `batchSize` and normalizes each row to unit length.
+
+        Parameters:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            np.ndarray: A float32 matrix with one unit-length row per text.
+        """
+
+        vectors: np.ndarray = np.empty((len(texts), self.dimensions), dtype=np.float32)
+
+        for start in range(0, len(texts), self.batchSize):
+            startTime: float = time.perf_counter()
+            batch: list[str] = texts[start:start + self.batchSize]
+            vectors[start:start + len(batch)] = self._Embed_Batch(batch)
+
+            with self._lock:
+                self.counters['embedRequests'] += 1
+                self.counters['embeddedChunks'] += len(batch)
+                self.counters['embedSeconds'] += time.perf_counter() - startTime
+
+        norms: np.ndarray = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # # # #
+    #
+    # Index Update Methods
+    #
+    # # # #
+
+    def Add_Embeddings(self, owner: str | None, texts: list[str], vectors: np.ndarray) -> range:
+        """
+        Appends already embedded chunks to the matrix.
+
+        Parameters:
+            owner (str | None): The name of the file the chunks belong to.
+            texts (list[str]): The chunks.
+            vectors (np.ndarray): Their unit-length embeddings.
+
+        Returns:
+            range: The rows the chunks were written to.
+        """
+
+        with self._lock:
+            start: int = self.count
+            end: int = start + len(texts)
+
+            # Grow the file geometrically so appends stay cheap
+            if end > self.capacity:
+                self._Open_Matrix(max(end, self.capacity * 2))
+
+            self.matrix[start:end] = vectors
+            self.texts.extend(texts)
+            self.owners.extend([owner] * len(texts))
+            self.count = end
+
+        return range(start, end)
+
+    def Add_File(self, fileName: str, filePath: str) -> bool:
+        """
+        Indexes a file, or re-indexes it if its content changed.
+
+        Parameters:
+            fileName (str): The name the file is known by, as in Vector_Store.files.
+            filePath (str): The path of the file.
+
+        Returns:
+            bool: True if the file was indexed, False if it was unchanged.
+
+        Raises:
+            ValueError: If the file is not a supported text format.
+        """
+
+        text: str = Read_Document(filePath)
+        contentHash: str = sha256(text.encode('utf-8')).hexdigest()
+
+        if self.files.get(fileName, {}).get('hash') == contentHash:
+            with self._lock:
+                self.counters['filesSkipped'] += 1
+            return False
+
+        chunks: list[str] = Chunk_Text(text, self.chunkChars, self.overlapChars)
+        vectors: np.ndarray = self.Embed(chunks)
+
+        # Mask out the previous version of the file, then append the new one
+        self._Mask_File(fileName)
+        rows: range = self.Add_Embeddings(fileName, chunks, vectors)
+
+        with self._lock:
+            self.files[fileName] = {'hash': contentHash, 'path': filePath, 'start': rows.start, 'chunks': len(chunks)}
+            self.counters['filesIndexed'] += 1
+            self._Save(newChunks=[(fileName, chunk) for chunk in chunks])
+
+        self._Compact_If_Sparse()
+        return True
+
+    def _Mask_File(self, fileName: str) -> None:
+        with self._lock:
+            info: dict[str, any] | None = self.files.get(fileName)
+            if info is None:
+                return
+
+            for row in range(info['start'], info['start'] + info['chunks']):
+                self.owners[row] = None
+                self.maskedRows.add(row)
+
+    def Remove_File(self, fileName: str) -> bool:
+        """
+        Removes a file from the index.
+
+        Parameters:
+            fileName (str): The name of the file.
+
+        Returns:
+            bool: True if the file was indexed.
+        """
+
+        if fileName not in self.files:
+            return False
+
+        self._Mask_File(fileName)
+        with self._lock:
+            del self.files[fileName]
+            self._Save(rewrite=True)
+
+        self._Compact_If_Sparse()
+        return True
+
+    def _Compact_If_Sparse(self, blockRows: int = 65536) -> None:
+        """
+        Moves the live rows into the files of a new generation once most rows are masked.
+        The current files are left untouched until index.json points at the new ones, so an interrupted
+        compaction leaves the previous index intact.
+        """
+
+        with self._lock:
+            if len(self.maskedRows) == 0 or len(self.maskedRows) < self.count // 2:
+                return
+
+            live: np.ndarray = np.fromiter((owner is not None for owner in self.owners), dtype=bool, count=self.count)
+            liveRows: np.ndarray = np.flatnonzero(live)
+
+            # The number of live rows before each row, which is where a file starting at that row moves to.
+            # Files without chunks have no rows of their own, so their start comes from here too.
+            newStarts: np.ndarray = np.concatenate(([0], np.cumsum(live)))
+
+            # Copy the live rows into a new matrix file in blocks
+            generation: int = self.generation + 1
+            capacity: int = max(len(liveRows), 1024)
+            compacted = np.memmap(
+                self._Generation_Path('embeddings.f32', generation), dtype=np.float32, mode='w+', shape=(capacity, self.dimensions)
+            )
+            for start in range(0, len(liveRows), blockRows):
+                rows: np.ndarray = liveRows[start:start + blockRows]
+                compacted[start:start + len(rows)] = self.matrix[rows]
+            compacted.flush()
+            del compacted
+
+            self.texts = [self.texts[row] for row in liveRows]
+            self.owners = [self.owners[row] for row in liveRows]
+            self.count = len(liveRows)
+            self.maskedRows = set()
+            self.counters['compactions'] += 1
+
+            for info in self.files.values():
+                info['start'] = int(newStarts[info['start']])
+
+            # Writing index.json switches to the new generation, after its chunk file is in place
+            self.generation = generation
+            self._Save(rewrite=True)
+
+            self._Open_Matrix(capacity)
+            self._Remove_Stale_Files(generation)
+
+    # # # #
+    #
+    # Query Methods
+    #
+    # # # #
+
+    def Search_Vector(self, query: np.ndarray, k: int = 4, blockRows: int = 65536) -> list[tuple[float, int]]:
+        """
+        Finds the k rows most similar to a unit-length query vector.
+        The matrix is scored in blocks, so only one block of the memory map is in use at a time.
+
+        Parameters:
+            query (np.ndarray): The query embedding.
+            k (int): The number of rows to return.
+            blockRows (int): The number of rows scored at once.
+
+        Returns:
+            list[tuple[float, int]]: The cosine similarity and row of each match, best first.
+        """
+
+        startTime: float = time.perf_counter()
+        query = np.asarray(query, dtype=np.float32)
+        bestScores: np.ndarray = np.empty(0, dtype=np.float32)
+        bestRows: np.ndarray = np.empty(0, dtype=np.int64)
+
+        with self._lock:
+            count: int = self.count
+            masked: np.ndarray | None = None
+            if len(self.maskedRows) > 0:
+                masked = np.zeros(count, dtype=bool)
+                masked[list(self.maskedRows)] = True
+
+            for start in range(0, count, blockRows):
+                end: int = min(start + blockRows, count)
+                scores: np.ndarray = self.matrix[start:end] @ query
+                if masked is not None:
+                    scores[masked[start:end]] = -np.inf
+
+                # Keep the block's top k and merge with the best so far
+                if len(scores) > k:
+                    top: np.ndarray = np.argpartition(scores, -k)[-k:]
+                else:
+                    top = np.arange(len(scores))
+
+                bestScores = np.concatenate([bestScores, scores[top]])
+                bestRows = np.concatenate([bestRows, top + start])
+                if len(bestScores) > k:
+                    keep: np.ndarray = np.argpartition(bestScores, -k)[-k:]
+                    bestScores, bestRows = bestScores[keep], bestRows[keep]
+
+        order: np.ndarray = np.argsort(-bestScores)
+        results: list[tuple[float, int]] = [
+            (float(bestScores[i]), int(bestRows[i])) for i in order if np.isfinite(bestScores[i])
+        ]
+
+        seconds: float = time.perf_counter() - startTime
+        with self._lock:
+            self.counters['queries'] += 1
+            self.counters['querySeconds'] += seconds
+            self.counters['maxQuerySeconds'] = max(self.counters['maxQuerySeconds'], seconds)
+
+        return results
+
+    def Search(self, query: str, k: int = 4, minScore: float = 0.0) -> list[dict[str, any]]:
+        """
+        Finds the chunks most similar to a query.
+
+        Parameters:
+            query (str): The query text.
+            k (int): The number of chunks to return.
+            minScore (float): The lowest cosine similarity returned.
+
+        Returns:
+            list[dict[str, any]]: Each chunk's score, file name and text, best first.
+        """
+
+        if self.count == 0:
+            return []
+
+        results: list[tuple[float, int]] = self.Search_Vector(self.Embed([query])[0], k)
+        return [
+            {'score': score, 'fileName': self.owners[row], 'text': self.texts[row]}
+            for score, row in results if score >= minScore
+        ]
+
+    def Build_Context(self, query: str, k: int = 4, minScore: float = 0.3, maxChars: int = 4000) -> str | None:
+        """
+        Formats the passages most relevant to a query for attaching to a message.
+
+        Parameters:
+            query (str): The query text.
+            k (int): The number of passages to consider.
+            minScore (float): The lowest cosine similarity attached.
+            maxChars (int): The maximum number of passage characters attached.
+
+        Returns:
+            str | None: The passages, or None if none are relevant enough.
+        """
+
+        lines: list[str] = []
+        total: int = 0
+
+        for i, passage in enumerate(self.Search(query, k, minScore)):
+            if total + len(passage['text']) > maxChars and len(lines) > 0:
+                break
+            lines.append(f"[{i + 1}] ({passage['fileName']}) {passage['text']}")
+            total += len(passage['text'])
+
+        if len(lines) == 0:
+            return None
+
+        return "Relevant passages from the documents:\n" + "\n\n".join(lines)
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the index's size, embedding and query counters.
+
+        Returns:
+            dict[str, any]: The index metrics.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = dict(self.counters)
+            metrics['chunks'] = self.count - len(self.maskedRows)
+            metrics['rows'] = self.count
+            metrics['files'] = len(self.files)
+
+        metrics['averageQuerySeconds'] = metrics['querySeconds'] / metrics['queries'] if metrics['queries'] > 0 else 0.0
+        metrics['chunksPerEmbedRequest'] = metrics['embeddedChunks'] / metrics['embedRequests'] if metrics['embedRequests'] > 0 else 0.0
+        return metrics
+
+    def Close(self) -> None:
+        """
+        Flushes the index to disk and unmaps it.
+        """
+
+        with self._lock:
+            if self.matrix is not None:
+                self.matrix.flush()
+                del self.matrix
+                self.matrix = None
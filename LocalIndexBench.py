@@ -0,0 +1,123 @@
+"""
+Local Index Benchmark
+
+Measures the local embedding index: top-k query latency at 10k, 100k and 1M chunks, the cost of an
+incremental file update on the largest index, and, with --embed-api, how batching changes
+embedding throughput against the OpenAI API.
+
+Usage:
+    python LocalIndexBench.py
+    python LocalIndexBench.py --sizes 10000 100000 --embed-api
+"""
+# Imports
+from LocalIndex import Local_Embedding_Index
+from argparse import ArgumentParser
+import numpy as np
+import tempfile
+import shutil
+import time
+import os
+
+def Random_Unit_Vectors(rows: int, dimensions: int, generator: np.random.Generator) -> np.ndarray:
+    vectors: np.ndarray = generator.standard_normal((rows, dimensions), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def Percentile(samples: list[float], quantile: float) -> float:
+    return float(np.quantile(np.array(samples), quantile))
+
+def Bench_Queries(sizes: list[int], dimensions: int, queries: int, k: int) -> None:
+    generator: np.random.Generator = np.random.default_rng(0)
+    directory: str = tempfile.mkdtemp(prefix='jarvis_index_bench_')
+
+    try:
+        index = Local_Embedding_Index(
+            directory=directory,
+            dimensions=dimensions,
+            embed=lambda texts: Random_Unit_Vectors(len(texts), dimensions, generator)
+        )
+
+        print(f"{'chunks':>10} {'build s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'file MB':>8}")
+        for size in sorted(sizes):
+            # Grow the index to the next size in blocks, as incremental updates would
+            startTime: float = time.perf_counter()
+            while index.count < size:
+                rows: int = min(100_000, size - index.count)
+                index.Add_Embeddings(None, [''] * rows, Random_Unit_Vectors(rows, dimensions, generator))
+            index.matrix.flush()
+            buildSeconds: float = time.perf_counter() - startTime
+
+            # Warm the page cache once, then time the queries
+            queryVectors: np.ndarray = Random_Unit_Vectors(queries + 1, dimensions, generator)
+            index.Search_Vector(queryVectors[0], k)
+
+            latencies: list[float] = []
+            for query in queryVectors[1:]:
+                startTime = time.perf_counter()
+                index.Search_Vector(query, k)
+                latencies.append((time.perf_counter() - startTime) * 1000)
+
+            fileMB: float = os.path.getsize(index.matrix.filename) / 1e6
+            print(f"{size:>10} {buildSeconds:>9.2f} {Percentile(latencies, 0.5):>8.2f} {Percentile(latencies, 0.95):>8.2f} {max(latencies):>8.2f} {fileMB:>8.0f}")
+
+        # Re-index one changed file on the largest index
+        documentPath: str = os.path.join(directory, 'document.txt')
+        for version in range(2):
+            with open(documentPath, 'w', encoding='utf-8') as file:
+                file.write(f"Version {version}.\n\n" + "A sentence about the project and its documents. " * 1200)
+
+            startTime = time.perf_counter()
+            index.Add_File('document.txt', documentPath)
+            print(f"incremental update (version {version}, {index.files['document.txt']['chunks']} chunks): {(time.perf_counter() - startTime) * 1000:.1f} ms")
+
+        startTime = time.perf_counter()
+        index.Add_File('document.txt', documentPath)
+        print(f"unchanged file skipped: {(time.perf_counter() - startTime) * 1000:.1f} ms")
+
+        index.Close()
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def Bench_Embedding_Batches(batchSizes: list[int], chunks: int) -> None:
+    from dotenv import load_dotenv
+    from openai import OpenAI
+    load_dotenv()
+
+    client: OpenAI = OpenAI(api_key=os.environ['OPENAI_API_KEY'], max_retries=0)
+    texts: list[str] = [f"Passage {i} about the assistant's documents and how they are searched." for i in range(chunks)]
+
+    print(f"{'batch':>6} {'requests':>9} {'seconds':>8} {'chunks/s':>9}")
+    for batchSize in batchSizes:
+        directory: str = tempfile.mkdtemp(prefix='jarvis_embed_bench_')
+        try:
+            index = Local_Embedding_Index(client=client, directory=directory, batchSize=batchSize)
+
+            startTime: float = time.perf_counter()
+            index.Embed(texts)
+            seconds: float = time.perf_counter() - startTime
+
+            metrics: dict[str, any] = index.Get_Metrics()
+            print(f"{batchSize:>6} {metrics['embedRequests']:>9} {seconds:>8.2f} {chunks / seconds:>9.1f}")
+            index.Close()
+
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def Main() -> None:
+    parser = ArgumentParser(description='Benchmark the local embedding index.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dimensions', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--embed-api', action='store_true', help='Also measure embedding batch sizes against the OpenAI API.')
+    parser.add_argument('--embed-chunks', type=int, default=512)
+    arguments = parser.parse_args()
+
+    Bench_Queries(arguments.sizes, arguments.dimensions, arguments.queries, arguments.k)
+
+    if arguments.embed_api:
+        Bench_Embedding_Batches([1, 16, 128, 256], arguments.embed_chunks)
+
+if __name__ == '__main__':
+    Main()
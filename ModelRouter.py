@@ -0,0 +1,293 @@
+"""
+Per-Turn Model Routing
+
+Picks the language model of each run from cheap local features of the user's message, so short
+conversational turns run on a small, fast model and code or multi-step requests on a larger one.
+The choice is passed as a per-run model override, leaving the assistant's own model unchanged.
+The latency and token usage of every route are recorded.
+"""
+# Imports
+from Assistant2 import Assistant_V2, Assistant_Error, Language_Model, Stream_Handler
+from openai.types.beta.threads import Run
+from threading import Lock
+from typing import Callable
+import time
+import re
+
+# Words that suggest a request for code
+CODE_KEYWORDS: set[str] = {
+    'code', 'function', 'script', 'program', 'python', 'javascript', 'regex', 'sql',
+    'debug', 'bug', 'error', 'exception', 'compile', 'algorithm', 'class', 'snippet'
+}
+
+# Words that suggest a request that needs several steps of reasoning
+REASONING_KEYWORDS: set[str] = {
+    'explain', 'why', 'compare', 'analyze', 'analyse', 'plan', 'design', 'prove',
+    'calculate', 'summarize', 'summarise', 'pros', 'cons', 'difference', 'step'
+}
+
+# The type of each feature returned by Extract_Features
+FEATURE_TYPES: dict[str, type] = {
+    'words': int,
+    'characters': int,
+    'questions': int,
+    'hasCode': bool,
+    'hasUrl': bool,
+    'codeKeywords': int,
+    'reasoningKeywords': int,
+}
+
+def Extract_Features(text: str) -> dict[str, any]:
+    """
+    Extracts cheap features of a user's message for routing.
+
+    Parameters:
+        text (str): The user's message.
+
+    Returns:
+        dict[str, any]: The message's word and character counts, question count, and whether it contains code, URLs, code keywords or reasoning keywords.
+    """
+
+    words: list[str] = re.findall(r"[a-z0-9']+", text.lower())
+    wordSet: set[str] = set(words)
+
+    return {
+        'words': len(words),
+        'characters': len(text),
+        'questions': text.count('?'),
+        'hasCode': '```' in text or bool(re.search(r'\bdef |\bimport |[{};]\s*$|=>', text, re.MULTILINE)),
+        'hasUrl': bool(re.search(r'https?://|www\.', text)),
+        'codeKeywords': len(wordSet & CODE_KEYWORDS),
+        'reasoningKeywords': len(wordSet & REASONING_KEYWORDS),
+    }
+
+class Route_Rule:
+    """
+    Sends a turn to a language model when its features meet a condition.
+    """
+
+    def __init__(self, name: str, languageModel: Language_Model, condition: Callable[[dict[str, any]], bool]):
+        """
+        Parameters:
+            name (str): The name of the route, used in metrics.
+            languageModel (Language_Model): The language model of matching turns.
+            condition (Callable[[dict[str, any]], bool]): Returns True for the features of matching turns.
+        """
+
+        self.name = name
+        self.languageModel = languageModel
+        self.condition = condition
+
+    @classmethod
+    def From_Config(cls, config: dict[str, any]) -> 'Route_Rule':
+        """
+        Creates a rule from a configuration entry, such as one loaded from JSON.
+        Every feature named in the entry must match. Keys starting with "min" or "max" bound a
+        numeric feature, e.g. {"maxWords": 12}, and other keys must equal the feature, e.g. {"hasCode": true}.
+
+        Parameters:
+            config (dict[str, any]): The entry, with "name" and "model" (a Language_Model member name) and feature bounds.
+
+        Returns:
+            Route_Rule: The rule.
+
+        Raises:
+            Assistant_Error: If the entry has no name or model, names an unknown model or feature, or compares a feature with a value of the wrong type.
+        """
+
+        name: any = config.get('name')
+        if not isinstance(name, str) or name == '':
+            raise Assistant_Error(message=f"Route rule {config} has no name.", code=307)
+
+        if config.get('model') not in Language_Model.__members__:
+            raise Assistant_Error(
+                message=f"Route rule '{name}' names an unknown model: {config.get('model')}. Expected one of {', '.join(Language_Model.__members__)}.",
+                code=307
+            )
+
+        bounds: dict[str, any] = {key: value for key, value in config.items() if key not in ('name', 'model')}
+
+        # Check every key here, so a typo fails when the rules are loaded instead of on the first turn
+        for key, value in bounds.items():
+            bounded: bool = key.startswith(('min', 'max')) and key[3:4].isupper()
+            feature: str = key[3].lower() + key[4:] if bounded else key
+
+            if feature not in FEATURE_TYPES:
+                raise Assistant_Error(
+                    message=f"Route rule '{name}' uses an unknown feature: {key}. Expected one of {', '.join(FEATURE_TYPES)}, or a numeric one prefixed with min or max.",
+                    code=307
+                )
+
+            # Booleans are ints in Python, so they are told apart explicitly
+            numeric: bool = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if bounded and not (FEATURE_TYPES[feature] is int and numeric):
+                raise Assistant_Error(message=f"Route rule '{name}' bounds {feature} with {value!r}, but only counts take a numeric bound.", code=307)
+
+            expected: bool = numeric if FEATURE_TYPES[feature] is int else isinstance(value, bool)
+            if not bounded and not expected:
+                raise Assistant_Error(
+                    message=f"Route rule '{name}' compares {feature} with {value!r}, but it is a {'number' if FEATURE_TYPES[feature] is int else 'boolean'}.",
+                    code=307
+                )
+
+        def Condition(features: dict[str, any]) -> bool:
+            for key, value in bounds.items():
+                if key in FEATURE_TYPES:
+                    if features[key] != value:
+                        return False
+                elif key.startswith('min') and features[key[3].lower() + key[4:]] < value:
+                    return False
+                elif key.startswith('max') and features[key[3].lower() + key[4:]] > value:
+                    return False
+            return True
+
+        return cls(name, Language_Model[config['model']], Condition)
+
+# Routes used when no rules are provided, in priority order
+DEFAULT_RULES: list[Route_Rule] = [
+    Route_Rule(
+        name='code',
+        languageModel=Language_Model.GPT_4O,
+        condition=lambda features: features['hasCode'] or features['codeKeywords'] >= 2
+    ),
+    Route_Rule(
+        name='complex',
+        languageModel=Language_Model.GPT_4O,
+        condition=lambda features: features['words'] > 40 or features['reasoningKeywords'] >= 2 or features['questions'] >= 3
+    ),
+    Route_Rule(
+        name='conversational',
+        languageModel=Language_Model.GPT_4O_MINI,
+        condition=lambda features: True
+    ),
+]
+
+class Model_Router:
+    def __init__(self, rules: list[Route_Rule] | None = None, defaultModel: Language_Model | None = None):
+        """
+        Parameters:
+            rules (list[Route_Rule] | None): The routes, checked in order. Defaults to DEFAULT_RULES.
+            defaultModel (Language_Model | None): The model of turns no rule matches. Defaults to the assistant's model.
+        """
+
+        # User defined attributes
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.defaultModel = defaultModel
+
+        # Default attributes
+        self.routeMetrics: dict[str, dict[str, any]] = {}
+        self._lock = Lock()
+
+    def Route(self, text: str) -> tuple[str, Language_Model | None]:
+        """
+        Picks the language model of a turn.
+
+        Parameters:
+            text (str): The user's message.
+
+        Returns:
+            tuple[str, Language_Model | None]: The route's name and its model. None runs on the assistant's model.
+        """
+
+        features: dict[str, any] = Extract_Features(text)
+        for rule in self.rules:
+            if rule.condition(features):
+                return rule.name, rule.languageModel
+
+        return 'default', self.defaultModel
+
+    def Record(self, routeName: str, languageModel: Language_Model | None, seconds: float, run: Run | None) -> None:
+        """
+        Records the latency and token usage of a routed run.
+
+        Parameters:
+            routeName (str): The route's name.
+            languageModel (Language_Model | None): The model the run used.
+            seconds (float): The run's duration.
+            run (Run | None): The run as of its last event, for its usage.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = self.routeMetrics.setdefault(routeName, {
+                'model': languageModel.value if languageModel is not None else None,
+                'turns': 0,
+                'failures': 0,
+                'totalSeconds': 0.0,
+                'maxSeconds': 0.0,
+                'promptTokens': 0,
+                'completionTokens': 0,
+            })
+
+            metrics['turns'] += 1
+            metrics['totalSeconds'] += seconds
+            metrics['maxSeconds'] = max(metrics['maxSeconds'], seconds)
+
+            if run is None or run.status != 'completed':
+                metrics['failures'] += 1
+            if run is not None and run.usage is not None:
+                metrics['promptTokens'] += run.usage.prompt_tokens
+                metrics['completionTokens'] += run.usage.completion_tokens
+
+    def Stream_Response(
+        self,
+        assistant: Assistant_V2,
+        threadName: str,
+        textContent: str,
+        streamHandler: Stream_Handler | None = None,
+        sendMessage: bool = False
+    ) -> Run | None:
+        """
+        Streams the assistant's response on the model picked for the user's message, and records the route.
+
+        Parameters:
+            assistant (Assistant_V2): The assistant to run.
+            threadName (str): The name of the thread to process.
+            textContent (str): The user's message, used for routing.
+            streamHandler (Stream_Handler | None): The stream handler to use. If not provided, a default stream handler is used.
+            sendMessage (bool): Whether the message is sent with the run. Otherwise it must already be in the thread.
+
+        Returns:
+            Run | None: The run as of its last event.
+
+        Raises:
+            Assistant_Error: If the thread does not exist, or if the run failed to complete.
+        """
+
+        routeName, languageModel = self.Route(textContent)
+        startTime: float = time.perf_counter()
+        run: Run | None = None
+
+        try:
+            if sendMessage:
+                run = assistant.Send_And_Stream(
+                    threadName=threadName,
+                    textContent=textContent,
+                    streamHandler=streamHandler,
+                    languageModel=languageModel
+                )
+            else:
+                run = assistant.Stream_Response(
+                    threadName=threadName,
+                    streamHandler=streamHandler,
+                    languageModel=languageModel
+                )
+            return run
+
+        finally:
+            self.Record(routeName, languageModel, time.perf_counter() - startTime, run)
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the turns, failures, latency and token usage of every route.
+
+        Returns:
+            dict[str, any]: The metrics of each route by name.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = {name: dict(route) for name, route in self.routeMetrics.items()}
+
+        for route in metrics.values():
+            route['averageSeconds'] = route['totalSeconds'] / route['turns'] if route['turns'] > 0 else 0.0
+
+        return metrics
@@ -0,0 +1,277 @@
+from SpeechNormalizer import Speech_Normalizer
+from queue import Queue
+from threading import Condition, Lock, RLock, Thread
+from typing import Callable, TextIO
+import sys
+import time
+
+class Output_Sink:
+    """
+    Base class for destinations of streamed assistant text.
+
+    Text is buffered and emitted in batches, once the buffer reaches `maxBufferSize` characters
+    or `flushInterval` seconds have passed since the last emit, whichever comes first.
+    Buffered text is flushed by the sink's flusher thread if no further write arrives in time, e.g. while
+    the model pauses mid-stream. The flusher lives for as long as text keeps arriving.
+    A sink is written to by one stream at a time.
+    """
+
+    # Seconds the flusher thread waits for more text before it exits, so sinks that are never closed do not keep a thread
+    FLUSHER_IDLE_SECONDS: float = 5.0
+
+    def __init__(self, maxBufferSize: int = 64, flushInterval: float = 0.05):
+        """
+        Parameters:
+            maxBufferSize (int): The number of buffered characters that triggers a flush. 0 emits every write.
+            flushInterval (float): The number of seconds after which buffered text is flushed.
+        """
+
+        # User defined attributes
+        self.maxBufferSize = maxBufferSize
+        self.flushInterval = flushInterval
+
+        # Default attributes
+        self.buffer: list[str] = []
+        self.bufferSize: int = 0
+        self.lastFlush: float = time.monotonic()
+        self.closed: bool = False
+
+        # Guards the buffer, which the writer and the flusher thread share, and wakes the flusher
+        self._condition = Condition(RLock())
+        self._flusher: Thread | None = None
+
+    def Write(self, text: str) -> None:
+        """
+        Buffers text, flushing if the size or time limit is reached.
+
+        Parameters:
+            text (str): The text to write.
+        """
+
+        with self._condition:
+            self.buffer.append(text)
+            self.bufferSize += len(text)
+
+            if self.bufferSize >= self.maxBufferSize or time.monotonic() - self.lastFlush >= self.flushInterval:
+                self.Flush()
+                return
+
+            if self._flusher is None:
+                self._flusher = Thread(target=self._Flush_Loop, name=f"{type(self).__name__}_Flusher", daemon=True)
+                self._flusher.start()
+            self._condition.notify()
+
+    def Flush(self) -> None:
+        """
+        Emits any buffered text.
+        """
+
+        with self._condition:
+            self.lastFlush = time.monotonic()
+            if self.bufferSize == 0:
+                return
+
+            text: str = self.buffer[0] if len(self.buffer) == 1 else ''.join(self.buffer)
+            self.buffer.clear()
+            self.bufferSize = 0
+
+            # Emitted under the lock, so text from the flusher and the writer stays in order
+            self._Emit(text)
+
+    def Close(self) -> None:
+        """
+        Flushes the sink, stops its flusher and releases its resources.
+        """
+
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+            self.Flush()
+
+    def _Flush_Loop(self) -> None:
+        """
+        Flushes text that has waited for the flush interval, until the sink is closed or stays empty for FLUSHER_IDLE_SECONDS.
+        """
+
+        with self._condition:
+            while not self.closed:
+                elapsed: float = time.monotonic() - self.lastFlush
+
+                if self.bufferSize == 0:
+                    if elapsed >= self.FLUSHER_IDLE_SECONDS:
+                        break
+                    self._condition.wait(self.FLUSHER_IDLE_SECONDS - elapsed)
+
+                elif elapsed >= self.flushInterval:
+                    self.Flush()
+
+                else:
+                    self._condition.wait(self.flushInterval - elapsed)
+
+            # Cleared under the lock, so the next write starts a new flusher
+            self._flusher = None
+
+    def _Emit(self, text: str) -> None:
+        raise NotImplementedError
+
+class Console_Sink(Output_Sink):
+    """
+    Writes text to the console, or any other text stream.
+    """
+
+    def __init__(self, stream: TextIO | None = None, maxBufferSize: int = 64, flushInterval: float = 0.05):
+        super().__init__(maxBufferSize, flushInterval)
+
+        self.stream = stream
+
+    def _Emit(self, text: str) -> None:
+        # Resolve stdout on use so redirected output is respected
+        stream: TextIO = self.stream if self.stream is not None else sys.stdout
+        stream.write(text)
+        stream.flush()
+
+class File_Sink(Output_Sink):
+    """
+    Appends text to a transcript file.
+    """
+
+    def __init__(self, filePath: str, maxBufferSize: int = 4096, flushInterval: float = 1.0):
+        super().__init__(maxBufferSize, flushInterval)
+
+        self.filePath = filePath
+        self.file: TextIO = open(filePath, 'a', encoding='utf-8')
+
+    def _Emit(self, text: str) -> None:
+        self.file.write(text)
+        self.file.flush()
+
+    def Close(self) -> None:
+        super().Close()
+        self.file.close()
+
+class Queue_Sink(Output_Sink):
+    """
+    Puts text on a queue, e.g. for a text to speech worker.
+    """
+
+    def __init__(self, queue: Queue, maxBufferSize: int = 256, flushInterval: float = 0.25):
+        super().__init__(maxBufferSize, flushInterval)
+
+        self.queue = queue
+
+    def _Emit(self, text: str) -> None:
+        self.queue.put(text)
+
+class Callback_Sink(Output_Sink):
+    """
+    Passes text to a callback, e.g. to send it over a WebSocket.
+    """
+
+    def __init__(self, callback: Callable[[str], None], maxBufferSize: int = 64, flushInterval: float = 0.05):
+        super().__init__(maxBufferSize, flushInterval)
+
+        self.callback = callback
+
+    def _Emit(self, text: str) -> None:
+        self.callback(text)
+
+class Held_Sink(Output_Sink):
+    """
+    Holds text back from other sinks until it is released, e.g. while a response is speculative.
+    Once released, held text is passed on and later text goes straight through.
+    Unlike other sinks, it may be released or discarded from another thread while it is written to.
+    """
+
+    def __init__(self, sinks: list[Output_Sink]):
+        super().__init__(maxBufferSize=0, flushInterval=0.0)
+
+        self.sinks = sinks
+        self.held: bool = True
+        self.discarded: bool = False
+        self.heldText: list[str] = []
+        self.firstWriteTime: float | None = None
+        self._lock = Lock()
+
+    def Write(self, text: str) -> None:
+        with self._lock:
+            if self.discarded:
+                return
+
+            if self.firstWriteTime is None and len(text) > 0:
+                self.firstWriteTime = time.monotonic()
+
+            if self.held:
+                self.heldText.append(text)
+                return
+
+            for sink in self.sinks:
+                sink.Write(text)
+
+    def Flush(self) -> None:
+        with self._lock:
+            if self.held or self.discarded:
+                return
+
+            for sink in self.sinks:
+                sink.Flush()
+
+    def Release(self) -> None:
+        """
+        Passes the held text on and stops holding.
+        """
+
+        with self._lock:
+            self.held = False
+            for text in self.heldText:
+                for sink in self.sinks:
+                    sink.Write(text)
+            self.heldText.clear()
+
+            for sink in self.sinks:
+                sink.Flush()
+
+    def Discard(self) -> None:
+        """
+        Drops the held text and everything written afterwards.
+        """
+
+        with self._lock:
+            self.discarded = True
+            self.heldText.clear()
+
+class Speech_Sink(Output_Sink):
+    """
+    Normalizes streamed message text for speech as it arrives, keeping code and markup out of it.
+    The speakable text of each message is kept, and passed on to other sinks, e.g. a queue feeding a speech engine.
+    Flushing ends the current message.
+    """
+
+    def __init__(self, sinks: list[Output_Sink] | None = None, normalizer: Speech_Normalizer | None = None):
+        super().__init__(maxBufferSize=0, flushInterval=0.0)
+
+        self.sinks = sinks if sinks is not None else []
+        self.normalizer = normalizer if normalizer is not None else Speech_Normalizer()
+        self.messages: list[str] = []
+        self.parts: list[str] = []
+
+    def Write(self, text: str) -> None:
+        speech: str = self.normalizer.Feed(text)
+        if len(speech) > 0:
+            self._Emit(speech)
+
+    def Flush(self) -> None:
+        speech: str = self.normalizer.Finish()
+        if len(speech) > 0:
+            self._Emit(speech)
+
+        if len(self.parts) > 0:
+            self.messages.append(''.join(self.parts).strip())
+            self.parts.clear()
+
+        for sink in self.sinks:
+            sink.Flush()
+
+    def _Emit(self, text: str) -> None:
+        self.parts.append(text)
+        for sink in self.sinks:
+            sink.Write(text)
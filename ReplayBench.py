@@ -0,0 +1,236 @@
+"""
+Replay Benchmark
+
+Feeds recorded audio through the same listening and transcription path as the microphone, and
+reports utterances per second, wake word hits, false wakes and CPU use.
+
+A clip directory may hold a transcript next to each clip (e.g. clip01.txt for clip01.wav). A wake
+heard in a clip whose transcript does not contain the wake word counts as a false wake.
+
+With --echo-suppression, sessions recorded with reference tracks (e.g. clip01.ref.wav) are replayed
+twice, without and with echo suppression, and the speech recognition calls and false wakes avoided
+are reported. The replay fails unless the echo canceller's ERLE (echo return loss enhancement) is
+above --min-erle, 0 dB by default, since a canceller that makes the echo louder is only hidden by the gate.
+
+Usage:
+    python ReplayBench.py recordings/ --recognizer sphinx
+    python ReplayBench.py room.wav --real-time
+    python ReplayBench.py sessions/ --recognizer none --echo-suppression
+"""
+# Imports
+from CaptureSources import Replay_Source, Replay_Stream, File_Source, Clip_Directory_Source
+from EchoSuppression import Echo_Suppressor, Echo_Suppressed_Stream
+from detection import Transcribe_Next, Recognize_Google
+from argparse import ArgumentParser
+from typing import Callable
+import speech_recognition as sr
+import numpy as np
+import json
+import time
+import sys
+import os
+
+def Recognize_Sphinx(r: sr.Recognizer, audio: sr.AudioData) -> str:
+    return r.recognize_sphinx(audio)
+
+def Recognize_Nothing(r: sr.Recognizer, audio: sr.AudioData) -> str:
+    # Measures listening and endpointing alone
+    return ''
+
+RECOGNIZERS: dict[str, Callable[[sr.Recognizer, sr.AudioData], str]] = {
+    'google': Recognize_Google,
+    'sphinx': Recognize_Sphinx,
+    'none': Recognize_Nothing,
+}
+
+def Load_Expected_Wakes(source: Replay_Source, wakeWord: str) -> dict[str, bool]:
+    """
+    Reads the transcript next to each clip, if any, and returns whether each clip should wake the assistant.
+    """
+
+    expected: dict[str, bool] = {}
+    for clip in source.clips:
+        transcriptPath: str = os.path.splitext(clip.path)[0] + '.txt'
+        if os.path.exists(transcriptPath):
+            with open(transcriptPath, 'r', encoding='utf-8') as file:
+                expected[clip.path] = wakeWord in file.read().lower()
+
+    return expected
+
+def Recorded_Reference(stream: Replay_Stream) -> tuple[np.ndarray | None, bool]:
+    """
+    Returns the reference track of the audio a replay stream read last, for echo suppression.
+    """
+
+    if stream.lastReference is None:
+        return None, False
+    return np.frombuffer(stream.lastReference, dtype='<i2'), False
+
+def Run_Replay(
+    source: Replay_Source,
+    recognize: Callable[[sr.Recognizer, sr.AudioData], str],
+    wakeWord: str = 'jarvis',
+    echoSuppressor: Echo_Suppressor | None = None
+) -> dict[str, any]:
+    """
+    Replays a source through the listening path until it runs out of audio.
+
+    Parameters:
+        source (Replay_Source): The audio to replay.
+        recognize (Callable[[sr.Recognizer, sr.AudioData], str]): The speech recognizer.
+        wakeWord (str): The word that wakes the assistant.
+        echoSuppressor (Echo_Suppressor | None): Removes the clips' reference tracks from the audio before it is listened to.
+
+    Returns:
+        dict[str, any]: The benchmark results.
+
+    Raises:
+        ValueError: If echo suppression is requested for audio that is not 16-bit.
+    """
+
+    if echoSuppressor is not None and source.SAMPLE_WIDTH != 2:
+        raise ValueError(f"Echo suppression needs 16-bit audio, the clips have {source.SAMPLE_WIDTH * 8}-bit samples")
+
+    expected: dict[str, bool] = Load_Expected_Wakes(source, wakeWord)
+    wokenClips: set[str] = set()
+    counters: dict[str, float] = {
+        'sttCalls': 0,
+        'utterances': 0,
+        'unrecognized': 0,
+        'wakes': 0,
+        'falseWakes': 0,
+        'recognizeErrors': 0,
+    }
+
+    recognizeCalls: list[int] = [0]
+
+    def Counted_Recognize(r: sr.Recognizer, audio: sr.AudioData) -> str:
+        recognizeCalls[0] += 1
+        return recognize(r, audio)
+
+    r = sr.Recognizer()
+    startWall: float = time.perf_counter()
+    startCPU: float = time.process_time()
+
+    with source:
+        if echoSuppressor is not None:
+            stream: Replay_Stream = source.stream
+            source.stream = Echo_Suppressed_Stream(stream, echoSuppressor, lambda frames: Recorded_Reference(stream))
+
+        while True:
+            # Every phrase the listening path hands on costs a recognition call
+            callsBefore: int = recognizeCalls[0]
+            try:
+                text: str | None = Transcribe_Next(r, source, Counted_Recognize)
+            except EOFError:
+                break
+            except sr.RequestError:
+                counters['recognizeErrors'] += 1
+                continue
+            finally:
+                counters['sttCalls'] += recognizeCalls[0] - callsBefore
+
+            counters['utterances'] += 1
+            if text is None:
+                counters['unrecognized'] += 1
+                r = sr.Recognizer()
+                continue
+
+            if wakeWord in text:
+                counters['wakes'] += 1
+                clip: str = source.stream.Current_Clip().path
+                wokenClips.add(clip)
+                if expected.get(clip) is False:
+                    counters['falseWakes'] += 1
+
+        audioSeconds: float = source.Audio_Seconds()
+
+    wallSeconds: float = time.perf_counter() - startWall
+    cpuSeconds: float = time.process_time() - startCPU
+
+    results: dict[str, any] = {
+        **counters,
+        'missedWakes': sum(1 for clip, wakes in expected.items() if wakes and clip not in wokenClips),
+        'labelledClips': len(expected),
+        'audioSeconds': audioSeconds,
+        'wallSeconds': wallSeconds,
+        'cpuSeconds': cpuSeconds,
+        'cpuPercent': 100 * cpuSeconds / wallSeconds if wallSeconds > 0 else 0.0,
+        'utterancesPerSecond': counters['utterances'] / wallSeconds if wallSeconds > 0 else 0.0,
+        'realTimeFactor': audioSeconds / wallSeconds if wallSeconds > 0 else 0.0,
+    }
+    if echoSuppressor is not None:
+        results['echoSuppression'] = echoSuppressor.Get_Metrics()
+
+    return results
+
+def Compare_Echo_Suppression(
+    source: Replay_Source,
+    recognize: Callable[[sr.Recognizer, sr.AudioData], str],
+    wakeWord: str = 'jarvis',
+    minErleDb: float = 0.0
+) -> dict[str, any]:
+    """
+    Replays a source without and then with echo suppression, and reports the recognition calls and false wakes it avoided.
+
+    Parameters:
+        source (Replay_Source): The audio to replay, with reference tracks.
+        recognize (Callable[[sr.Recognizer, sr.AudioData], str]): The speech recognizer.
+        wakeWord (str): The word that wakes the assistant.
+        minErleDb (float): The echo return loss enhancement, in dB, the canceller must exceed for the replay to pass.
+
+    Returns:
+        dict[str, any]: The results of both replays and the differences between them, with 'passed' and the reasons of any failure.
+    """
+
+    baseline: dict[str, any] = Run_Replay(source, recognize, wakeWord)
+    suppressed: dict[str, any] = Run_Replay(source, recognize, wakeWord, Echo_Suppressor(source.SAMPLE_RATE, seed=0))
+
+    referenceClips: int = sum(1 for clip in source.clips if clip.reference is not None)
+    erleDb: float = suppressed['echoSuppression']['erleDb']
+
+    failures: list[str] = []
+    if referenceClips == 0:
+        failures.append("No clip has a reference track")
+    elif erleDb <= minErleDb:
+        failures.append(f"ERLE was {erleDb:.1f} dB, not above {minErleDb} dB")
+
+    return {
+        'passed': len(failures) == 0,
+        'failures': failures,
+        'erleDb': erleDb,
+        'baseline': baseline,
+        'suppressed': suppressed,
+        'referenceClips': referenceClips,
+        'sttCallsAvoided': baseline['sttCalls'] - suppressed['sttCalls'],
+        'falseWakesAvoided': baseline['falseWakes'] - suppressed['falseWakes'],
+        'missedWakesAdded': suppressed['missedWakes'] - baseline['missedWakes'],
+    }
+
+def Main() -> None:
+    parser = ArgumentParser(description='Replay recorded audio through the listening pipeline.')
+    parser.add_argument('path', help='A WAV or raw PCM file, or a directory of clips.')
+    parser.add_argument('--real-time', action='store_true', help='Pace the audio to real time instead of reading it as fast as possible.')
+    parser.add_argument('--recognizer', choices=list(RECOGNIZERS), default='google', help='The speech recognizer to use.')
+    parser.add_argument('--wake-word', default='jarvis')
+    parser.add_argument('--gap', type=float, default=3.0, help='Seconds of silence before each clip and after the last.')
+    parser.add_argument('--sample-rate', type=int, default=16000, help='The sample rate of raw PCM files.')
+    parser.add_argument('--echo-suppression', action='store_true', help='Replay without and with echo suppression of the reference tracks, and compare.')
+    parser.add_argument('--min-erle', type=float, default=0.0, help='The ERLE in dB the echo canceller must exceed for an echo suppression replay to pass.')
+    arguments = parser.parse_args()
+
+    if os.path.isdir(arguments.path):
+        source: Replay_Source = Clip_Directory_Source(arguments.path, arguments.real_time, arguments.gap, arguments.sample_rate)
+    else:
+        source: Replay_Source = File_Source(arguments.path, arguments.real_time, arguments.sample_rate, gapSeconds=arguments.gap)
+
+    if arguments.echo_suppression:
+        results: dict[str, any] = Compare_Echo_Suppression(source, RECOGNIZERS[arguments.recognizer], arguments.wake_word, arguments.min_erle)
+        print(json.dumps(results, indent=2))
+        sys.exit(0 if results['passed'] else 1)
+
+    results: dict[str, any] = Run_Replay(source, RECOGNIZERS[arguments.recognizer], arguments.wake_word)
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    Main()
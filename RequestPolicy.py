@@ -0,0 +1,438 @@
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+from httpx import ConnectError
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from threading import Lock
+from typing import Callable, Iterator, TypeVar
+import inspect
+import random
+import time
+
+T = TypeVar('T')
+
+# The absolute deadline (time.monotonic) of the request chain currently being executed
+_currentDeadline: ContextVar[float | None] = ContextVar('_currentDeadline', default=None)
+
+def _Accepts_Timeout(function: Callable) -> bool:
+    """
+    Returns whether a function takes a `timeout` argument by name, as the OpenAI client's request methods do.
+    Helpers such as upload_and_poll and wrappers that only forward **kwargs do not.
+    """
+
+    try:
+        return 'timeout' in inspect.signature(function).parameters
+    except (TypeError, ValueError):
+        return False
+
+class Deadline_Exceeded(TimeoutError):
+    """
+    Exception class for requests that ran out of time before they could complete.
+    """
+
+    def __init__(self, operation: str):
+        """
+        An error that occurs when a request's deadline passes before it succeeds.
+
+        Parameters:
+            operation (str): The name of the operation that ran out of time.
+        """
+
+        self.operation = operation
+        super().__init__(f"Deadline exceeded for '{operation}'")
+
+class Request_Policy:
+    """
+    Central retry, backoff, deadline and hedging policy for API requests.
+
+    The OpenAI client should be created with `max_retries=0` when a policy is used,
+    otherwise the client's own retries are multiplied by the policy's retries.
+    """
+
+    # Error classes that are safe to retry for any request
+    SAFE_RETRY_CLASSES: tuple[str] = ('rate_limit', 'connect')
+
+    # Error classes that are only safe to retry for idempotent requests
+    IDEMPOTENT_RETRY_CLASSES: tuple[str] = ('rate_limit', 'connect', 'connection', 'timeout', 'server')
+
+    def __init__(
+        self,
+        maxRetries: int = 4,
+        baseDelay: float = 0.25,
+        maxDelay: float = 8.0,
+        defaultTimeout: float | None = None,
+        hedging: bool = False,
+        hedgeQuantile: float = 0.95,
+        hedgeMinSamples: int = 20,
+        hedgeWorkers: int = 4,
+        latencyWindow: int = 200,
+    ):
+        """
+        Parameters:
+            maxRetries (int): The maximum number of retries after the first attempt.
+            baseDelay (float): The base backoff delay in seconds.
+            maxDelay (float): The upper bound of a single backoff delay in seconds.
+            defaultTimeout (float | None): The deadline in seconds applied when no deadline is active. None for no deadline.
+            hedging (bool): Whether idempotent requests may send a hedged duplicate.
+            hedgeQuantile (float): The latency quantile after which a hedged request is sent.
+            hedgeMinSamples (int): The number of latency samples needed before hedging starts.
+            hedgeWorkers (int): The number of worker threads used for hedged requests.
+            latencyWindow (int): The number of recent latency samples kept per operation.
+        """
+
+        # User defined attributes
+        self.maxRetries = maxRetries
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.defaultTimeout = defaultTimeout
+        self.hedging = hedging
+        self.hedgeQuantile = hedgeQuantile
+        self.hedgeMinSamples = hedgeMinSamples
+        self.hedgeWorkers = hedgeWorkers
+        self.latencyWindow = latencyWindow
+
+        # Default attributes
+        self.counters: dict[str, int] = {
+            'calls': 0,
+            'retries': 0,
+            'hedges': 0,
+            'hedgeWins': 0,
+            'failures': 0,
+            'deadlinesExceeded': 0,
+        }
+        self.retriesByClass: dict[str, int] = {}
+        self.latencies: dict[str, deque[float]] = {}
+        self._lock = Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    # # # #
+    #
+    # Classification Methods
+    #
+    # # # #
+
+    def Classify_Exception(self, exception: Exception) -> str:
+        """
+        Classifies an exception raised by the OpenAI client.
+
+        Parameters:
+            exception (Exception): The exception to classify.
+
+        Returns:
+            str: One of 'rate_limit', 'connect', 'connection', 'timeout', 'server' or 'fatal'.
+        """
+
+        # Timeouts are checked first since they are also connection errors
+        if isinstance(exception, APITimeoutError):
+            return 'timeout'
+
+        # A failed connect means the request never reached the server
+        if isinstance(exception, APIConnectionError):
+            if isinstance(exception.__cause__, ConnectError):
+                return 'connect'
+            return 'connection'
+
+        if isinstance(exception, APIStatusError):
+            # An exhausted quota will not recover by waiting
+            if exception.status_code == 429:
+                return 'fatal' if getattr(exception, 'code', None) == 'insufficient_quota' else 'rate_limit'
+
+            if exception.status_code == 408:
+                return 'timeout'
+
+            if exception.status_code >= 500:
+                return 'server'
+
+        return 'fatal'
+
+    def Is_Retryable(self, errorClass: str, idempotent: bool) -> bool:
+        """
+        Checks if a request that failed with the given error class may be retried.
+
+        Parameters:
+            errorClass (str): The class returned by Classify_Exception.
+            idempotent (bool): Whether the request can safely be sent more than once.
+
+        Returns:
+            bool: True if the request may be retried, False otherwise.
+        """
+
+        if idempotent:
+            return errorClass in self.IDEMPOTENT_RETRY_CLASSES
+        return errorClass in self.SAFE_RETRY_CLASSES
+
+    # # # #
+    #
+    # Deadline Methods
+    #
+    # # # #
+
+    @contextmanager
+    def Deadline(self, seconds: float) -> Iterator[float]:
+        """
+        Sets a deadline for every request executed inside the context, including nested ones.
+        An inner deadline can only shorten an outer deadline, never extend it.
+
+        Parameters:
+            seconds (float): The number of seconds from now until the deadline.
+
+        Yields:
+            float: The absolute deadline in time.monotonic() seconds.
+        """
+
+        deadline: float = time.monotonic() + seconds
+
+        # Keep the earlier deadline if one is already active
+        outerDeadline: float | None = _currentDeadline.get()
+        if outerDeadline is not None:
+            deadline = min(deadline, outerDeadline)
+
+        token = _currentDeadline.set(deadline)
+        try:
+            yield deadline
+        finally:
+            _currentDeadline.reset(token)
+
+    def _Remaining(self, deadline: float | None) -> float | None:
+        """
+        Returns the number of seconds left until the deadline, or None if there is no deadline.
+        """
+
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    # # # #
+    #
+    # Latency Tracking Methods
+    #
+    # # # #
+
+    def _Record_Latency(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            if operation not in self.latencies:
+                self.latencies[operation] = deque(maxlen=self.latencyWindow)
+            self.latencies[operation].append(seconds)
+
+    def Get_Latency_Quantile(self, operation: str, quantile: float | None = None) -> float | None:
+        """
+        Returns a latency quantile for an operation.
+
+        Parameters:
+            operation (str): The name of the operation.
+            quantile (float | None): The quantile to compute. Defaults to the hedge quantile.
+
+        Returns:
+            float | None: The latency in seconds, or None if there are not enough samples.
+        """
+
+        if quantile is None:
+            quantile = self.hedgeQuantile
+
+        with self._lock:
+            samples: list[float] = sorted(self.latencies.get(operation, ()))
+
+        if len(samples) < self.hedgeMinSamples:
+            return None
+
+        return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+    # # # #
+    #
+    # Execution Methods
+    #
+    # # # #
+
+    def _Count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+
+    def _Backoff_Delay(self, attempt: int, exception: Exception) -> float:
+        """
+        Returns a full-jitter exponential backoff delay, honouring a server sent Retry-After header.
+        """
+
+        delay: float = random.uniform(0, min(self.maxDelay, self.baseDelay * (2 ** attempt)))
+
+        # Respect the server's hint if it asks for a longer wait
+        response = getattr(exception, 'response', None)
+        if response is not None:
+            try:
+                delay = max(delay, min(self.maxDelay, float(response.headers.get('retry-after', 0))))
+            except ValueError:
+                pass
+
+        return delay
+
+    def _Call(self, function: Callable[..., T], deadline: float | None, args: tuple, kwargs: dict) -> T:
+        """
+        Calls the function once, passing the time left until the deadline as the request timeout if it takes one.
+        Otherwise the deadline is only checked between attempts.
+        """
+
+        remaining: float | None = self._Remaining(deadline)
+        if remaining is not None and _Accepts_Timeout(getattr(function, '__func__', function)):
+            kwargs = {**kwargs, 'timeout': max(remaining, 0.001)}
+
+        return function(*args, **kwargs)
+
+    def _Hedged_Call(self, operation: str, function: Callable[..., T], deadline: float | None, args: tuple, kwargs: dict) -> T:
+        """
+        Calls the function and sends a duplicate if it is slower than the operation's latency quantile.
+        The first response wins, and the slower request is left to finish in the background.
+        """
+
+        hedgeDelay: float | None = self.Get_Latency_Quantile(operation)
+
+        # Fall back to a plain call until enough latency samples are collected
+        if hedgeDelay is None:
+            return self._Call(function, deadline, args, kwargs)
+
+        # Never wait past the deadline for the first attempt
+        remaining: float | None = self._Remaining(deadline)
+        if remaining is not None:
+            hedgeDelay = min(hedgeDelay, max(remaining, 0))
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hedgeWorkers,
+                    thread_name_prefix='Request_Hedge'
+                )
+
+        primary = self._executor.submit(self._Call, function, deadline, args, kwargs)
+        done, _ = wait([primary], timeout=hedgeDelay)
+        if done:
+            return primary.result()
+
+        # Send the hedged duplicate
+        self._Count('hedges')
+        hedge = self._executor.submit(self._Call, function, deadline, args, kwargs)
+        pending = {primary, hedge}
+
+        # Return the first successful response, or the last error if both fail
+        error: Exception | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._Count('hedgeWins')
+                    return future.result()
+                error = future.exception()
+
+        raise error
+
+    def Execute(
+        self,
+        operation: str,
+        function: Callable[..., T],
+        *args,
+        idempotent: bool = False,
+        hedge: bool = False,
+        **kwargs,
+    ) -> T:
+        """
+        Executes a request with classified retries, jittered exponential backoff and deadline propagation.
+
+        Parameters:
+            operation (str): The name used for latency tracking and metrics, e.g. 'threads.retrieve'.
+            function (Callable): The client method to call.
+            *args: Positional arguments for the function.
+            idempotent (bool): Whether the request can safely be sent more than once.
+            hedge (bool): Whether a hedged duplicate may be sent. Ignored for non idempotent requests.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            T: The function's return value.
+
+        Raises:
+            Deadline_Exceeded: If the deadline passes before the request succeeds.
+            Exception: The last error raised by the function if it is not retryable or retries are exhausted.
+        """
+
+        self._Count('calls')
+
+        # Use the active deadline, or start a new one
+        deadline: float | None = _currentDeadline.get()
+        if deadline is None and self.defaultTimeout is not None:
+            deadline = time.monotonic() + self.defaultTimeout
+
+        useHedging: bool = self.hedging and hedge and idempotent
+
+        attempt: int = 0
+        while True:
+            # Check the deadline before every attempt
+            remaining: float | None = self._Remaining(deadline)
+            if remaining is not None and remaining <= 0:
+                self._Count('deadlinesExceeded')
+                raise Deadline_Exceeded(operation)
+
+            startTime: float = time.monotonic()
+            try:
+                if useHedging:
+                    result: T = self._Hedged_Call(operation, function, deadline, args, kwargs)
+                else:
+                    result: T = self._Call(function, deadline, args, kwargs)
+
+                self._Record_Latency(operation, time.monotonic() - startTime)
+                return result
+
+            except Exception as e:
+                errorClass: str = self.Classify_Exception(e)
+
+                # Give up on fatal errors and once retries run out
+                if attempt >= self.maxRetries or not self.Is_Retryable(errorClass, idempotent):
+                    self._Count('failures')
+                    raise
+
+                # Give up if the backoff would pass the deadline
+                delay: float = self._Backoff_Delay(attempt, e)
+                remaining = self._Remaining(deadline)
+                if remaining is not None and delay >= remaining:
+                    self._Count('failures')
+                    raise
+
+                with self._lock:
+                    self.counters['retries'] += 1
+                    self.retriesByClass[errorClass] = self.retriesByClass.get(errorClass, 0) + 1
+
+                time.sleep(delay)
+                attempt += 1
+
+    # # # #
+    #
+    # Metrics Methods
+    #
+    # # # #
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the policy's counters and the per-operation hedge delays.
+
+        Returns:
+            dict[str, any]: The policy's metrics.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = dict(self.counters)
+            metrics['retriesByClass'] = dict(self.retriesByClass)
+            operations: list[str] = list(self.latencies.keys())
+
+        metrics['p95Seconds'] = {
+            operation: self.Get_Latency_Quantile(operation, 0.95)
+            for operation in operations
+        }
+
+        return metrics
+
+    def Close(self) -> None:
+        """
+        Shuts down the hedging worker threads.
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,472 @@
+"""
+Jarvis Server
+
+Serves one Assistant_V2 to many clients over local HTTP and WebSocket.
+Each client session gets its own thread, and turns run on a bounded worker pool
+that shares one OpenAI connection pool.
+
+    POST   /sessions           -> {"session": id}
+    DELETE /sessions/{id}
+    GET    /sessions/{id}/ws   -> WebSocket
+    GET    /metrics
+
+Every request must carry the server's token, as an `Authorization: Bearer <token>` header or,
+for browser WebSockets that cannot set headers, a `token` query parameter. Requests from a
+browser page whose Origin is not allowed are rejected, so other websites cannot drive the server.
+
+WebSocket protocol:
+    client -> {"type": "message", "text": str, "audio": bool}
+    server -> {"type": "start"} | {"type": "delta", "text": str} | {"type": "tool", "name": str}
+              {"type": "queued"} when the message will be answered by the session's active run's follow-up
+              binary audio chunks followed by {"type": "audio_done"} when audio was requested
+              {"type": "done", "seconds": float} | {"type": "error", "message": str} to end the turn
+"""
+# Imports
+from Assistant2 import Assistant_V2, Assistant_Error, Stream_Handler
+from RequestPolicy import Request_Policy
+from OutputSinks import Callback_Sink
+from typing_extensions import override
+from openai import OpenAI, NOT_GIVEN
+from aiohttp import web, WSMsgType
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from uuid import uuid4
+import JarvisFunctions
+import asyncio
+import secrets
+import httpx
+import hmac
+import json
+import time
+
+class Session_Stream_Handler(Stream_Handler):
+    """
+    Stream handler that publishes a session's events instead of printing them.
+    Text deltas are batched into delta events by a callback sink.
+    Function calls are answered only with tools that are safe to run for a remote client. Tools that
+    act on the host, such as opening its browser or writing and running code, must be passed in explicitly.
+    """
+
+    def __init__(
+        self,
+        client,
+        publish: Callable[[dict], None],
+        assistantName = 'Assistant',
+        requestPolicy = None,
+        functions: dict[str, Callable[..., str]] | None = None
+    ):
+        super().__init__(
+            client,
+            assistantName,
+            requestPolicy,
+            sinks=[Callback_Sink(lambda text: publish({"type": "delta", "text": text}))]
+        )
+
+        self.publish = publish
+        self.functions = functions if functions is not None else {
+            'Fetch_Webpage': JarvisFunctions.Fetch_Webpage,
+        }
+
+    @override
+    def Handle_Required_Actions(self, data) -> list[dict]:
+        toolOutputs: list[dict] = []
+
+        for tool in data.required_action.submit_tool_outputs.tool_calls:
+            # Answer every call, so a bad or unknown one fails on its own instead of leaving the run waiting
+            function: Callable[..., str] | None = self.functions.get(tool.function.name)
+            if function is None:
+                output: str = f"Failed: Unknown function {tool.function.name}"
+
+            else:
+                try:
+                    output: str = function(**json.loads(tool.function.arguments))
+                except (ValueError, TypeError) as e:
+                    output: str = f"Failed: {e}"
+
+            toolOutputs.append({
+                "tool_call_id": tool.id,
+                "output": output
+            })
+
+        return toolOutputs
+
+    @override
+    def on_text_created(self, text) -> None:
+        return None
+
+    @override
+    def on_tool_call_created(self, tool_call) -> None:
+        self._Flush()
+        self.publish({"type": "tool", "name": tool_call.type})
+
+class Session:
+    def __init__(self, id: str, threadName: str, queueSize: int):
+        self.id = id
+        self.threadName = threadName
+
+        # Outgoing events, bounded so a slow client only stalls its own turn
+        self.events: asyncio.Queue = asyncio.Queue(maxsize=queueSize)
+
+class Jarvis_Server:
+    def __init__(
+        self,
+        assistant: Assistant_V2,
+        streamHandlerClass: type[Session_Stream_Handler] = Session_Stream_Handler,
+        maxWorkers: int = 8,
+        maxQueuedTurns: int = 32,
+        sessionQueueSize: int = 64,
+        ttsModel: str = 'tts-1',
+        ttsVoice: str = 'onyx',
+        token: str | None = None,
+        allowedOrigins: list[str] | None = None,
+    ):
+        """
+        Parameters:
+            assistant (Assistant_V2): The assistant shared by every session.
+            streamHandlerClass (type[Session_Stream_Handler]): The stream handler used for each turn.
+            maxWorkers (int): The number of turns that may run at once.
+            maxQueuedTurns (int): The number of turns that may wait for a worker before new turns are rejected.
+            sessionQueueSize (int): The number of undelivered events a session may buffer before its turn is paused.
+            ttsModel (str): The speech model used for audio replies.
+            ttsVoice (str): The voice used for audio replies.
+            token (str | None): The token every request must carry. None generates a random token.
+            allowedOrigins (list[str] | None): The browser origins allowed to connect, e.g. 'http://localhost:3000'. Requests without an Origin are always allowed.
+        """
+
+        # User defined attributes
+        self.assistant = assistant
+        self.streamHandlerClass = streamHandlerClass
+        self.maxWorkers = maxWorkers
+        self.maxQueuedTurns = maxQueuedTurns
+        self.sessionQueueSize = sessionQueueSize
+        self.ttsModel = ttsModel
+        self.ttsVoice = ttsVoice
+        self.token = token if token is not None else secrets.token_urlsafe(32)
+        self.allowedOrigins = set(allowedOrigins) if allowedOrigins is not None else set()
+
+        # Default attributes
+        self.sessions: dict[str, Session] = {}
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='Jarvis_Turn')
+        self.admission = asyncio.Semaphore(maxWorkers + maxQueuedTurns)
+        self.counters: dict[str, int] = {
+            'turns': 0,
+            'turnsFailed': 0,
+            'turnsRejected': 0,
+            'activeTurns': 0,
+        }
+
+    # # # #
+    #
+    # Application Methods
+    #
+    # # # #
+
+    def Create_App(self) -> web.Application:
+        """
+        Creates the aiohttp application.
+
+        Returns:
+            web.Application: The application with the server's routes.
+        """
+
+        app = web.Application(middlewares=[self._Authorize])
+        app.add_routes([
+            web.post('/sessions', self._Create_Session),
+            web.delete('/sessions/{id}', self._Delete_Session),
+            web.get('/sessions/{id}/ws', self._Session_Socket),
+            web.get('/metrics', self._Metrics),
+        ])
+        app.on_shutdown.append(self._Shutdown)
+
+        return app
+
+    @web.middleware
+    async def _Authorize(self, request: web.Request, handler: Callable) -> web.StreamResponse:
+        """
+        Rejects requests from disallowed browser origins and requests without the server's token.
+        """
+
+        # Browsers always send an Origin on cross-origin requests and WebSocket upgrades
+        origin: str | None = request.headers.get('Origin')
+        if origin is not None and origin not in self.allowedOrigins:
+            return web.json_response({"error": "Origin not allowed"}, status=403)
+
+        token: str = request.query.get('token', '')
+        authorization: str = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            token = authorization.removeprefix('Bearer ')
+
+        if not hmac.compare_digest(token.encode(), self.token.encode()):
+            return web.json_response({"error": "Unauthorized"}, status=401)
+
+        return await handler(request)
+
+    async def _Run_Blocking(self, function: Callable, *args, **kwargs):
+        """
+        Runs a blocking assistant call on the worker pool.
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: function(*args, **kwargs))
+
+    async def _Shutdown(self, app: web.Application) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # # # #
+    #
+    # Session Methods
+    #
+    # # # #
+
+    async def _Create_Session(self, request: web.Request) -> web.Response:
+        sessionID: str = uuid4().hex
+        threadName: str = f"session-{sessionID}"
+
+        try:
+            await self._Run_Blocking(self.assistant.Create_Thread, threadName)
+
+        except Assistant_Error as e:
+            return web.json_response({"error": str(e)}, status=502)
+
+        self.sessions[sessionID] = Session(
+            id=sessionID,
+            threadName=threadName,
+            queueSize=self.sessionQueueSize
+        )
+
+        return web.json_response({"session": sessionID})
+
+    async def _Delete_Session(self, request: web.Request) -> web.Response:
+        session: Session | None = self.sessions.pop(request.match_info['id'], None)
+        if session is None:
+            return web.json_response({"error": "Unknown session"}, status=404)
+
+        try:
+            await self._Run_Blocking(self.assistant.Delete_Thread_By_Name, session.threadName)
+
+        except Assistant_Error as e:
+            return web.json_response({"error": str(e)}, status=502)
+
+        return web.json_response({"deleted": True})
+
+    async def _Metrics(self, request: web.Request) -> web.Response:
+        metrics: dict[str, any] = self.assistant.Get_Metrics()
+        metrics['server'] = {
+            **self.counters,
+            'sessions': len(self.sessions),
+            'maxWorkers': self.maxWorkers,
+        }
+
+        return web.json_response(metrics)
+
+    # # # #
+    #
+    # Turn Methods
+    #
+    # # # #
+
+    def _Run_Turn(self, session: Session, text: str, audio: bool, publish: Callable[[dict | bytes], None]) -> None:
+        """
+        Runs one turn on a worker thread, publishing its events to the session.
+        """
+
+        streamHandlers: list[Session_Stream_Handler] = []
+
+        def Create_Stream_Handler() -> Session_Stream_Handler:
+            streamHandler: Session_Stream_Handler = self.streamHandlerClass(
+                client=self.assistant.client,
+                publish=publish,
+                assistantName=self.assistant.name,
+                requestPolicy=self.assistant.requestPolicy
+            )
+            streamHandlers.append(streamHandler)
+            return streamHandler
+
+        # Send the user's text and stream the response, or queue it behind the session's active run
+        if not self.assistant.Submit_Message(
+            threadName=session.threadName,
+            textContent=text,
+            streamHandlerFactory=Create_Stream_Handler
+        ):
+            publish({"type": "queued"})
+            return
+
+        # Stream the spoken reply of each run
+        if audio:
+            for streamHandler in streamHandlers:
+                if len(streamHandler.responseMessages) == 0:
+                    continue
+
+                # Only opening the response is retried. Once chunks are published a failure ends the turn
+                response = self.assistant.requestPolicy.Execute(
+                    'audio.speech.create',
+                    self._Open_Speech,
+                    input=streamHandler.responseMessages[-1],
+                    idempotent=True
+                )
+
+                try:
+                    for chunk in response.iter_bytes(chunk_size=16384):
+                        publish(chunk)
+                finally:
+                    response.close()
+
+            publish({"type": "audio_done"})
+
+    def _Open_Speech(self, input: str, timeout: float | None = NOT_GIVEN):
+        """
+        Sends a speech request and returns its response once the headers arrive, with the audio left to stream.
+        """
+
+        return self.assistant.client.audio.speech.with_streaming_response.create(
+            model=self.ttsModel,
+            voice=self.ttsVoice,
+            input=input,
+            timeout=timeout
+        ).__enter__()
+
+    async def _Start_Turn(self, session: Session, text: str, audio: bool) -> None:
+        loop = asyncio.get_running_loop()
+
+        def publish(event: dict | bytes) -> None:
+            # Block the worker while the session's queue is full
+            asyncio.run_coroutine_threadsafe(session.events.put(event), loop).result()
+
+        startTime: float = time.perf_counter()
+        finalEvent: dict = {}
+
+        try:
+            self.counters['activeTurns'] += 1
+            await session.events.put({"type": "start"})
+            await self._Run_Blocking(self._Run_Turn, session, text, audio, publish)
+            self.counters['turns'] += 1
+            finalEvent = {"type": "done", "seconds": time.perf_counter() - startTime}
+
+        except Exception as e:
+            self.counters['turnsFailed'] += 1
+            finalEvent = {"type": "error", "message": str(e)}
+
+        finally:
+            self.counters['activeTurns'] -= 1
+            self.admission.release()
+
+        # Only report the end of the turn once the session can accept the next one
+        await session.events.put(finalEvent)
+
+    async def _Send_Events(self, session: Session, socket: web.WebSocketResponse) -> None:
+        """
+        Delivers a session's events to its socket in order.
+        Once the socket is closed, events are discarded so running turns are never blocked.
+        """
+
+        while True:
+            event: dict | bytes = await session.events.get()
+            if socket.closed:
+                continue
+
+            try:
+                if isinstance(event, bytes):
+                    await socket.send_bytes(event)
+                else:
+                    await socket.send_json(event)
+
+            except ConnectionResetError:
+                continue
+
+    async def _Session_Socket(self, request: web.Request) -> web.WebSocketResponse:
+        session: Session | None = self.sessions.get(request.match_info['id'])
+        if session is None:
+            return web.json_response({"error": "Unknown session"}, status=404)
+
+        socket = web.WebSocketResponse(heartbeat=30)
+        await socket.prepare(request)
+
+        sender: asyncio.Task = asyncio.create_task(self._Send_Events(session, socket))
+        turns: set[asyncio.Task] = set()
+
+        try:
+            async for message in socket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+
+                try:
+                    payload: dict = message.json()
+                except ValueError:
+                    await session.events.put({"type": "error", "message": "Expected a JSON message"})
+                    continue
+
+                if not isinstance(payload, dict) or payload.get("type") != "message" or not payload.get("text"):
+                    await session.events.put({"type": "error", "message": "Expected a message with text"})
+                    continue
+
+                # Reject the turn if the worker pool and its queue are full
+                if self.admission.locked():
+                    self.counters['turnsRejected'] += 1
+                    await session.events.put({"type": "error", "message": "Server is busy"})
+                    continue
+
+                await self.admission.acquire()
+                task = asyncio.create_task(self._Start_Turn(session, payload["text"], bool(payload.get("audio"))))
+                turns.add(task)
+                task.add_done_callback(turns.discard)
+
+        finally:
+            # Let running turns finish so their threads stay consistent, then stop delivering
+            if turns:
+                await asyncio.gather(*turns, return_exceptions=True)
+            sender.cancel()
+
+        return socket
+
+"""
+Server Entry Point
+"""
+def Main() -> None:
+    from argparse import ArgumentParser
+    from dotenv import load_dotenv
+    from os import environ
+
+    parser = ArgumentParser(description='Serve Jarvis over local HTTP and WebSocket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--queued-turns', type=int, default=32)
+    parser.add_argument('--allowed-origin', action='append', default=[], help='A browser origin allowed to connect. May be repeated.')
+    arguments = parser.parse_args()
+
+    load_dotenv()
+
+    # Share one connection pool, sized for every worker plus hedged requests
+    client: OpenAI = OpenAI(
+        api_key=environ['OPENAI_API_KEY'],
+        max_retries=0,
+        http_client=httpx.Client(
+            limits=httpx.Limits(
+                max_connections=arguments.workers * 2,
+                max_keepalive_connections=arguments.workers * 2
+            )
+        )
+    )
+
+    assistant: Assistant_V2 = Assistant_V2(
+        client=client,
+        id=environ['ASSISTANT_ID'],
+        requestPolicy=Request_Policy(hedging=True, hedgeWorkers=arguments.workers)
+    )
+
+    # Read the token from the environment rather than the command line, where other users could see it
+    server: Jarvis_Server = Jarvis_Server(
+        assistant=assistant,
+        maxWorkers=arguments.workers,
+        maxQueuedTurns=arguments.queued_turns,
+        token=environ.get('JARVIS_SERVER_TOKEN'),
+        allowedOrigins=arguments.allowed_origin
+    )
+
+    if 'JARVIS_SERVER_TOKEN' not in environ:
+        print(f"Server token: {server.token}", flush=True)
+
+    web.run_app(server.Create_App(), host=arguments.host, port=arguments.port)
+
+if __name__ == '__main__':
+    Main()
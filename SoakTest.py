@@ -0,0 +1,664 @@
+"""
+Soak Test
+
+Drives thousands of simulated turns through Assistant_V2, Stream_Handler, Vector_Store and the
+cloud TTS path against a local mock of the OpenAI API, the way main.py's loop runs for days. Memory
+(RSS and tracemalloc), open file descriptors and sockets are sampled as the turns run, and the test
+fails when memory grows faster than a set slope or handles keep accumulating.
+
+The mock API runs in its own process, so only the assistant's memory and handles are measured.
+Every few turns the mock asks for a tool call or cites a file, and a file is uploaded to the
+vector store and deleted again.
+
+Usage:
+    python SoakTest.py --turns 5000
+    python SoakTest.py --turns 20000 --max-slope 0.5 --report soak.json
+"""
+# Imports
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from argparse import ArgumentParser, SUPPRESS
+from itertools import count
+import subprocess
+import tracemalloc
+import tempfile
+import json
+import time
+import sys
+import gc
+import os
+import re
+
+"""
+Mock API
+"""
+# Streamed in every assistant message, one word per delta
+REPLY: str = "Sure, here is a short answer that is long enough to stream in several pieces."
+
+# Markers in a user message that make the mock ask for a tool call, or cite a file
+TOOL_MARKER: str = '[tool]'
+CITE_MARKER: str = '[cite]'
+
+# Raw 24 kHz 16-bit PCM returned for every speech request, a quarter second of silence
+SPEECH: bytes = bytes(12000)
+
+_ids = count(1)
+
+def _Id(prefix: str) -> str:
+    return f"{prefix}_{next(_ids)}"
+
+def _Run(threadID: str, runID: str, status: str, requiredAction: dict | None = None) -> dict:
+    return {
+        "id": runID, "object": "thread.run", "created_at": 0, "assistant_id": "asst_soak", "thread_id": threadID,
+        "status": status, "instructions": "", "model": "gpt-4o-mini", "tools": [], "parallel_tool_calls": True,
+        "tool_choice": "auto", "truncation_strategy": {"type": "auto", "last_messages": None},
+        "incomplete_details": None, "last_error": None, "max_completion_tokens": None, "max_prompt_tokens": None,
+        "metadata": {}, "required_action": requiredAction, "response_format": "auto", "started_at": None,
+        "expires_at": None, "cancelled_at": None, "completed_at": None, "failed_at": None,
+        "usage": {"prompt_tokens": 40, "completion_tokens": 20, "total_tokens": 60} if status == "completed" else None,
+    }
+
+def _Message(threadID: str, messageID: str, runID: str | None, text: str, annotations: list[dict], status: str) -> dict:
+    return {
+        "id": messageID, "object": "thread.message", "created_at": 0, "thread_id": threadID, "role": "assistant",
+        "run_id": runID, "assistant_id": "asst_soak", "status": status, "attachments": [], "metadata": {},
+        "incomplete_details": None, "completed_at": None, "incomplete_at": None,
+        "content": [{"type": "text", "text": {"value": text, "annotations": annotations}}] if status == "completed" else [],
+    }
+
+def _Event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class Mock_API_Handler(BaseHTTPRequestHandler):
+    """
+    Answers the Assistants, vector store, file and speech requests the assistant makes.
+    The mock keeps no state beyond the tool rounds of runs in progress, so it does not grow either.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    # Headers and body are written separately, which Nagle's algorithm would hold back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    # The threads of runs waiting for tool outputs by run ID, removed when the run completes
+    pendingRuns: dict[str, str] = {}
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _Read_Body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body: bytearray = bytearray()
+            while True:
+                size: int = int(self.rfile.readline().strip().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _Send(self, body: bytes, contentType: str = 'application/json') -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _Send_Json(self, data: dict) -> None:
+        self._Send(json.dumps(data).encode('utf-8'))
+
+    def _Stream_Run(self, threadID: str, runID: str, text: str, newThread: bool, submitted: bool) -> None:
+        events: list[str] = []
+        if newThread:
+            events.append(_Event("thread.created", {"id": threadID, "object": "thread", "created_at": 0, "metadata": {}, "tool_resources": None}))
+        events.append(_Event("thread.run.created", _Run(threadID, runID, "queued")))
+
+        # A new run asks for one tool call when the message asks for it, and completes once it is answered
+        if not submitted and TOOL_MARKER in text:
+            Mock_API_Handler.pendingRuns[runID] = threadID
+            events.append(_Event("thread.run.requires_action", _Run(threadID, runID, "requires_action", {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {"tool_calls": [{
+                    "id": _Id("call"), "type": "function",
+                    "function": {"name": "Soak_Tool", "arguments": json.dumps({"turn": runID})}
+                }]}
+            })))
+            self._Send(''.join(events + ["event: done\ndata: [DONE]\n\n"]).encode('utf-8'), 'text/event-stream')
+            return
+
+        Mock_API_Handler.pendingRuns.pop(runID, None)
+        reply: str = REPLY
+        annotations: list[dict] = []
+        if CITE_MARKER in text:
+            reply += " 【4:0†notes.txt】"
+            annotations.append({
+                "type": "file_citation", "text": "【4:0†notes.txt】", "start_index": len(REPLY) + 1,
+                "end_index": len(reply), "file_citation": {"file_id": "file_cited"}
+            })
+
+        messageID: str = _Id("msg")
+        events.append(_Event("thread.message.created", _Message(threadID, messageID, runID, "", [], "in_progress")))
+        for index, word in enumerate(reply.split(' ')):
+            events.append(_Event("thread.message.delta", {
+                "id": messageID, "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": word if index == 0 else ' ' + word, "annotations": []}}]}
+            }))
+        events.append(_Event("thread.message.completed", _Message(threadID, messageID, runID, reply, annotations, "completed")))
+        events.append(_Event("thread.run.completed", _Run(threadID, runID, "completed")))
+        events.append("event: done\ndata: [DONE]\n\n")
+        self._Send(''.join(events).encode('utf-8'), 'text/event-stream')
+
+    def do_POST(self) -> None:
+        route: str = self.path.split('?')[0].removeprefix('/v1')
+        body: bytes = self._Read_Body()
+        data: dict = json.loads(body) if body and self.headers.get('Content-Type', '').startswith('application/json') else {}
+
+        if route == '/assistants' or re.fullmatch(r'/assistants/[^/]+', route):
+            self._Send_Json(self._Assistant(route.split('/')[2] if route.count('/') == 2 else _Id("asst"), data))
+
+        elif route == '/threads':
+            self._Send_Json({"id": _Id("thread"), "object": "thread", "created_at": 0, "metadata": {}, "tool_resources": None})
+
+        elif route == '/threads/runs':
+            messages: list[dict] = data.get('thread', {}).get('messages', [])
+            self._Stream_Run(_Id("thread"), _Id("run"), ' '.join(str(message.get('content')) for message in messages), True, False)
+
+        elif match := re.fullmatch(r'/threads/([^/]+)/messages', route):
+            self._Send_Json(_Message(match.group(1), _Id("msg"), None, str(data.get('content', '')), [], "completed"))
+
+        elif match := re.fullmatch(r'/threads/([^/]+)/runs', route):
+            messages: list[dict] = data.get('additional_messages') or []
+            self._Stream_Run(match.group(1), _Id("run"), ' '.join(str(message.get('content')) for message in messages), False, False)
+
+        elif match := re.fullmatch(r'/threads/([^/]+)/runs/([^/]+)/submit_tool_outputs', route):
+            self._Stream_Run(match.group(1), match.group(2), '', False, True)
+
+        elif match := re.fullmatch(r'/threads/([^/]+)/runs/([^/]+)/cancel', route):
+            Mock_API_Handler.pendingRuns.pop(match.group(2), None)
+            self._Send_Json(_Run(match.group(1), match.group(2), "cancelled"))
+
+        elif route == '/vector_stores':
+            self._Send_Json(self._Vector_Store(_Id("vs"), data.get('name', '')))
+
+        elif match := re.fullmatch(r'/vector_stores/([^/]+)/files', route):
+            self._Send_Json(self._Vector_Store_File(match.group(1), data.get('file_id', _Id("file"))))
+
+        elif route == '/files':
+            self._Send_Json({"id": _Id("file"), "object": "file", "bytes": len(body), "created_at": 0, "filename": "upload", "purpose": "assistants", "status": "processed"})
+
+        elif route == '/audio/speech':
+            self._Send(SPEECH, 'application/octet-stream')
+
+        else:
+            self.send_error(404)
+
+    def do_GET(self) -> None:
+        route: str = self.path.split('?')[0].removeprefix('/v1')
+
+        if match := re.fullmatch(r'/assistants/([^/]+)', route):
+            self._Send_Json(self._Assistant(match.group(1), {}))
+
+        elif match := re.fullmatch(r'/vector_stores/([^/]+)', route):
+            self._Send_Json(self._Vector_Store(match.group(1), 'Vector_Store'))
+
+        elif match := re.fullmatch(r'/vector_stores/([^/]+)/files/([^/]+)', route):
+            self._Send_Json(self._Vector_Store_File(match.group(1), match.group(2)))
+
+        elif match := re.fullmatch(r'/files/([^/]+)', route):
+            self._Send_Json({"id": match.group(1), "object": "file", "bytes": 0, "created_at": 0, "filename": "notes.txt", "purpose": "assistants", "status": "processed"})
+
+        else:
+            self.send_error(404)
+
+    def do_DELETE(self) -> None:
+        route: str = self.path.split('?')[0].removeprefix('/v1')
+        objects: dict[str, str] = {
+            'assistants': 'assistant.deleted', 'threads': 'thread.deleted', 'files': 'file',
+            'vector_stores': 'vector_store.deleted', 'messages': 'thread.message.deleted',
+        }
+
+        parts: list[str] = route.strip('/').split('/')
+        kind: str = parts[-2] if len(parts) >= 2 else ''
+        if kind == 'files' and parts[0] == 'vector_stores':
+            self._Send_Json({"id": parts[-1], "object": "vector_store.file.deleted", "deleted": True})
+        elif kind in objects:
+            self._Send_Json({"id": parts[-1], "object": objects[kind], "deleted": True})
+        else:
+            self.send_error(404)
+
+    def _Assistant(self, assistantID: str, data: dict) -> dict:
+        return {
+            "id": assistantID, "object": "assistant", "created_at": 0, "name": data.get('name', 'Jarvis'),
+            "description": None, "model": data.get('model', 'gpt-4o-mini'), "instructions": data.get('instructions', ''),
+            "tools": data.get('tools', []), "metadata": {}, "top_p": 1.0, "temperature": 1.0,
+            "response_format": "auto", "tool_resources": data.get('tool_resources', {}),
+        }
+
+    def _Vector_Store(self, storeID: str, name: str) -> dict:
+        return {
+            "id": storeID, "object": "vector_store", "created_at": 0, "name": name, "usage_bytes": 0,
+            "file_counts": {"in_progress": 0, "completed": 0, "failed": 0, "cancelled": 0, "total": 0},
+            "status": "completed", "expires_after": None, "expires_at": None, "last_active_at": 0, "metadata": {},
+        }
+
+    def _Vector_Store_File(self, storeID: str, fileID: str) -> dict:
+        return {
+            "id": fileID, "object": "vector_store.file", "usage_bytes": 0, "created_at": 0,
+            "vector_store_id": storeID, "status": "completed", "last_error": None,
+        }
+
+def Serve_Mock_API() -> None:
+    """
+    Serves the mock API on a free local port, printing the port once it listens.
+    Stops when stdin closes.
+    """
+
+    server: ThreadingHTTPServer = ThreadingHTTPServer(('127.0.0.1', 0), Mock_API_Handler)
+    server.daemon_threads = True
+    print(server.server_address[1], flush=True)
+
+    from threading import Thread
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    # The soak test closes stdin when it finishes or exits
+    sys.stdin.read()
+    server.shutdown()
+
+"""
+Resource Sampling
+"""
+def Resident_Memory() -> int | None:
+    """
+    Returns this process's resident set size in bytes, or None if it cannot be read.
+    """
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+def Open_Handles() -> tuple[int | None, int | None]:
+    """
+    Returns the number of open file descriptors (handles on Windows) and sockets of this process.
+    Either is None if it cannot be read.
+    """
+
+    try:
+        import psutil
+        process = psutil.Process()
+        handles: int = process.num_handles() if os.name == 'nt' else process.num_fds()
+        return handles, len(process.net_connections(kind='inet'))
+    except ImportError:
+        pass
+
+    try:
+        descriptors: list[str] = os.listdir('/proc/self/fd')
+    except OSError:
+        return None, None
+
+    sockets: int = 0
+    for descriptor in descriptors:
+        try:
+            if os.readlink(f'/proc/self/fd/{descriptor}').startswith('socket:'):
+                sockets += 1
+        except OSError:
+            pass
+
+    return len(descriptors), sockets
+
+def Slope(points: list[tuple[float, float]]) -> float:
+    """
+    Returns the least squares slope of y over x, or 0 with fewer than two points.
+    """
+
+    if len(points) < 2:
+        return 0.0
+
+    meanX: float = sum(x for x, _ in points) / len(points)
+    meanY: float = sum(y for _, y in points) / len(points)
+    variance: float = sum((x - meanX) ** 2 for x, _ in points)
+    if variance == 0:
+        return 0.0
+    return sum((x - meanX) * (y - meanY) for x, y in points) / variance
+
+"""
+Soak Driver
+"""
+class Null_Player:
+    """
+    Stands in for a Playback_Process, so speech is synthesized and read but not played.
+    """
+
+    def __init__(self):
+        self.bytesPlayed: int = 0
+
+    def Play(self, data: bytes, wait: bool = True) -> None:
+        self.bytesPlayed += len(data)
+
+    def Wait(self) -> None:
+        pass
+
+class Soak_Test:
+    def __init__(
+        self,
+        turns: int = 5000,
+        warmupTurns: int = 600,
+        sampleEvery: int = 100,
+        toolEvery: int = 5,
+        citeEvery: int = 7,
+        fileEvery: int = 25,
+        maxSlope: float = 1.0,
+        maxHandleGrowth: int = 8,
+        traceFrames: int = 1,
+        workDirectory: str | None = None
+    ):
+        """
+        Parameters:
+            turns (int): The number of turns to run after the warmup.
+            warmupTurns (int): The turns run before measuring, while caches, connection pools and the assistant's
+                bounded turn history (500 turns by default) fill.
+            sampleEvery (int): The number of turns between samples.
+            toolEvery (int): Every this many turns, the mock asks for a tool call.
+            citeEvery (int): Every this many turns, the mock cites a file.
+            fileEvery (int): Every this many turns, a file is uploaded to the vector store and deleted.
+            maxSlope (float): The most KiB of RSS or traced memory each turn may add, by least squares over the samples.
+            maxHandleGrowth (int): The most file descriptors or sockets that may be open at the end beyond the first sample.
+            traceFrames (int): The stack frames tracemalloc keeps per allocation.
+            workDirectory (str | None): Where speech and uploaded files are written. Defaults to a temporary directory.
+        """
+
+        # User defined attributes
+        self.turns = turns
+        self.warmupTurns = warmupTurns
+        self.sampleEvery = sampleEvery
+        self.toolEvery = toolEvery
+        self.citeEvery = citeEvery
+        self.fileEvery = fileEvery
+        self.maxSlope = maxSlope
+        self.maxHandleGrowth = maxHandleGrowth
+        self.traceFrames = traceFrames
+        self.workDirectory = workDirectory
+
+        # Default attributes
+        self.samples: list[dict[str, any]] = []
+        self.failedTurns: int = 0
+        self.server: subprocess.Popen | None = None
+        self._temporaryDirectory: tempfile.TemporaryDirectory | None = None
+
+    def Start(self) -> None:
+        """
+        Starts the mock API and creates the assistant, its thread, a vector store and a cloud speech engine.
+        """
+
+        from Assistant2 import Assistant_V2, Stream_Handler, Vector_Store
+        from RequestPolicy import Request_Policy
+        from TextToSpeech import OpenAI_TTS_Engine
+        from openai import OpenAI
+
+        if self.workDirectory is None:
+            self._temporaryDirectory = tempfile.TemporaryDirectory(prefix='jarvis_soak_')
+            self.workDirectory = self._temporaryDirectory.name
+
+        self.server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        port: int = int(self.server.stdout.readline())
+
+        # One client and request policy for the whole run, as in main.py
+        self.client: OpenAI = OpenAI(api_key='soak', base_url=f"http://127.0.0.1:{port}/v1", max_retries=0)
+        self.requestPolicy: Request_Policy = Request_Policy()
+
+        self.assistant: Assistant_V2 = Assistant_V2(client=self.client, name='Jarvis', requestPolicy=self.requestPolicy)
+        self.assistant.Create_Thread('MAIN_THREAD')
+
+        self.vectorStore: Vector_Store = Vector_Store(client=self.client, requestPolicy=self.requestPolicy)
+        self.assistant.Link_Vector_Store(self.vectorStore)
+
+        self.player: Null_Player = Null_Player()
+        self.ttsEngine: OpenAI_TTS_Engine = OpenAI_TTS_Engine(
+            client=self.client,
+            requestPolicy=self.requestPolicy,
+            file_path=os.path.join(self.workDirectory, 'speech.mp3'),
+            cacheDirectory=os.path.join(self.workDirectory, '.speech_cache'),
+            player=self.player
+        )
+
+        self.uploadPath: str = os.path.join(self.workDirectory, 'notes.txt')
+        with open(self.uploadPath, 'w', encoding='utf-8') as file:
+            file.write("Soak test notes.\n" * 64)
+
+        class Soak_Stream_Handler(Stream_Handler):
+            def Handle_Required_Actions(self, data) -> list[dict]:
+                return [
+                    {"tool_call_id": tool.id, "output": f"Done: {tool.function.arguments}"}
+                    for tool in data.required_action.submit_tool_outputs.tool_calls
+                ]
+
+        self.handlerClass = Soak_Stream_Handler
+
+    def Run_Turn(self, turn: int) -> None:
+        """
+        Runs one turn the way main.py does: a new stream handler sends the message and streams the
+        reply, then the reply is spoken.
+        """
+
+        from OutputSinks import Callback_Sink, Speech_Sink
+
+        text: str = f"Turn {turn}, what is the weather like?"
+        if self.toolEvery > 0 and turn % self.toolEvery == 0:
+            text += f" {TOOL_MARKER}"
+        if self.citeEvery > 0 and turn % self.citeEvery == 0:
+            text += f" {CITE_MARKER}"
+
+        speechSink: Speech_Sink = Speech_Sink()
+        streamHandler = self.handlerClass(
+            client=self.client,
+            assistantName='Jarvis',
+            requestPolicy=self.requestPolicy,
+            sinks=[Callback_Sink(lambda text: None)],
+            speechSinks=[speechSink]
+        )
+
+        self.assistant.Send_And_Stream(threadName='MAIN_THREAD', textContent=text, streamHandler=streamHandler)
+
+        # Confirmations repeat and are cached, answers are synthesized every time
+        if len(speechSink.messages) > 0:
+            self.ttsEngine.Speak(speechSink.messages[-1])
+        self.ttsEngine.Speak(f"Confirmation {turn % 4}.", cache=True)
+
+        if self.fileEvery > 0 and turn % self.fileEvery == 0:
+            self.vectorStore.Add_File_By_Path('notes.txt', self.uploadPath)
+            self.vectorStore.Delete_File_By_Name('notes.txt')
+
+    def Sample(self, turn: int) -> dict[str, any]:
+        """
+        Records this process's memory and handles after a turn.
+        """
+
+        gc.collect()
+        traced, peak = tracemalloc.get_traced_memory()
+        descriptors, sockets = Open_Handles()
+
+        sample: dict[str, any] = {
+            'turn': turn,
+            'seconds': time.perf_counter() - self.startTime,
+            'rss': Resident_Memory(),
+            'traced': traced,
+            'tracedPeak': peak,
+            'fileDescriptors': descriptors,
+            'sockets': sockets,
+            'threads': len(self.assistant.threads),
+            'files': len(self.vectorStore.files),
+            'runQueues': len(self.assistant.runQueues),
+        }
+        self.samples.append(sample)
+        return sample
+
+    def Run(self, onSample=None) -> dict[str, any]:
+        """
+        Runs the warmup and the measured turns, and checks the samples against the limits.
+
+        Parameters:
+            onSample (Callable[[dict[str, any]], None] | None): Called with each sample as it is taken.
+
+        Returns:
+            dict[str, any]: The report, with 'passed' and the reasons of any failure.
+        """
+
+        from Assistant2 import Assistant_Error
+
+        # Tracing from the start lets objects replaced in bounded histories cancel out, instead of counting as new
+        tracemalloc.start(self.traceFrames)
+        self.Start()
+        try:
+            self.startTime: float = time.perf_counter()
+            for turn in range(self.warmupTurns):
+                self.Run_Turn(turn)
+
+            # Measure from after the warmup, so filled caches and pools do not count as growth
+            baseline: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            self.Sample(self.warmupTurns)
+
+            for turn in range(self.warmupTurns, self.warmupTurns + self.turns):
+                try:
+                    self.Run_Turn(turn)
+                except Assistant_Error:
+                    self.failedTurns += 1
+
+                if (turn + 1 - self.warmupTurns) % self.sampleEvery == 0:
+                    sample: dict[str, any] = self.Sample(turn + 1)
+                    if onSample is not None:
+                        onSample(sample)
+
+            final: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            return self.Report(baseline, final)
+
+        finally:
+            tracemalloc.stop()
+            self.Stop()
+
+    def Report(self, baseline: tracemalloc.Snapshot, final: tracemalloc.Snapshot) -> dict[str, any]:
+        """
+        Summarizes the samples and checks them against the limits.
+        """
+
+        first: dict[str, any] = self.samples[0]
+        last: dict[str, any] = self.samples[-1]
+        failures: list[str] = []
+
+        slopes: dict[str, float | None] = {}
+        for key in ('rss', 'traced'):
+            points: list[tuple[float, float]] = [(sample['turn'], sample[key] / 1024) for sample in self.samples if sample[key] is not None]
+            slopes[key] = Slope(points) if len(points) >= 2 else None
+            if slopes[key] is not None and slopes[key] > self.maxSlope:
+                failures.append(f"{key} grew {slopes[key]:.3f} KiB per turn, over {self.maxSlope} KiB")
+
+        for key in ('fileDescriptors', 'sockets'):
+            if first[key] is not None and last[key] - first[key] > self.maxHandleGrowth:
+                failures.append(f"{key} grew from {first[key]} to {last[key]}")
+
+        # The allocation sites that grew most since the warmup
+        ignored: tuple[tracemalloc.Filter, ...] = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        )
+        topAllocators: list[dict[str, any]] = [
+            {'location': str(stat.traceback), 'sizeDiffKiB': stat.size_diff / 1024, 'countDiff': stat.count_diff}
+            for stat in final.filter_traces(ignored).compare_to(baseline.filter_traces(ignored), 'lineno')[:10]
+        ]
+
+        return {
+            'passed': len(failures) == 0,
+            'failures': failures,
+            'turns': self.turns,
+            'failedTurns': self.failedTurns,
+            'seconds': last['seconds'] - first['seconds'],
+            'turnsPerSecond': self.turns / (last['seconds'] - first['seconds']) if last['seconds'] > first['seconds'] else 0.0,
+            'rssSlopeKiBPerTurn': slopes['rss'],
+            'tracedSlopeKiBPerTurn': slopes['traced'],
+            'rssGrowthKiB': (last['rss'] - first['rss']) / 1024 if first['rss'] is not None else None,
+            'tracedGrowthKiB': (last['traced'] - first['traced']) / 1024,
+            'fileDescriptors': [first['fileDescriptors'], last['fileDescriptors']],
+            'sockets': [first['sockets'], last['sockets']],
+            'assistantThreads': last['threads'],
+            'vectorStoreFiles': last['files'],
+            'topAllocators': topAllocators,
+            'requestPolicy': self.requestPolicy.Get_Metrics(),
+            'samples': self.samples,
+        }
+
+    def Stop(self) -> None:
+        """
+        Stops the mock API and removes the temporary directory.
+        """
+
+        if self.server is not None:
+            self.server.stdin.close()
+            try:
+                self.server.wait(5)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+            self.server.stdout.close()
+            self.server = None
+
+        if self._temporaryDirectory is not None:
+            self._temporaryDirectory.cleanup()
+            self._temporaryDirectory = None
+
+def Main() -> None:
+    parser = ArgumentParser(description="Run simulated turns against a local mock API and check for memory and handle leaks.")
+    parser.add_argument('--turns', type=int, default=5000, help='The number of measured turns.')
+    parser.add_argument('--warmup', type=int, default=600, help='The number of turns run before measuring, enough to fill bounded histories.')
+    parser.add_argument('--sample-every', type=int, default=100, help='The number of turns between samples.')
+    parser.add_argument('--max-slope', type=float, default=1.0, help='The most KiB of memory each turn may add.')
+    parser.add_argument('--max-handle-growth', type=int, default=8, help='The most file descriptors or sockets that may accumulate.')
+    parser.add_argument('--trace-frames', type=int, default=1, help='The stack frames kept per allocation by tracemalloc.')
+    parser.add_argument('--report', default=None, help='Writes the full report, with every sample, to this JSON file.')
+    parser.add_argument('--serve', action='store_true', help=SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.serve:
+        Serve_Mock_API()
+        return
+
+    soakTest: Soak_Test = Soak_Test(
+        turns=arguments.turns,
+        warmupTurns=arguments.warmup,
+        sampleEvery=arguments.sample_every,
+        maxSlope=arguments.max_slope,
+        maxHandleGrowth=arguments.max_handle_growth,
+        traceFrames=arguments.trace_frames
+    )
+
+    def Print_Sample(sample: dict[str, any]) -> None:
+        rss: str = f"{sample['rss'] / 2 ** 20:.1f} MiB" if sample['rss'] is not None else 'n/a'
+        print(
+            f"turn {sample['turn']:>6}  rss {rss}  traced {sample['traced'] / 2 ** 20:.2f} MiB  "
+            f"fds {sample['fileDescriptors']}  sockets {sample['sockets']}",
+            flush=True
+        )
+
+    report: dict[str, any] = soakTest.Run(onSample=Print_Sample)
+
+    if arguments.report is not None:
+        with open(arguments.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    summary: dict[str, any] = {key: value for key, value in report.items() if key not in ('samples', 'requestPolicy')}
+    print(json.dumps(summary, indent=2))
+    sys.exit(0 if report['passed'] else 1)
+
+if __name__ == '__main__':
+    Main()
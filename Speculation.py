@@ -0,0 +1,360 @@
+"""
+Speculative Runs
+
+Starts the assistant's run from a stable partial transcript, before the user has finished
+speaking, with its output held back. When the final transcript arrives the speculative run is
+either kept, if the transcript did not change meaningfully, or cancelled and restarted.
+"""
+# Imports
+from Assistant2 import Assistant_V2, Assistant_Error, Stream_Handler
+from OutputSinks import Output_Sink, Held_Sink
+from difflib import SequenceMatcher
+from threading import Event, Lock, Thread
+from typing import Callable
+from queue import Queue
+import time
+import re
+
+def Normalize_Transcript(text: str) -> str:
+    """
+    Lowercases a transcript and removes punctuation and extra whitespace, for comparison.
+    """
+
+    return ' '.join(re.sub(r"[^\w\s']", ' ', text.lower()).split())
+
+def Transcript_Similarity(first: str, second: str) -> float:
+    """
+    Returns how similar two transcripts are, from 0 to 1.
+    """
+
+    return SequenceMatcher(None, Normalize_Transcript(first), Normalize_Transcript(second)).ratio()
+
+class Speculative_Run:
+    """
+    A run started from a partial transcript.
+    """
+
+    def __init__(self, text: str, heldSink: Held_Sink, streamHandler: Stream_Handler):
+        self.text = text
+        self.heldSink = heldSink
+        self.streamHandler = streamHandler
+        self.startTime: float = time.monotonic()
+
+        # Set once the run is kept or dropped, so tools only run for kept runs
+        self.decided = Event()
+        self.committed: bool = False
+
+        # Set once a dropped run is cancelled and its messages removed
+        self.removed = Event()
+
+        # Set by the run's thread
+        self.messageID: str | None = None
+        self.error: Exception | None = None
+        self.endTime: float | None = None
+        self.thread: Thread | None = None
+
+class Speculative_Runner:
+    def __init__(
+        self,
+        assistant: Assistant_V2,
+        threadName: str,
+        streamHandlerFactory: Callable[[list[Output_Sink]], Stream_Handler],
+        sinks: list[Output_Sink],
+        wakeWord: str = 'jarvis',
+        minWords: int = 3,
+        stableSeconds: float = 0.4,
+        similarityThreshold: float = 0.9,
+    ):
+        """
+        Parameters:
+            assistant (Assistant_V2): The assistant to run.
+            threadName (str): The name of the thread to run on.
+            streamHandlerFactory (Callable[[list[Output_Sink]], Stream_Handler]): Creates a stream handler writing to the given sinks.
+            sinks (list[Output_Sink]): The sinks that receive a kept run's output.
+            wakeWord (str): A partial transcript must contain this word before a run is started.
+            minWords (int): The minimum number of words in a partial transcript before a run is started.
+            stableSeconds (float): How long a partial transcript must stay unchanged before a run is started.
+            similarityThreshold (float): The minimum similarity between the final and speculative transcripts for the run to be kept.
+        """
+
+        # User defined attributes
+        self.assistant = assistant
+        self.threadName = threadName
+        self.streamHandlerFactory = streamHandlerFactory
+        self.sinks = sinks
+        self.wakeWord = wakeWord
+        self.minWords = minWords
+        self.stableSeconds = stableSeconds
+        self.similarityThreshold = similarityThreshold
+
+        # Default attributes
+        self.current: Speculative_Run | None = None
+        self.lastPartial: str = ''
+        self.lastPartialTime: float = 0.0
+        self.counters: dict[str, float] = {
+            'utterances': 0,
+            'speculations': 0,
+            'hits': 0,
+            'misses': 0,
+            'timeSavedSeconds': 0.0,
+            'wastedCompletionTokens': 0,
+            'wastedPromptTokens': 0,
+        }
+        self._lock = Lock()
+
+        # Dropped runs are cancelled and removed by a worker, one at a time, so the microphone thread never waits on the network
+        self._drops: Queue = Queue()
+        self._lastDrop: Speculative_Run | None = None
+        self._dropWorker: Thread = Thread(target=self._Drop_Worker, name='Speculative_Drops', daemon=True)
+        self._dropWorker.start()
+
+    # # # #
+    #
+    # Speculation Methods
+    #
+    # # # #
+
+    def _Start(self, text: str) -> None:
+        """
+        Starts a speculative run on a background thread with its output held.
+        """
+
+        heldSink: Held_Sink = Held_Sink(self.sinks)
+        streamHandler: Stream_Handler = self.streamHandlerFactory([heldSink])
+        run: Speculative_Run = Speculative_Run(text, heldSink, streamHandler)
+
+        # Tools may have side effects, so they wait until the run is kept
+        def Tool_Gate() -> bool:
+            run.decided.wait()
+            return run.committed
+
+        streamHandler.toolGate = Tool_Gate
+
+        # The thread cannot take a message while an earlier dropped run on it is still being cancelled.
+        # Drops are removed in order, so waiting for the last one covers the rest.
+        previousDrop: Speculative_Run | None = self._lastDrop
+
+        def Run_Speculatively() -> None:
+            try:
+                if previousDrop is not None:
+                    previousDrop.removed.wait()
+                if run.decided.is_set() and not run.committed:
+                    return
+
+                run.messageID = self.assistant.Create_Message(
+                    threadName=self.threadName,
+                    textContent=text
+                ).id
+
+                # A run dropped before its message was created never starts
+                if run.decided.is_set() and not run.committed:
+                    return
+
+                self.assistant.Stream_Response(
+                    threadName=self.threadName,
+                    streamHandler=streamHandler
+                )
+
+            except Exception as e:
+                run.error = e
+
+            finally:
+                run.endTime = time.monotonic()
+
+        run.thread = Thread(target=Run_Speculatively, name='Speculative_Run', daemon=True)
+        self.current = run
+        self.counters['speculations'] += 1
+        run.thread.start()
+
+    def _Drop(self, run: Speculative_Run) -> None:
+        """
+        Discards a speculative run's output and queues it to be cancelled and removed from the thread.
+        """
+
+        run.heldSink.Discard()
+        run.committed = False
+        run.decided.set()
+        self._lastDrop = run
+        self._drops.put(run)
+
+    def _Drop_Worker(self) -> None:
+        while True:
+            run: Speculative_Run = self._drops.get()
+            try:
+                self._Remove_Run(run)
+            except Assistant_Error:
+                pass
+            finally:
+                run.removed.set()
+                self._drops.task_done()
+
+    def _Remove_Run(self, run: Speculative_Run) -> None:
+        """
+        Cancels a dropped run and removes its messages from the thread.
+        """
+
+        # Cancel the run once it exists, unless it has already ended
+        while run.thread.is_alive() and run.streamHandler.current_run is None:
+            time.sleep(0.01)
+
+        activeRun = run.streamHandler.current_run
+        if activeRun is not None and activeRun.status in ('queued', 'in_progress', 'requires_action'):
+            try:
+                self.assistant.Cancel_Run(threadName=self.threadName, runID=activeRun.id)
+            except Assistant_Error:
+                pass
+
+        run.thread.join()
+
+        # Record the tokens spent on the dropped run
+        finalRun = run.streamHandler.finalRun
+        if finalRun is not None and finalRun.usage is not None:
+            with self._lock:
+                self.counters['wastedPromptTokens'] += finalRun.usage.prompt_tokens
+                self.counters['wastedCompletionTokens'] += finalRun.usage.completion_tokens
+
+        # Remove the speculative message and everything the run added after it
+        if run.messageID is not None:
+            messages = self.assistant.requestPolicy.Execute(
+                'messages.list',
+                self.assistant.client.beta.threads.messages.list,
+                thread_id=self.assistant.threads[self.threadName],
+                after=run.messageID,
+                order='asc',
+                idempotent=True
+            ).data
+
+            for messageID in [run.messageID] + [message.id for message in messages]:
+                self.assistant.Delete_Message(threadName=self.threadName, messageID=messageID)
+
+    def On_Partial(self, text: str) -> None:
+        """
+        Handles a partial transcript from a streaming recognizer.
+        Starts a speculative run once the partial is stable, or drops one the partial has moved away from.
+
+        Parameters:
+            text (str): The partial transcript so far.
+        """
+
+        now: float = time.monotonic()
+        normalized: str = Normalize_Transcript(text)
+
+        with self._lock:
+            # Track how long the partial has stayed the same
+            if normalized != self.lastPartial:
+                self.lastPartial = normalized
+                self.lastPartialTime = now
+
+                # Drop a speculative run the user has kept talking past
+                if self.current is not None and Transcript_Similarity(self.current.text, text) < self.similarityThreshold:
+                    self.counters['misses'] += 1
+                    self._Drop(self.current)
+                    self.current = None
+
+                return
+
+            if (
+                self.current is None
+                and now - self.lastPartialTime >= self.stableSeconds
+                and self.wakeWord in normalized.split()
+                and len(normalized.split()) >= self.minWords
+            ):
+                self._Start(text)
+
+    def On_Final(self, text: str) -> Stream_Handler:
+        """
+        Handles the final transcript of an utterance and waits for its response.
+        A matching speculative run is kept and its held output released. Otherwise it is
+        cancelled and a new run is started from the final transcript.
+
+        Parameters:
+            text (str): The final transcript.
+
+        Returns:
+            Stream_Handler: The stream handler of the run that answered the utterance.
+
+        Raises:
+            Assistant_Error: If the run fails.
+        """
+
+        finalTime: float = time.monotonic()
+
+        with self._lock:
+            run: Speculative_Run | None = self.current
+            self.current = None
+            self.lastPartial = ''
+            self.counters['utterances'] += 1
+
+            if run is not None:
+                if Transcript_Similarity(run.text, text) >= self.similarityThreshold:
+                    # Keep the run and let its output through
+                    run.committed = True
+                    run.decided.set()
+                    run.heldSink.Release()
+                    self.counters['hits'] += 1
+
+                else:
+                    self.counters['misses'] += 1
+                    self._Drop(run)
+                    run = None
+
+        if run is not None:
+            run.thread.join()
+
+            # A run started from the final transcript would have taken as long to answer, starting now.
+            # The head start only counts up to when the speculative run had its first output, or ended without any.
+            answerTime: float = run.heldSink.firstWriteTime or run.endTime
+            with self._lock:
+                self.counters['timeSavedSeconds'] += max(0.0, min(finalTime, answerTime) - run.startTime)
+
+            if run.error is not None:
+                raise run.error if isinstance(run.error, Assistant_Error) else Assistant_Error(
+                    message=f"Speculative run failed. | {run.error}",
+                    code=306
+                )
+            return run.streamHandler
+
+        # Answer the final transcript normally, once any dropped run is off the thread
+        self._drops.join()
+        streamHandler: Stream_Handler = self.streamHandlerFactory(self.sinks)
+        self.assistant.Create_Message(
+            threadName=self.threadName,
+            textContent=text
+        )
+        self.assistant.Stream_Response(
+            threadName=self.threadName,
+            streamHandler=streamHandler
+        )
+
+        return streamHandler
+
+    def Cancel(self) -> None:
+        """
+        Drops the current speculative run, if any, e.g. when the final transcript is not addressed to the assistant.
+        """
+
+        with self._lock:
+            run: Speculative_Run | None = self.current
+            self.current = None
+            self.lastPartial = ''
+
+            if run is not None:
+                self.counters['misses'] += 1
+                self._Drop(run)
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the speculation counters, hit rate and average time saved per hit.
+
+        Returns:
+            dict[str, any]: The speculation metrics.
+        """
+
+        with self._lock:
+            metrics: dict[str, any] = dict(self.counters)
+
+        decided: int = metrics['hits'] + metrics['misses']
+        metrics['hitRate'] = metrics['hits'] / decided if decided > 0 else 0.0
+        metrics['averageTimeSavedSeconds'] = metrics['timeSavedSeconds'] / metrics['hits'] if metrics['hits'] > 0 else 0.0
+
+        return metrics
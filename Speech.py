@@ -1,23 +1,15 @@
-import pyttsx3
+from TextToSpeech import Local_TTS_Engine
+
+# the local engine is created on first use and kept alive
+_engine: Local_TTS_Engine | None = None
 
 #defining speak method allowing the program to make audio
 def speak(message):
-    #setting up the audio player
-    engine = pyttsx3.init()
-
-    #set speed of speach
-    rate = engine.getProperty('rate')
-    engine.setProperty('rate', 180)
-
-    #set volume of speech
-    volume = engine.getProperty('volume')
-    engine.setProperty('volume',1.0)
+    global _engine
 
-    #set voice of speech
-    voices = engine.getProperty('voices')
-    engine.setProperty('voice', voices[0].id)
+    #setting up the audio player once
+    if _engine is None:
+        _engine = Local_TTS_Engine(rate=180, volume=1.0, voiceIndex=0)
 
     #play audio
-    engine.say(message)
-    engine.runAndWait()
-    engine.stop()
\ No newline at end of file
+    _engine.Speak(message)
@@ -0,0 +1,172 @@
+"""
+Speech Encoding
+
+Prepares captured speech for upload before any recognizer sees it. Audio is resampled to 16 kHz,
+the rate speech recognizers work at, with a low-pass filter so higher microphone rates do not alias,
+and FLAC is encoded in this process by libsndfile, through the `soundfile` package, instead of by an
+external flac encoder started for every utterance. Without `soundfile`, speech_recognition's flac
+encoder is used as before.
+"""
+# Imports
+import speech_recognition as sr
+import numpy as np
+import io
+
+# The rate speech is uploaded at. Recognizers gain nothing from the higher rates microphones capture at
+TARGET_RATE: int = 16000
+
+# The libsndfile FLAC subtype of each sample width in bytes
+FLAC_SUBTYPES: dict[int, str] = {1: 'PCM_S8', 2: 'PCM_16', 3: 'PCM_24'}
+
+# # # #
+# Resampling
+# # # #
+
+def Resample(samples: np.ndarray, fromRate: int, toRate: int, taps: int = 31) -> np.ndarray:
+    """
+    Resamples audio. Downsampling low-pass filters below the new Nyquist frequency first.
+
+    Parameters:
+        samples (np.ndarray): The samples.
+        fromRate (int): The sample rate of the samples.
+        toRate (int): The sample rate to return.
+        taps (int): The length of the low-pass filter, odd.
+
+    Returns:
+        np.ndarray: The resampled samples, as float64.
+    """
+
+    samples = samples.astype(np.float64)
+    if fromRate == toRate or len(samples) == 0:
+        return samples
+
+    length: int = int(len(samples) * toRate / fromRate)
+    if toRate < fromRate:
+        # A Hann-windowed sinc with its cutoff just under the new Nyquist frequency
+        cutoff: float = 0.45 * toRate / fromRate
+        n: np.ndarray = np.arange(taps) - (taps - 1) // 2
+        kernel: np.ndarray = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(taps)
+        kernel /= kernel.sum()
+
+        # The filter is only worked out at every step-th sample, the whole step that keeps at least the new rate.
+        # Each of the step phases of the kernel meets its own phase of the samples
+        step: int = fromRate // toRate
+        padded: np.ndarray = np.pad(samples, (taps - 1) // 2)
+        filtered: np.ndarray = np.zeros(-(-len(samples) // step))
+        for phase in range(min(step, taps)):
+            correlated: np.ndarray = np.correlate(padded[phase::step], kernel[phase::step], mode='valid')
+            filtered[:len(correlated)] += correlated[:len(filtered)]
+
+        samples, fromRate = filtered, fromRate / step
+        if fromRate == toRate:
+            return samples[:length]
+
+    # Linear interpolation between the samples either side, the last sample is held
+    positions: np.ndarray = np.arange(length) * (fromRate / toRate)
+    before: np.ndarray = np.minimum(positions.astype(np.int64), len(samples) - 1)
+    after: np.ndarray = np.minimum(before + 1, len(samples) - 1)
+    fraction: np.ndarray = positions - before
+    return samples[before] * (1 - fraction) + samples[after] * fraction
+
+def _Read_Samples(data: bytes, sampleWidth: int) -> np.ndarray:
+    # Little-endian PCM as speech_recognition keeps it, signed except for unsigned 8-bit
+    if sampleWidth == 1:
+        return np.frombuffer(data, dtype=np.uint8).astype(np.int64) - 128
+    if sampleWidth == 3:
+        padded: np.ndarray = np.zeros((len(data) // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = np.frombuffer(data, dtype=np.uint8)[:len(padded) * 3].reshape(-1, 3)
+        return padded.view('<i4').ravel() >> 8
+    return np.frombuffer(data, dtype={2: '<i2', 4: '<i4'}[sampleWidth]).astype(np.int64)
+
+def _Write_Samples(samples: np.ndarray, sampleWidth: int) -> bytes:
+    limit: int = 1 << (8 * sampleWidth - 1)
+    clipped: np.ndarray = np.clip(np.rint(samples), -limit, limit - 1).astype(np.int64)
+    if sampleWidth == 1:
+        return (clipped + 128).astype(np.uint8).tobytes()
+    if sampleWidth == 3:
+        return clipped.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    return clipped.astype({2: '<i2', 4: '<i4'}[sampleWidth]).tobytes()
+
+# # # #
+# FLAC encoding
+# # # #
+
+def Encode_Speech(data: bytes, sampleRate: int, sampleWidth: int) -> tuple[bytes, str]:
+    """
+    Encodes mono PCM as a FLAC file, in this process with libsndfile when `soundfile` is installed,
+    otherwise with the flac encoder speech_recognition ships.
+
+    Parameters:
+        data (bytes): Little-endian PCM, signed except for unsigned 8-bit, as speech_recognition keeps it.
+        sampleRate (int): The sample rate.
+        sampleWidth (int): The sample width in bytes, 1 to 3.
+
+    Returns:
+        tuple[bytes, str]: The FLAC file, and the encoder that made it, 'soundfile' or 'flac'.
+    """
+
+    if len(data) > 0:
+        try:
+            import soundfile
+        except ImportError:
+            pass
+        else:
+            # Passed as the top bits of 32-bit samples, which libsndfile narrows to the subtype exactly
+            samples: np.ndarray = _Read_Samples(data, sampleWidth) << (32 - 8 * sampleWidth)
+            file = io.BytesIO()
+            soundfile.write(file, samples.astype(np.int32), sampleRate, format='FLAC', subtype=FLAC_SUBTYPES[sampleWidth])
+            return file.getvalue(), 'soundfile'
+
+    return sr.AudioData(data, sampleRate, sampleWidth).get_flac_data(), 'flac'
+
+# # # #
+# Audio data
+# # # #
+
+class Speech_Audio_Data(sr.AudioData):
+    """
+    Audio data whose FLAC is kept once encoded, so a retried recognition does not encode it again.
+    """
+
+    def __init__(self, frame_data: bytes, sample_rate: int, sample_width: int):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self._flac: dict[tuple[int, int], bytes] = {}
+        self.encoder: str | None = None
+
+    def get_flac_data(self, convert_rate: int | None = None, convert_width: int | None = None) -> bytes:
+        # FLAC holds at most 24-bit samples
+        if convert_width is None:
+            convert_width = min(self.sample_width, 3)
+        rate: int = convert_rate if convert_rate is not None else self.sample_rate
+
+        key: tuple[int, int] = (rate, convert_width)
+        if key not in self._flac:
+            data: bytes = self.get_raw_data(convert_width=convert_width)
+            if rate != self.sample_rate:
+                data = _Write_Samples(Resample(_Read_Samples(data, convert_width), self.sample_rate, rate), convert_width)
+            self._flac[key], self.encoder = Encode_Speech(data, rate, convert_width)
+
+        return self._flac[key]
+
+def Prepare_Speech(audio: sr.AudioData, sampleRate: int = TARGET_RATE) -> Speech_Audio_Data:
+    """
+    Converts captured audio to 16-bit PCM at the upload rate, encoded in this process when a recognizer asks for FLAC.
+    Audio already at or below the rate is not resampled.
+
+    Parameters:
+        audio (sr.AudioData): The captured audio.
+        sampleRate (int): The rate to upload at.
+
+    Returns:
+        Speech_Audio_Data: The audio to recognize.
+    """
+
+    if isinstance(audio, Speech_Audio_Data) and audio.sample_rate <= sampleRate and audio.sample_width == 2:
+        return audio
+
+    data: bytes = audio.get_raw_data(convert_width=2)
+    if audio.sample_rate <= sampleRate:
+        return Speech_Audio_Data(data, audio.sample_rate, 2)
+
+    resampled: np.ndarray = Resample(_Read_Samples(data, 2), audio.sample_rate, sampleRate)
+    return Speech_Audio_Data(_Write_Samples(resampled, 2), sampleRate, 2)
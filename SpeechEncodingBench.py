@@ -0,0 +1,162 @@
+"""
+Speech Encoding Benchmark
+
+Measures what preparing speech in process saves per utterance. It compares the FLAC that
+speech_recognition uploads for Google recognition, made by an external flac encoder at the
+microphone's rate, with the FLAC from SpeechEncoding, resampled to 16 kHz and encoded in
+this process when soundfile is installed. It reports the encode time and the payload size of both.
+
+Utterances are read from a WAV or raw PCM file, or a directory of clips, or synthesized at
+the given rate when no path is given.
+
+Usage:
+    python SpeechEncodingBench.py
+    python SpeechEncodingBench.py recordings/ --verify
+    python SpeechEncodingBench.py --sample-rate 44100 --utterances 50
+"""
+# Imports
+from SpeechEncoding import Prepare_Speech, TARGET_RATE, _Read_Samples
+from CaptureSources import Clip, AUDIO_EXTENSIONS, REFERENCE_SUFFIX
+from argparse import ArgumentParser
+import speech_recognition as sr
+import numpy as np
+import subprocess
+import json
+import time
+import os
+
+def Synthetic_Utterances(count: int, sampleRate: int, generator: np.random.Generator) -> list[sr.AudioData]:
+    """
+    Makes utterances of 1 to 6 seconds of voiced harmonics with breath noise between syllables over a noise floor,
+    at the level a microphone records speech.
+    """
+
+    utterances: list[sr.AudioData] = []
+    for _ in range(count):
+        seconds: float = generator.uniform(1.0, 6.0)
+        t: np.ndarray = np.arange(int(seconds * sampleRate)) / sampleRate
+
+        # A pitch that drifts, its harmonics rolling off, and syllables about 4 times a second
+        pitch: np.ndarray = generator.uniform(90, 220) * (1 + 0.1 * np.sin(2 * np.pi * 0.7 * t))
+        phase: np.ndarray = 2 * np.pi * np.cumsum(pitch) / sampleRate
+        voiced: np.ndarray = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 20) if harmonic * pitch.max() < sampleRate / 2)
+        syllables: np.ndarray = np.clip(np.sin(2 * np.pi * generator.uniform(3, 5) * t), 0, None)
+
+        signal: np.ndarray = 3000 * syllables * voiced + 300 * (1 - syllables) * generator.standard_normal(len(t))
+        signal += 30 * generator.standard_normal(len(t))
+        utterances.append(sr.AudioData(np.clip(signal, -32768, 32767).astype('<i2').tobytes(), sampleRate, 2))
+
+    return utterances
+
+def Load_Utterances(path: str, sampleRate: int) -> list[sr.AudioData]:
+    if os.path.isdir(path):
+        paths: list[str] = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(AUDIO_EXTENSIONS)
+            and not os.path.splitext(name)[0].lower().endswith(REFERENCE_SUFFIX)
+        )
+    else:
+        paths: list[str] = [path]
+
+    clips: list[Clip] = [Clip.Load(clipPath, sampleRate) for clipPath in paths]
+    return [sr.AudioData(clip.data, clip.sampleRate, clip.sampleWidth) for clip in clips]
+
+def Decodes_To(flac: bytes, audio: sr.AudioData) -> bool:
+    """
+    Checks with the flac tool that speech_recognition ships that the FLAC decodes to the audio's samples exactly.
+    """
+
+    from speech_recognition.audio import get_flac_converter
+
+    process = subprocess.run(
+        [get_flac_converter(), '--decode', '--stdout', '--silent', '--force-raw-format', '--endian=little', '--sign=signed', '-'],
+        input=flac,
+        capture_output=True
+    )
+    if process.returncode != 0:
+        return False
+
+    expected: np.ndarray = _Read_Samples(audio.get_raw_data(convert_width=2), 2)
+    return np.array_equal(np.frombuffer(process.stdout, dtype='<i2'), expected)
+
+def Summarize(milliseconds: list[float], sizes: list[int]) -> dict[str, float]:
+    return {
+        'meanEncodeMs': float(np.mean(milliseconds)),
+        'p95EncodeMs': float(np.quantile(milliseconds, 0.95)),
+        'meanBytes': float(np.mean(sizes)),
+        'totalBytes': int(np.sum(sizes)),
+    }
+
+def Bench_Encoding(utterances: list[sr.AudioData], verify: bool = False) -> dict[str, any]:
+    """
+    Encodes every utterance both ways, as Google recognition asks for it, and compares them.
+
+    Parameters:
+        utterances (list[sr.AudioData]): The captured utterances.
+        verify (bool): Whether to check that the in-process FLAC decodes to the audio it was made from exactly.
+
+    Returns:
+        dict[str, any]: The benchmark results.
+    """
+
+    external: tuple[list[float], list[int]] = ([], [])
+    inProcess: tuple[list[float], list[int]] = ([], [])
+    encoders: set[str] = set()
+    mismatches: int = 0
+
+    # Start the external encoder once, so the first measured call does not include loading it from disk
+    utterances[0].get_flac_data(convert_width=2)
+
+    for audio in utterances:
+        startTime: float = time.perf_counter()
+        flac: bytes = audio.get_flac_data(convert_width=2)
+        external[0].append((time.perf_counter() - startTime) * 1000)
+        external[1].append(len(flac))
+
+        startTime = time.perf_counter()
+        prepared: sr.AudioData = Prepare_Speech(audio)
+        flac = prepared.get_flac_data(convert_width=2)
+        inProcess[0].append((time.perf_counter() - startTime) * 1000)
+        inProcess[1].append(len(flac))
+        encoders.add(prepared.encoder)
+
+        if verify and not Decodes_To(flac, prepared):
+            mismatches += 1
+
+    baseline: dict[str, float] = Summarize(*external)
+    prepared: dict[str, float] = Summarize(*inProcess)
+
+    results: dict[str, any] = {
+        'utterances': len(utterances),
+        'audioSeconds': sum(len(audio.frame_data) / (audio.sample_rate * audio.sample_width) for audio in utterances),
+        'sampleRate': utterances[0].sample_rate,
+        'uploadRate': min(utterances[0].sample_rate, TARGET_RATE),
+        'encoder': ', '.join(sorted(encoders)),
+        'externalFlac': baseline,
+        'inProcessFlac': prepared,
+        'encodeMsSavedPerUtterance': baseline['meanEncodeMs'] - prepared['meanEncodeMs'],
+        'bytesSavedPerUtterance': baseline['meanBytes'] - prepared['meanBytes'],
+        'payloadRatio': prepared['totalBytes'] / baseline['totalBytes'] if baseline['totalBytes'] > 0 else 0.0,
+    }
+    if verify:
+        results['decodeMismatches'] = mismatches
+
+    return results
+
+def Main() -> None:
+    parser = ArgumentParser(description='Benchmark in-process speech encoding against the external flac encoder.')
+    parser.add_argument('path', nargs='?', help='A WAV or raw PCM file, or a directory of clips. Synthesized speech is used without one.')
+    parser.add_argument('--sample-rate', type=int, default=48000, help='The rate of synthesized speech, and of raw PCM files.')
+    parser.add_argument('--utterances', type=int, default=30, help='The number of utterances to synthesize.')
+    parser.add_argument('--verify', action='store_true', help='Check that each in-process FLAC decodes to its audio exactly.')
+    arguments = parser.parse_args()
+
+    if arguments.path is not None:
+        utterances: list[sr.AudioData] = Load_Utterances(arguments.path, arguments.sample_rate)
+    else:
+        utterances: list[sr.AudioData] = Synthetic_Utterances(arguments.utterances, arguments.sample_rate, np.random.default_rng(0))
+
+    print(json.dumps(Bench_Encoding(utterances, arguments.verify), indent=2))
+
+if __name__ == '__main__':
+    Main()
@@ -0,0 +1,314 @@
+"""
+Speech Normalizer
+
+Turns streamed assistant text into text worth speaking, one delta at a time. Fenced code blocks
+are taken out and replaced by a short summary, URLs are shortened to their domain, citation
+markers are dropped and markdown is removed.
+
+Text is passed on up to the last complete word, and held back only while it may still be part of a
+code fence, link or citation, so the normalizer keeps pace with the stream.
+"""
+# Imports
+from typing import Callable
+import time
+import re
+
+# Opening or closing code fence at the start of a line
+FENCE = re.compile(r'(?:(?<=\n)|^)[ \t]*(```|~~~)')
+
+# Citation markers, as streamed and as rewritten by Stream_Handler.on_message_done
+CITATION = re.compile(r'【[^】]*】|\[\d+\]')
+
+# Markdown links and images
+MARKDOWN_LINK = re.compile(r'!?\[([^\]\n]*)\]\(([^)\s]*)[^)\n]*\)')
+
+# Bare URLs
+URL = re.compile(r'\b(?:https?://|www\.)[^\s<>()\[\]"\']+')
+
+# Line markup, matched after a newline
+HEADING = re.compile(r'(?<=\n)[ \t]*#{1,6}[ \t]+')
+BULLET = re.compile(r'(?<=\n)[ \t]*[-*+][ \t]+')
+QUOTE = re.compile(r'(?<=\n)[ \t]*>[ \t]?')
+RULE = re.compile(r'(?<=\n)[ \t]*\|?[ \t:]*(?:[-*_=][ \t:|]*){3,}(?=\n|$)')
+
+# Table rows, spoken as their cells
+TABLE_ROW = re.compile(r'(?<=\n)[ \t]*\|([^\n]*)(?=\n|$)')
+
+# Inline markup
+EMPHASIS = re.compile(r'(?<!\w)[*_]{1,3}|[*_]{1,3}(?!\w)')
+SPACES = re.compile(r'[ \t]{2,}')
+
+# Characters that end a URL rather than belong to it
+URL_TRAILING: str = '.,;:!?'
+
+def Shorten_URL(url: str) -> str:
+    """
+    Returns the domain of a URL, e.g. "youtube.com" for "https://www.youtube.com/watch?v=1".
+    """
+
+    domain: str = re.sub(r'^(?:https?://)?(?:www\.)?', '', url)
+    return re.split(r'[/?#:]', domain, maxsplit=1)[0]
+
+def _Replace_URL(match: re.Match) -> str:
+    url: str = match.group(0)
+    trailing: str = ''
+    while len(url) > 0 and url[-1] in URL_TRAILING:
+        trailing = url[-1] + trailing
+        url = url[:-1]
+    return Shorten_URL(url) + trailing
+
+def _Replace_Row(match: re.Match) -> str:
+    cells: list[str] = [cell.strip() for cell in match.group(1).split('|')]
+    return ', '.join(cell for cell in cells if len(cell) > 0)
+
+def _Replace_Link(match: re.Match) -> str:
+    text: str = match.group(1).strip()
+    return text if len(text) > 0 else Shorten_URL(match.group(2))
+
+class Speech_Normalizer:
+    def __init__(
+        self,
+        onCode: Callable[[str, str], None] | None = None,
+        codeSummary: str = 'The code is on screen.',
+        maxHold: int = 400
+    ):
+        """
+        Parameters:
+            onCode (Callable[[str, str], None] | None): Called with the language and text of each code block.
+            codeSummary (str): Spoken in place of each code block.
+            maxHold (int): The most characters held back while waiting for a link or citation to close.
+        """
+
+        # User defined attributes
+        self.onCode = onCode
+        self.codeSummary = codeSummary
+        self.maxHold = maxHold
+
+        # Default attributes
+        self.metrics: dict[str, float] = {
+            'deltas': 0,
+            'charactersIn': 0,
+            'charactersOut': 0,
+            'codeBlocks': 0,
+            'codeCharacters': 0,
+            'seconds': 0.0,
+            'maxDeltaSeconds': 0.0,
+        }
+        self.Reset()
+
+    def Reset(self) -> None:
+        """
+        Drops any held text and starts a new message.
+        """
+
+        self.pending: str = ''
+        self.lastCharacter: str = '\n'
+        self.inCode: bool = False
+        self.codeLanguage: str = ''
+        self.codeParts: list[str] = []
+
+    # # # #
+    #
+    # Streaming Methods
+    #
+    # # # #
+
+    def Feed(self, text: str) -> str:
+        """
+        Adds a delta of streamed text.
+
+        Parameters:
+            text (str): The delta.
+
+        Returns:
+            str: The speakable text that is now complete. May be empty.
+        """
+
+        startTime: float = time.perf_counter()
+
+        self.pending += text
+        output: str = self._Drain(final=False)
+
+        seconds: float = time.perf_counter() - startTime
+        self.metrics['deltas'] += 1
+        self.metrics['charactersIn'] += len(text)
+        self.metrics['charactersOut'] += len(output)
+        self.metrics['seconds'] += seconds
+        self.metrics['maxDeltaSeconds'] = max(self.metrics['maxDeltaSeconds'], seconds)
+        return output
+
+    def Finish(self) -> str:
+        """
+        Ends the message, passing on any held text. An unclosed code block counts as closed.
+
+        Returns:
+            str: The rest of the speakable text.
+        """
+
+        output: str = self._Drain(final=True)
+        if self.inCode:
+            output += self._End_Code()
+
+        self.metrics['charactersOut'] += len(output)
+        self.Reset()
+        return output
+
+    def _Drain(self, final: bool) -> str:
+        output: list[str] = []
+
+        while len(self.pending) > 0:
+            if self.inCode:
+                # Code is consumed a line at a time, so the pending text always starts a line
+                fence: re.Match | None = FENCE.search(self.pending)
+                if fence is None:
+                    lineEnd: int = len(self.pending) if final else self.pending.rfind('\n') + 1
+                    self.codeParts.append(self.pending[:lineEnd])
+                    self.pending = self.pending[lineEnd:]
+                    break
+
+                fenceEnd: int = self.pending.find('\n', fence.end())
+                if fenceEnd == -1 and not final:
+                    break
+
+                self.codeParts.append(self.pending[:fence.start()])
+                self.pending = self.pending[fenceEnd + 1:] if fenceEnd != -1 else ''
+                output.append(self._End_Code())
+                self.lastCharacter = '\n'
+                continue
+
+            # A fence only opens at the start of a line
+            fence: re.Match | None = FENCE.search(self.pending)
+            if fence is not None and fence.start() == 0 and self.lastCharacter != '\n':
+                fence = FENCE.search(self.pending, 1) if len(self.pending) > 1 else None
+
+            if fence is not None:
+                fenceEnd: int = self.pending.find('\n', fence.end())
+                output.append(self._Prose(self.pending[:fence.start()]))
+                self.pending = self.pending[fence.start():]
+
+                if fenceEnd == -1 and not final:
+                    break
+
+                # The rest of the fence line names the language
+                fenceEnd -= fence.start()
+                self.codeLanguage = self.pending[fence.end() - fence.start():fenceEnd if fenceEnd >= 0 else None].strip()
+                self.inCode = True
+                self.codeParts = []
+                self.pending = self.pending[fenceEnd + 1:] if fenceEnd >= 0 else ''
+                continue
+
+            cut: int = len(self.pending) if final else self._Safe_Cut()
+            output.append(self._Prose(self.pending[:cut]))
+            self.pending = self.pending[cut:]
+            break
+
+        return ''.join(output)
+
+    def _Safe_Cut(self) -> int:
+        """
+        Returns how much of the pending text can be passed on: every complete word, except a link or
+        citation that has not closed yet, or backticks that may start a fence. Table rows are passed on whole.
+        """
+
+        lineStart: int = self.pending.rfind('\n') + 1
+        cut: int = max(self.pending.rfind(' '), self.pending.rfind('\t'), lineStart - 1) + 1
+
+        # Keep indentation with the rest of its line, which may open a fence
+        if self.pending[lineStart:cut].strip(' \t') == '':
+            cut = lineStart
+
+        # Hold back a table row until it ends
+        if self.pending[lineStart:].lstrip(' \t').startswith('|') and (lineStart > 0 or self.lastCharacter == '\n'):
+            cut = min(cut, lineStart)
+
+        # Hold back an unclosed citation or link text
+        for opener, closer in (('【', '】'), ('[', ']')):
+            start: int = self.pending.rfind(opener, 0, cut)
+            if start != -1 and self.pending.find(closer, start, cut) == -1 and len(self.pending) - start < self.maxHold:
+                cut = start
+
+        # Hold back a link whose URL has not closed yet
+        start = self.pending.rfind('](', 0, cut)
+        if start != -1 and self.pending.find(')', start, cut) == -1:
+            opener: int = self.pending.rfind('[', 0, start)
+            if opener != -1 and len(self.pending) - opener < self.maxHold:
+                cut = min(cut, opener)
+
+        return cut
+
+    def _Prose(self, text: str) -> str:
+        """
+        Removes markup from complete prose.
+        """
+
+        if len(text) == 0:
+            return ''
+
+        # The previous character lets line patterns see where lines start
+        text = self.lastCharacter + text
+        self.lastCharacter = text[-1]
+
+        text = CITATION.sub('', text)
+        text = MARKDOWN_LINK.sub(_Replace_Link, text)
+        text = URL.sub(_Replace_URL, text)
+        text = RULE.sub('', text)
+        if '|' in text:
+            text = TABLE_ROW.sub(_Replace_Row, text)
+        text = HEADING.sub('', text)
+        text = BULLET.sub('', text)
+        text = QUOTE.sub('', text)
+        text = EMPHASIS.sub('', text)
+
+        if '`' in text:
+            text = text.replace('`', '')
+
+        # Spaces left on both sides of removed markup collapse, including across deltas
+        return SPACES.sub(' ', text)[1:]
+
+    def _End_Code(self) -> str:
+        """
+        Passes a finished code block on and returns the summary spoken in its place.
+        """
+
+        code: str = ''.join(self.codeParts)
+        language: str = self.codeLanguage
+
+        self.inCode = False
+        self.codeParts = []
+        self.codeLanguage = ''
+
+        self.metrics['codeBlocks'] += 1
+        self.metrics['codeCharacters'] += len(code)
+        if self.onCode is not None:
+            self.onCode(language, code)
+
+        return f" {self.codeSummary}\n" if len(self.codeSummary) > 0 else ''
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the normalizer's counters, including the average and worst time per delta.
+
+        Returns:
+            dict[str, any]: The normalizer metrics.
+        """
+
+        metrics: dict[str, any] = dict(self.metrics)
+        metrics['averageDeltaMs'] = 1000 * metrics['seconds'] / metrics['deltas'] if metrics['deltas'] > 0 else 0.0
+        metrics['maxDeltaMs'] = 1000 * metrics['maxDeltaSeconds']
+        metrics['charactersSaved'] = metrics['charactersIn'] - metrics['charactersOut']
+        return metrics
+
+def Normalize_For_Speech(text: str, onCode: Callable[[str, str], None] | None = None) -> str:
+    """
+    Normalizes a whole message at once.
+
+    Parameters:
+        text (str): The message.
+        onCode (Callable[[str, str], None] | None): Called with the language and text of each code block.
+
+    Returns:
+        str: The speakable text.
+    """
+
+    normalizer: Speech_Normalizer = Speech_Normalizer(onCode=onCode)
+    return (normalizer.Feed(text) + normalizer.Finish()).strip()
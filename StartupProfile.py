@@ -0,0 +1,135 @@
+"""
+Startup Profiling
+
+Times the imports and initialization steps of each subsystem during startup, and can load heavy
+modules on a background thread while the rest of startup continues.
+"""
+# Imports
+from contextlib import contextmanager
+from importlib import import_module
+from threading import Lock, Thread
+from types import ModuleType
+from typing import Iterator
+import time
+
+class Startup_Profiler:
+    def __init__(self, enabled: bool = False):
+        """
+        Parameters:
+            enabled (bool): Whether the report is printed. Timings are always recorded.
+        """
+
+        # User defined attributes
+        self.enabled = enabled
+
+        # Default attributes
+        self.startTime: float = time.perf_counter()
+        self.records: list[tuple[str, str, float, float]] = []
+        self.backgroundImports: dict[str, ModuleType | BaseException] = {}
+        self._backgroundThread: Thread | None = None
+        self._lock = Lock()
+
+    def _Record(self, kind: str, name: str, startTime: float) -> None:
+        endTime: float = time.perf_counter()
+        with self._lock:
+            self.records.append((kind, name, startTime - self.startTime, endTime - startTime))
+
+    @contextmanager
+    def Stage(self, name: str, kind: str = 'init') -> Iterator[None]:
+        """
+        Times a block of startup work.
+
+        Parameters:
+            name (str): The name of the subsystem or step.
+            kind (str): The kind of work, e.g. 'init' or 'import'.
+        """
+
+        startTime: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._Record(kind, name, startTime)
+
+    def Import(self, moduleName: str) -> ModuleType:
+        """
+        Imports a module, timing the import.
+        A module that was already loaded in the background is returned without waiting on the import again.
+
+        Parameters:
+            moduleName (str): The module to import.
+
+        Returns:
+            ModuleType: The imported module.
+        """
+
+        with self.Stage(moduleName, kind='import'):
+            return import_module(moduleName)
+
+    def Start_Background_Imports(self, moduleNames: list[str]) -> None:
+        """
+        Imports modules one after another on a background thread.
+
+        Parameters:
+            moduleNames (list[str]): The modules to import, in order.
+        """
+
+        def Import_All() -> None:
+            for moduleName in moduleNames:
+                startTime: float = time.perf_counter()
+                try:
+                    self.backgroundImports[moduleName] = import_module(moduleName)
+                except BaseException as e:
+                    # Leave the error to be raised by the foreground import
+                    self.backgroundImports[moduleName] = e
+                self._Record('import (background)', moduleName, startTime)
+
+        self._backgroundThread = Thread(target=Import_All, name='Startup_Imports', daemon=True)
+        self._backgroundThread.start()
+
+    def Wait_For_Background_Imports(self) -> None:
+        """
+        Waits for the background imports to finish, timing the wait.
+        """
+
+        if self._backgroundThread is None:
+            return
+
+        with self.Stage('background imports', kind='wait'):
+            self._backgroundThread.join()
+
+    def Mark(self, name: str) -> float:
+        """
+        Records a milestone, such as the first time the assistant listens.
+
+        Parameters:
+            name (str): The milestone's name.
+
+        Returns:
+            float: The number of seconds since the profiler was created.
+        """
+
+        elapsed: float = time.perf_counter() - self.startTime
+        with self._lock:
+            self.records.append(('milestone', name, elapsed, 0.0))
+        return elapsed
+
+    def Report(self) -> str:
+        """
+        Returns the recorded timings as a table, and prints it if profiling is enabled.
+
+        Returns:
+            str: The report.
+        """
+
+        with self._lock:
+            records: list[tuple[str, str, float, float]] = sorted(self.records, key=lambda record: record[2])
+
+        lines: list[str] = [f"{'kind':<20} {'subsystem':<28} {'start':>8} {'duration':>9}"]
+        for kind, name, start, duration in records:
+            lines.append(f"{kind:<20} {name:<28} {start:>7.3f}s {duration:>8.3f}s")
+
+        report: str = '\n'.join(lines)
+        if self.enabled:
+            print(report, flush=True)
+
+        return report
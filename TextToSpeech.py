@@ -1,20 +1,488 @@
-from openai import OpenAI
-from playsound3 import playsound
+from openai import OpenAI, OpenAIError, NOT_GIVEN
+from httpx import HTTPError
+from RequestPolicy import Request_Policy, Deadline_Exceeded
+from hashlib import sha256
+from threading import Lock, Thread
+from contextlib import nullcontext
+import time
+import os
 
-def Speak(text: str, client: OpenAI) -> None:
+def _Synthesize_To_File(text: str, client: OpenAI, requestPolicy: Request_Policy, file_path: str, model: str = "tts-1", voice: str = "onyx", responseFormat: str = "mp3") -> None:
+
+	# create a new audio file
+	response = requestPolicy.Execute(
+		'audio.speech.create',
+		client.audio.speech.create,
+		idempotent=True,
+		hedge=True,
+		model=model,
+		voice=voice,
+		input=text,
+		response_format=responseFormat
+	)
+
+	# write to a temporary file first so a failed download never replaces a good file
+	response.stream_to_file(file_path + '.tmp')
+	os.replace(file_path + '.tmp', file_path)
+
+def _Cached_File_Path(text: str, cacheDirectory: str, model: str = "tts-1", voice: str = "onyx", extension: str = '.mp3') -> str:
+	os.makedirs(cacheDirectory, exist_ok=True)
+	return os.path.join(cacheDirectory, sha256(f"{model}:{voice}:{text}".encode('utf-8')).hexdigest() + extension)
+
+def Speak(text: str, client: OpenAI, requestPolicy: Request_Policy | None = None) -> None:
+
+	# Use a default request policy if one was not provided
+	if requestPolicy is None:
+		requestPolicy = Request_Policy()
 
 	# create a file path to save the audio file
 	file_path: str = 'speech.mp3'
 
 	# create a new audio file
-	response = client.audio.speech.create(
-		model="tts-1",
-		voice="onyx",
-		input=text
-	)
+	_Synthesize_To_File(text, client, requestPolicy, file_path)
+
+	# play the audio file, importing the player only here since it fails to import without an audio backend
+	from playsound3 import playsound
+	playsound(file_path)
+
+def Speak_Cached(text: str, client: OpenAI, requestPolicy: Request_Policy | None = None, cacheDirectory: str = '.speech_cache') -> None:
+
+	# Use a default request policy if one was not provided
+	if requestPolicy is None:
+		requestPolicy = Request_Policy()
+
+	# reuse the audio of phrases that were spoken before, such as confirmations
+	file_path: str = _Cached_File_Path(text, cacheDirectory)
+	if not os.path.exists(file_path):
+		_Synthesize_To_File(text, client, requestPolicy, file_path)
+
+	# play the audio file, importing the player only here since it fails to import without an audio backend
+	from playsound3 import playsound
+	playsound(file_path)
+
+"""
+TTS Engines
+"""
+class Playback_Error(Exception):
+	"""
+	Exception class for speech that was synthesized but could not be played.
+	"""
+
+class TTS_Engine:
+	"""
+	Base class for text to speech backends.
+	Speak blocks until the text has been spoken and returns the time to first audio.
+	"""
+
+	name: str = 'engine'
+
+	# Gates the microphone while audio plays in this process, whose signal is not known to echo suppression
+	echoReference: 'Echo_Reference | None' = None
+
+	def _Gate(self):
+		return self.echoReference.Playing() if self.echoReference is not None else nullcontext()
+
+	def Speak(self, text: str, cache: bool = False) -> float:
+		"""
+		Speaks text.
+
+		Parameters:
+			text (str): The text to speak.
+			cache (bool): Whether the audio may be cached, for short phrases that repeat.
+
+		Returns:
+			float: The number of seconds until audio started playing.
+		"""
+
+		raise NotImplementedError
+
+	def Probe(self) -> float:
+		"""
+		Checks that the backend works without playing audio.
+
+		Returns:
+			float: The number of seconds the check took.
+		"""
+
+		return 0.0
+
+	def Close(self) -> None:
+		pass
+
+class OpenAI_TTS_Engine(TTS_Engine):
+	"""
+	Synthesizes speech with the OpenAI speech API as a stream and plays the audio file once it is complete.
+	With a playback worker, speech is synthesized as raw 24 kHz PCM and played by the worker process as it arrives.
+	"""
+
+	name: str = 'openai'
+
+	def __init__(
+		self,
+		client: OpenAI,
+		requestPolicy: Request_Policy | None = None,
+		model: str = "tts-1",
+		voice: str = "onyx",
+		file_path: str = 'speech.mp3',
+		cacheDirectory: str = '.speech_cache',
+		timeout: float | None = None,
+		player: 'Playback_Process | None' = None,
+		echoReference: 'Echo_Reference | None' = None,
+	):
+		"""
+		Parameters:
+			client (OpenAI): The OpenAI client.
+			requestPolicy (Request_Policy | None): The request policy for speech requests.
+			model (str): The speech model.
+			voice (str): The voice.
+			file_path (str): The file that synthesized speech is written to.
+			cacheDirectory (str): The directory of cached phrases.
+			timeout (float | None): The number of seconds until the audio starts arriving, including retries, before synthesis fails.
+			player (Playback_Process | None): A started playback worker at 24 kHz mono. Otherwise audio files are played in this process.
+			echoReference (Echo_Reference | None): Gated while audio files play in this process. A player publishes its own reference.
+		"""
+
+		self.client = client
+		self.requestPolicy = requestPolicy if requestPolicy is not None else Request_Policy()
+		self.model = model
+		self.voice = voice
+		self.file_path = file_path
+		self.cacheDirectory = cacheDirectory
+		self.timeout = timeout
+		self.player = player
+		self.echoReference = echoReference
+
+		# the speech API returns raw 24 kHz 16-bit mono PCM for the playback worker
+		self.responseFormat: str = 'pcm' if player is not None else 'mp3'
+		if player is not None:
+			self.file_path = os.path.splitext(file_path)[0] + '.pcm'
+
+	def _Open_Speech(self, text: str, timeout: float | None = NOT_GIVEN):
+		# sends the request and returns once the response starts, with the audio left to stream
+		return self.client.audio.speech.with_streaming_response.create(
+			model=self.model,
+			voice=self.voice,
+			input=text,
+			response_format=self.responseFormat,
+			timeout=timeout
+		).__enter__()
+
+	def _Open(self, text: str):
+		# the timeout bounds the wait for the audio to start, so long answers are not cut off or counted as slow
+		with self.requestPolicy.Deadline(self.timeout) if self.timeout is not None else nullcontext():
+			return self.requestPolicy.Execute('audio.speech.create', self._Open_Speech, text, idempotent=True)
+
+	def _Play(self, file_path: str) -> None:
+		try:
+			if self.player is None:
+				from playsound3 import playsound
+				with self._Gate():
+					playsound(file_path)
+				return
+
+			with open(file_path, 'rb') as file:
+				self.player.Play(file.read())
+
+		except Exception as e:
+			raise Playback_Error(f"Failed to play speech. | {e}") from e
+
+	def _Play_Chunk(self, chunk: bytes) -> None:
+		try:
+			self.player.Play(chunk, wait=False)
+		except Exception as e:
+			raise Playback_Error(f"Failed to play speech. | {e}") from e
+
+	def _Stream(self, text: str, file_path: str | None) -> float:
+		"""
+		Synthesizes speech as a stream, passing it to the playback worker as it arrives and writing it to a file if one is given.
+
+		Returns:
+			float: The number of seconds until the first audio arrived.
+		"""
+
+		startTime: float = time.perf_counter()
+		timeToFirstAudio: float | None = None
+		response = self._Open(text)
+		file = open(file_path + '.tmp', 'wb') if file_path is not None else None
+
+		try:
+			# the worker only takes whole 16-bit samples, so an odd byte waits for the next chunk
+			remainder: bytes = b''
+			for chunk in response.iter_bytes():
+				if timeToFirstAudio is None:
+					timeToFirstAudio = time.perf_counter() - startTime
+
+				if file is not None:
+					file.write(chunk)
+
+				if self.player is not None:
+					chunk = remainder + chunk
+					whole: int = len(chunk) - len(chunk) % 2
+					remainder = chunk[whole:]
+					if whole > 0:
+						self._Play_Chunk(chunk[:whole])
+
+		finally:
+			response.close()
+			if file is not None:
+				file.close()
+
+		# write to a temporary file first so a failed download never replaces a good file
+		if file_path is not None:
+			os.replace(file_path + '.tmp', file_path)
+
+		return timeToFirstAudio if timeToFirstAudio is not None else time.perf_counter() - startTime
+
+	def Speak(self, text: str, cache: bool = False) -> float:
+		startTime: float = time.perf_counter()
+
+		# cached phrases play at once
+		if cache:
+			file_path: str | None = _Cached_File_Path(text, self.cacheDirectory, self.model, self.voice, '.' + self.responseFormat)
+			if os.path.exists(file_path):
+				timeToFirstAudio: float = time.perf_counter() - startTime
+				self._Play(file_path)
+				return timeToFirstAudio
+
+		# the playback worker plays the audio as it arrives, so only cached phrases need a file
+		else:
+			file_path: str | None = self.file_path if self.player is None else None
+
+		timeToFirstAudio: float = self._Stream(text, file_path)
+
+		if self.player is None:
+			self._Play(file_path)
+		else:
+			try:
+				self.player.Wait()
+			except Exception as e:
+				raise Playback_Error(f"Failed to play speech. | {e}") from e
+
+		return timeToFirstAudio
+
+	def Probe(self) -> float:
+		# measured like Speak, until the first audio arrives, so the length of the text does not matter
+		startTime: float = time.perf_counter()
+		response = self._Open('OK.')
+		try:
+			next(response.iter_bytes(), None)
+		finally:
+			response.close()
+		return time.perf_counter() - startTime
+
+class Local_TTS_Engine(TTS_Engine):
+	"""
+	Speaks with the system's speech engine through pyttsx3. The engine is created once and reused.
+	"""
+
+	name: str = 'local'
+
+	def __init__(self, rate: int = 180, volume: float = 1.0, voiceIndex: int = 0, echoReference: 'Echo_Reference | None' = None):
+		import pyttsx3
+
+		self.echoReference = echoReference
+
+		# setting up the audio player once, initializing the driver is slow
+		self.engine = pyttsx3.init()
+		self.engine.setProperty('rate', rate)
+		self.engine.setProperty('volume', volume)
+
+		voices = self.engine.getProperty('voices')
+		if len(voices) > voiceIndex:
+			self.engine.setProperty('voice', voices[voiceIndex].id)
+
+		# pyttsx3 engines are not thread safe
+		self._lock = Lock()
+		self._startTime: float = 0.0
+		self._firstAudio: float | None = None
+		self.engine.connect('started-utterance', self._On_Started)
+
+	def _On_Started(self, name) -> None:
+		if self._firstAudio is None:
+			self._firstAudio = time.perf_counter() - self._startTime
+
+	def Speak(self, text: str, cache: bool = False) -> float:
+		with self._lock:
+			self._startTime = time.perf_counter()
+			self._firstAudio = None
+
+			#play audio
+			self.engine.say(text)
+			with self._Gate():
+				self.engine.runAndWait()
+
+			return self._firstAudio if self._firstAudio is not None else time.perf_counter() - self._startTime
+
+	def Close(self) -> None:
+		with self._lock:
+			self.engine.stop()
+
+class Fallback_TTS(TTS_Engine):
+	"""
+	Speaks with a primary engine, usually the cloud, and switches to a fallback engine while the primary
+	is slower than a latency threshold or unreachable. While on the fallback, the primary is probed in
+	the background and used again once it responds within the threshold.
+	"""
+
+	name: str = 'fallback'
+
+	def __init__(
+		self,
+		primary: TTS_Engine,
+		fallback: TTS_Engine | None,
+		latencyThreshold: float = 2.0,
+		probeInterval: float = 30.0,
+	):
+		"""
+		Parameters:
+			primary (TTS_Engine): The preferred engine.
+			fallback (TTS_Engine | None): The engine used while the primary is degraded. If None, the primary is always used.
+			latencyThreshold (float): The time to first audio, in seconds, over which the primary counts as degraded.
+			probeInterval (float): The number of seconds between background checks of a degraded primary.
+		"""
+
+		# User defined attributes
+		self.primary = primary
+		self.fallback = fallback
+		self.latencyThreshold = latencyThreshold
+		self.probeInterval = probeInterval
+
+		# Default attributes
+		self.degraded: bool = False
+		self.lastProbe: float = 0.0
+		self.switches: int = 0
+		self.engineMetrics: dict[str, dict[str, any]] = {}
+		self._probeThread: Thread | None = None
+		self._lock = Lock()
+
+	def _Record(self, engine: TTS_Engine, timeToFirstAudio: float | None) -> None:
+		with self._lock:
+			metrics: dict[str, any] = self.engineMetrics.setdefault(engine.name, {
+				'utterances': 0,
+				'failures': 0,
+				'totalTimeToFirstAudio': 0.0,
+				'maxTimeToFirstAudio': 0.0,
+				'lastTimeToFirstAudio': None,
+			})
+
+			if timeToFirstAudio is None:
+				metrics['failures'] += 1
+				return
+
+			metrics['utterances'] += 1
+			metrics['totalTimeToFirstAudio'] += timeToFirstAudio
+			metrics['maxTimeToFirstAudio'] = max(metrics['maxTimeToFirstAudio'], timeToFirstAudio)
+			metrics['lastTimeToFirstAudio'] = timeToFirstAudio
+
+	def _Set_Degraded(self, degraded: bool) -> None:
+		with self._lock:
+			if degraded != self.degraded:
+				self.degraded = degraded
+				self.switches += 1
+			if degraded:
+				self.lastProbe = time.monotonic()
+
+	def _Probe_Primary(self) -> None:
+		try:
+			latency: float = self.primary.Probe()
+			self._Set_Degraded(latency > self.latencyThreshold)
+		except Exception:
+			self._Set_Degraded(True)
+
+	def _Start_Probe(self) -> None:
+		# Check the primary again in the background once the probe interval has passed
+		with self._lock:
+			if time.monotonic() - self.lastProbe < self.probeInterval:
+				return
+			if self._probeThread is not None and self._probeThread.is_alive():
+				return
+
+			self.lastProbe = time.monotonic()
+			self._probeThread = Thread(target=self._Probe_Primary, name='TTS_Probe', daemon=True)
+			self._probeThread.start()
+
+	def Speak(self, text: str, cache: bool = False) -> float:
+		"""
+		Speaks text with the primary, or with the fallback while the primary is degraded or if it cannot synthesize the text.
+
+		Parameters:
+			text (str): The text to speak.
+			cache (bool): Whether the audio may be cached, for short phrases that repeat.
+
+		Returns:
+			float: The number of seconds until audio started playing.
+
+		Raises:
+			Assistant_Error: If the text could not be spoken with either engine, or if synthesized speech could not be played.
+		"""
+
+		from Assistant2 import Assistant_Error
+
+		if self.fallback is None or not self.degraded:
+			try:
+				timeToFirstAudio: float = self.primary.Speak(text, cache)
+
+			# The primary produced the audio, so it is not degraded and the text is not spoken twice
+			except Playback_Error as e:
+				raise Assistant_Error(message=str(e), code=501) from e
+
+			except (OpenAIError, HTTPError, Deadline_Exceeded, OSError) as e:
+				self._Record(self.primary, None)
+				if self.fallback is None:
+					raise Assistant_Error(message=f"Failed to synthesize speech. | {e}", code=500) from e
+
+				# Say it with the fallback instead
+				self._Set_Degraded(True)
+
+			# Any other failure is not a sign of a slow or unreachable service, so the engine is kept
+			except Exception as e:
+				self._Record(self.primary, None)
+				raise Assistant_Error(message=f"Failed to speak with the {self.primary.name} engine. | {e}", code=500) from e
+
+			else:
+				self._Record(self.primary, timeToFirstAudio)
+				if self.fallback is not None and timeToFirstAudio > self.latencyThreshold:
+					self._Set_Degraded(True)
+				return timeToFirstAudio
+
+		self._Start_Probe()
+
+		try:
+			timeToFirstAudio: float = self.fallback.Speak(text, cache)
+
+		except Playback_Error as e:
+			raise Assistant_Error(message=str(e), code=501) from e
+
+		except Exception as e:
+			self._Record(self.fallback, None)
+			raise Assistant_Error(message=f"Failed to speak with the {self.fallback.name} engine. | {e}", code=500) from e
+
+		self._Record(self.fallback, timeToFirstAudio)
+		return timeToFirstAudio
+
+	def Get_Metrics(self) -> dict[str, any]:
+		"""
+		Returns the time to first audio of each engine, the active engine and the number of switches.
+
+		Returns:
+			dict[str, any]: The text to speech metrics.
+		"""
+
+		with self._lock:
+			metrics: dict[str, any] = {name: dict(engine) for name, engine in self.engineMetrics.items()}
+			active: str = self.fallback.name if self.degraded and self.fallback is not None else self.primary.name
+			switches: int = self.switches
+
+		for engine in metrics.values():
+			engine['averageTimeToFirstAudio'] = engine['totalTimeToFirstAudio'] / engine['utterances'] if engine['utterances'] > 0 else 0.0
 
-	# save the audio file
-	response.stream_to_file(file_path)
+		return {
+			'engines': metrics,
+			'activeEngine': active,
+			'switches': switches,
+		}
 
-	# play the audio file
-	playsound(file_path)
\ No newline at end of file
+	def Close(self) -> None:
+		self.primary.Close()
+		if self.fallback is not None:
+			self.fallback.Close()
@@ -0,0 +1,357 @@
+"""
+Vector Store Registry
+
+Remembers every vector store the assistant uses, the local files it was built from, where it is
+linked and when it is known to expire. At startup a background task checks each store, recreates
+and repopulates expired ones from their local files, and relinks them before the first turn.
+"""
+# Imports
+from Assistant2 import Assistant_V2, Vector_Store
+from RequestPolicy import Request_Policy
+from openai import OpenAI
+from threading import Lock, Thread
+from typing import Callable
+import json
+import time
+import os
+
+class Vector_Store_Registry:
+    def __init__(
+        self,
+        client: OpenAI,
+        registryPath: str = 'vector_stores.json',
+        requestPolicy: Request_Policy | None = None,
+        onProgress: Callable[[str, str], None] | None = None,
+    ):
+        """
+        Parameters:
+            client (OpenAI): The OpenAI client.
+            registryPath (str): The JSON file the registry is saved to.
+            requestPolicy (Request_Policy | None): The request policy for vector store requests.
+            onProgress (Callable[[str, str], None] | None): Called with a store's name and status whenever the status changes.
+        """
+
+        # User defined attributes
+        self.client = client
+        self.registryPath = registryPath
+        self.requestPolicy = requestPolicy if requestPolicy is not None else Request_Policy()
+        self.onProgress = onProgress
+
+        # Default attributes
+        self.entries: dict[str, dict[str, any]] = {}
+        self.stores: dict[str, Vector_Store] = {}
+        self.progress: dict[str, str] = {}
+        self.metrics: dict[str, float] = {
+            'checked': 0,
+            'alive': 0,
+            'recreated': 0,
+            'filesUploaded': 0,
+            'filesMissing': 0,
+            'failed': 0,
+            'rewarmSeconds': 0.0,
+        }
+        self._thread: Thread | None = None
+        self._lock = Lock()
+
+        self.Load()
+
+    # # # #
+    #
+    # Registry Storage Methods
+    #
+    # # # #
+
+    def Load(self) -> None:
+        """
+        Loads the registry. A missing or unreadable file counts as an empty registry.
+        """
+
+        try:
+            with open(self.registryPath, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def Save(self) -> None:
+        """
+        Saves the registry, replacing the file in one step.
+        """
+
+        with self._lock:
+            data: str = json.dumps(self.entries, indent=2)
+
+        with open(self.registryPath + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(data)
+        os.replace(self.registryPath + '.tmp', self.registryPath)
+
+    def Register(self, vectorStore: Vector_Store, linkedTo: list[str | None] | None = None) -> None:
+        """
+        Records a vector store, the local files it was built from and where it is linked.
+
+        Parameters:
+            vectorStore (Vector_Store): The vector store.
+            linkedTo (list[str | None] | None): The thread names it is linked to. None stands for the assistant. Defaults to the assistant.
+        """
+
+        instance = vectorStore.instance
+        with self._lock:
+            self.entries[vectorStore.name] = {
+                'id': vectorStore.id,
+                'lifeTime': vectorStore.lifeTime,
+                'expiresAt': instance.expires_at if instance is not None else None,
+                'files': {
+                    fileName: {'path': vectorStore.filePaths.get(fileName), 'id': fileID}
+                    for fileName, fileID in vectorStore.files.items()
+                },
+                'linkedTo': linkedTo if linkedTo is not None else [None],
+            }
+            self.stores[vectorStore.name] = vectorStore
+
+        self.Save()
+
+    def _Set_Progress(self, name: str, status: str) -> None:
+        with self._lock:
+            self.progress[name] = status
+
+        if self.onProgress is not None:
+            self.onProgress(name, status)
+
+    # # # #
+    #
+    # Re-warm Methods
+    #
+    # # # #
+
+    def Is_Alive(self, name: str) -> bool:
+        """
+        Checks whether a registered vector store still exists and has not expired, updating its known expiry.
+        The store is always retrieved, since activity on it pushes its expiry past the one recorded. The recorded
+        expiry only decides the answer when the store cannot be retrieved.
+
+        Parameters:
+            name (str): The store's name.
+
+        Returns:
+            bool: True if the store can be used.
+        """
+
+        entry: dict[str, any] = self.entries[name]
+
+        try:
+            instance = self.requestPolicy.Execute(
+                'vector_stores.retrieve',
+                self.client.beta.vector_stores.retrieve,
+                vector_store_id=entry['id'],
+                idempotent=True,
+                hedge=True
+            )
+
+        except Exception as e:
+            # A store that no longer exists is expired, and one that already looked expired is treated as such
+            if getattr(e, 'status_code', None) == 404:
+                return False
+            if entry.get('expiresAt') is not None and entry['expiresAt'] < time.time():
+                return False
+            raise
+
+        with self._lock:
+            entry['expiresAt'] = instance.expires_at
+
+        return instance.status != 'expired'
+
+    def _Upload_Files(self, vectorStore: Vector_Store, files: list[tuple[str, str | None]]) -> list[str]:
+        """
+        Uploads local files to a store, reporting progress. Returns the names of files that no longer exist locally.
+        """
+
+        missing: list[str] = []
+        for uploaded, (fileName, filePath) in enumerate(files):
+            self._Set_Progress(vectorStore.name, f"uploading {uploaded + 1}/{len(files)}: {fileName}")
+
+            if filePath is None or not os.path.exists(filePath):
+                missing.append(fileName)
+                continue
+
+            vectorStore.Add_File_By_Path(fileName, filePath)
+            self.metrics['filesUploaded'] += 1
+
+        self.metrics['filesMissing'] += len(missing)
+        return missing
+
+    def _Rewarm_Store(self, name: str, localIndex=None) -> tuple[Vector_Store, list[str]]:
+        """
+        Returns a usable vector store for an entry, recreating and repopulating it if it expired,
+        along with the names of files that could not be found locally.
+        """
+
+        entry: dict[str, any] = self.entries[name]
+
+        self._Set_Progress(name, 'checking')
+        self.metrics['checked'] += 1
+        if self.Is_Alive(name):
+            vectorStore: Vector_Store = Vector_Store(
+                client=self.client,
+                id=entry['id'],
+                name=name,
+                lifeTime=entry['lifeTime'],
+                requestPolicy=self.requestPolicy,
+                localIndex=localIndex
+            )
+            vectorStore.files = {fileName: info['id'] for fileName, info in entry['files'].items() if info['id']}
+            vectorStore.filePaths = {fileName: info['path'] for fileName, info in entry['files'].items() if info['path']}
+            self.metrics['alive'] += 1
+            self._Set_Progress(name, 'alive')
+            return vectorStore, []
+
+        # Recreate the store and upload its files again from the local corpus
+        self._Set_Progress(name, 'expired, recreating')
+        vectorStore: Vector_Store = Vector_Store(
+            client=self.client,
+            name=name,
+            lifeTime=entry['lifeTime'],
+            requestPolicy=self.requestPolicy,
+            localIndex=localIndex
+        )
+        self.metrics['recreated'] += 1
+
+        missing: list[str] = self._Upload_Files(
+            vectorStore,
+            [(fileName, info['path']) for fileName, info in entry['files'].items()]
+        )
+        return vectorStore, missing
+
+    def Rewarm(
+        self,
+        assistant: Assistant_V2,
+        corpora: dict[str, str] | None = None,
+        localIndexes: dict[str, any] | None = None,
+        lifeTime: int | None = 1
+    ) -> dict[str, str]:
+        """
+        Checks every registered vector store, recreates expired ones and relinks them.
+        Links to threads that do not exist in this session are skipped.
+
+        Parameters:
+            assistant (Assistant_V2): The assistant to link the stores to.
+            corpora (dict[str, str] | None): Local directories by store name. Stores that are not registered yet are created
+                and linked to the assistant, and files in the directory that a store does not hold yet are uploaded.
+            localIndexes (dict[str, any] | None): Local embedding indexes to attach, by store name.
+            lifeTime (int | None): The days of inactivity before a newly created store expires.
+
+        Returns:
+            dict[str, str]: The final status of each store.
+        """
+
+        startTime: float = time.perf_counter()
+        corpora = corpora if corpora is not None else {}
+        localIndexes = localIndexes if localIndexes is not None else {}
+
+        for name in list(self.entries) + [name for name in corpora if name not in self.entries]:
+            try:
+                if name in self.entries:
+                    vectorStore, missing = self._Rewarm_Store(name, localIndexes.get(name))
+                    linkedTo: list[str | None] = self.entries[name]['linkedTo']
+                else:
+                    self._Set_Progress(name, 'creating')
+                    vectorStore: Vector_Store = Vector_Store(
+                        client=self.client,
+                        name=name,
+                        lifeTime=lifeTime,
+                        requestPolicy=self.requestPolicy,
+                        localIndex=localIndexes.get(name)
+                    )
+                    missing: list[str] = []
+                    linkedTo: list[str | None] = [None]
+
+                # Add files that were put in the corpus since the store was built
+                if name in corpora:
+                    newFiles: list[tuple[str, str]] = [
+                        (fileName, os.path.join(corpora[name], fileName))
+                        for fileName in sorted(os.listdir(corpora[name]))
+                        if fileName not in vectorStore.files and os.path.isfile(os.path.join(corpora[name], fileName))
+                    ]
+                    self._Upload_Files(vectorStore, newFiles)
+
+                for threadName in linkedTo:
+                    if threadName is None or threadName in assistant.threads:
+                        assistant.Link_Vector_Store(vectorStore, threadName)
+
+                self.Register(vectorStore, linkedTo)
+                if len(missing) > 0:
+                    self._Set_Progress(name, f"ready, missing local files: {', '.join(missing)}")
+                else:
+                    self._Set_Progress(name, f"ready ({len(vectorStore.files)} files)")
+
+            except Exception as e:
+                self.metrics['failed'] += 1
+                self._Set_Progress(name, f"failed: {e}")
+
+        self.metrics['rewarmSeconds'] = time.perf_counter() - startTime
+
+        with self._lock:
+            return dict(self.progress)
+
+    def Start_Background_Rewarm(
+        self,
+        assistant: Assistant_V2,
+        corpora: dict[str, str] | None = None,
+        localIndexes: dict[str, any] | None = None,
+        lifeTime: int | None = 1
+    ) -> None:
+        """
+        Runs Rewarm on a background thread. See Rewarm for the parameters.
+        """
+
+        self._thread = Thread(
+            target=self.Rewarm,
+            args=(assistant, corpora, localIndexes, lifeTime),
+            name='Vector_Store_Rewarm',
+            daemon=True
+        )
+        self._thread.start()
+
+    def Wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits for the background re-warm to finish.
+
+        Parameters:
+            timeout (float | None): The most seconds to wait.
+
+        Returns:
+            bool: True if the re-warm finished, or was never started.
+        """
+
+        if self._thread is None:
+            return True
+
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def Get_Progress(self) -> dict[str, str]:
+        """
+        Returns the current status of each store.
+
+        Returns:
+            dict[str, str]: The status of each store by name.
+        """
+
+        with self._lock:
+            return dict(self.progress)
+
+    def Get_Store(self, name: str) -> Vector_Store | None:
+        """
+        Returns a registered store once it has been re-warmed or registered in this session.
+        """
+
+        with self._lock:
+            return self.stores.get(name)
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the re-warm counters and the status of each store.
+
+        Returns:
+            dict[str, any]: The registry metrics.
+        """
+
+        return {**self.metrics, 'registered': len(self.entries), 'progress': self.Get_Progress()}
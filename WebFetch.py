@@ -0,0 +1,458 @@
+"""
+Web Page Fetching
+
+Downloads web pages through a shared connection pool, extracts their readable text and keeps
+an on-disk HTTP cache. Cached pages are served locally while fresh, and revalidated with
+conditional requests (ETag / Last-Modified) once stale. A stale copy is served when the server
+cannot be reached. Downloads are capped in size, and the least recently used pages are evicted
+once the cache outgrows its budget.
+"""
+# Imports
+from html.parser import HTMLParser
+from email.utils import parsedate_to_datetime
+from hashlib import sha256
+from threading import Lock
+import httpx
+import json
+import time
+import os
+import re
+
+# Tags whose content is never readable text
+SKIPPED_TAGS: set[str] = {
+    'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe',
+    'nav', 'header', 'footer', 'aside', 'form', 'button', 'select'
+}
+
+# Tags that start a new line of text
+BLOCK_TAGS: set[str] = {
+    'p', 'div', 'section', 'article', 'main', 'br', 'li', 'ul', 'ol', 'tr', 'table',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'dd', 'dt', 'figcaption'
+}
+
+# Tags that hold a page's main content when present
+MAIN_TAGS: set[str] = {'article', 'main'}
+
+# Tags that never have a closing tag
+VOID_TAGS: set[str] = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'
+}
+
+# Approximate number of characters per token for English text
+CHARS_PER_TOKEN: int = 4
+
+class Readable_Text_Parser(HTMLParser):
+    """
+    Collects a page's title, all readable text, and the readable text inside its main content tags.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+        self.title: str = ''
+        self.allText: list[str] = []
+        self.mainText: list[str] = []
+
+        self._skipDepth: int = 0
+        self._mainDepth: int = 0
+        self._inTitle: bool = False
+
+    def handle_starttag(self, tag, attrs) -> None:
+        if tag in VOID_TAGS:
+            if tag == 'br':
+                self._Add_Text('\n')
+            return
+
+        if tag in SKIPPED_TAGS:
+            self._skipDepth += 1
+        elif tag in MAIN_TAGS:
+            self._mainDepth += 1
+        elif tag == 'title':
+            self._inTitle = True
+
+        if tag in BLOCK_TAGS:
+            self._Add_Text('\n')
+
+    def handle_endtag(self, tag) -> None:
+        if tag in SKIPPED_TAGS:
+            self._skipDepth = max(0, self._skipDepth - 1)
+        elif tag in MAIN_TAGS:
+            self._mainDepth = max(0, self._mainDepth - 1)
+        elif tag == 'title':
+            self._inTitle = False
+
+        if tag in BLOCK_TAGS:
+            self._Add_Text('\n')
+
+    def handle_data(self, data) -> None:
+        if self._inTitle:
+            self.title += data
+            return
+
+        self._Add_Text(data)
+
+    def _Add_Text(self, text: str) -> None:
+        if self._skipDepth > 0:
+            return
+
+        self.allText.append(text)
+        if self._mainDepth > 0:
+            self.mainText.append(text)
+
+def _Normalize_Whitespace(text: str) -> str:
+    # Collapse runs of spaces within lines, then drop blank lines
+    lines: list[str] = [re.sub(r'[ \t\r\f\v]+', ' ', line).strip() for line in text.split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+def Extract_Readable_Text(html: str) -> tuple[str, str]:
+    """
+    Extracts the title and main readable text of an HTML page.
+
+    Parameters:
+        html (str): The page's HTML.
+
+    Returns:
+        tuple[str, str]: The page's title and readable text.
+    """
+
+    parser = Readable_Text_Parser()
+    parser.feed(html)
+    parser.close()
+
+    # Prefer the main content when the page marks it
+    mainText: str = _Normalize_Whitespace(''.join(parser.mainText))
+    if len(mainText) > 0:
+        return parser.title.strip(), mainText
+
+    return parser.title.strip(), _Normalize_Whitespace(''.join(parser.allText))
+
+def Truncate_To_Tokens(text: str, maxTokens: int) -> str:
+    """
+    Truncates text to an approximate token budget, cutting at a word boundary.
+
+    Parameters:
+        text (str): The text to truncate.
+        maxTokens (int): The approximate number of tokens to keep.
+
+    Returns:
+        str: The text, truncated if it was over the budget.
+    """
+
+    maxChars: int = maxTokens * CHARS_PER_TOKEN
+    if len(text) <= maxChars:
+        return text
+
+    cut: int = text.rfind(' ', 0, maxChars)
+    return text[:cut if cut > 0 else maxChars] + ' ... [truncated]'
+
+class Web_Fetcher:
+    def __init__(
+        self,
+        cacheDirectory: str = '.web_cache',
+        maxTokens: int = 2000,
+        timeout: float = 15.0,
+        defaultMaxAge: int = 0,
+        maxResponseBytes: int = 5_000_000,
+        maxCacheBytes: int = 100_000_000,
+        client: httpx.Client | None = None,
+    ):
+        """
+        Parameters:
+            cacheDirectory (str): The directory of the on-disk HTTP cache.
+            maxTokens (int): The approximate token budget of returned text.
+            timeout (float): The request timeout in seconds.
+            defaultMaxAge (int): The number of seconds a response without caching headers stays fresh.
+            maxResponseBytes (int): The number of bytes of a response body that are downloaded. The rest is dropped.
+            maxCacheBytes (int): The size of the on-disk cache, over which the least recently used pages are evicted.
+            client (httpx.Client | None): The HTTP client to use. If not provided, a pooled client is created.
+        """
+
+        # User defined attributes
+        self.cacheDirectory = cacheDirectory
+        self.maxTokens = maxTokens
+        self.defaultMaxAge = defaultMaxAge
+        self.maxResponseBytes = maxResponseBytes
+        self.maxCacheBytes = maxCacheBytes
+        self.client = client if client is not None else httpx.Client(
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+            headers={'User-Agent': 'Jarvis/1.0 (+text extraction)'}
+        )
+
+        # Default attributes
+        self.counters: dict[str, int] = {
+            'fetches': 0,
+            'cacheHits': 0,
+            'revalidated': 0,
+            'downloads': 0,
+            'staleServed': 0,
+            'truncated': 0,
+            'evicted': 0,
+        }
+        self._lock = Lock()
+
+        os.makedirs(cacheDirectory, exist_ok=True)
+
+    # # # #
+    #
+    # Cache Methods
+    #
+    # # # #
+
+    def _Cache_Paths(self, url: str) -> tuple[str, str]:
+        key: str = sha256(url.encode('utf-8')).hexdigest()
+        return (
+            os.path.join(self.cacheDirectory, f"{key}.json"),
+            os.path.join(self.cacheDirectory, f"{key}.body")
+        )
+
+    def _Read_Cache(self, url: str) -> tuple[dict, bytes] | None:
+        metaPath, bodyPath = self._Cache_Paths(url)
+
+        try:
+            with open(metaPath, 'r', encoding='utf-8') as file:
+                meta: dict = json.load(file)
+            with open(bodyPath, 'rb') as file:
+                body: bytes = file.read()
+
+        except (OSError, ValueError):
+            return None
+
+        return meta, body
+
+    def _Write_Cache(self, url: str, meta: dict, body: bytes | None) -> None:
+        metaPath, bodyPath = self._Cache_Paths(url)
+
+        # Write to temporary files and swap them in, so readers never see a partial entry
+        if body is not None:
+            with open(bodyPath + '.tmp', 'wb') as file:
+                file.write(body)
+            os.replace(bodyPath + '.tmp', bodyPath)
+
+        with open(metaPath + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(metaPath + '.tmp', metaPath)
+
+        if body is not None:
+            self._Evict()
+
+    def _Touch_Cache(self, url: str) -> None:
+        # Mark the entry as recently used, eviction goes by the metadata file's modification time
+        try:
+            os.utime(self._Cache_Paths(url)[0])
+        except OSError:
+            pass
+
+    def _Evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits in maxCacheBytes.
+        """
+
+        # The size of each entry's files, and when it was last used
+        entries: dict[str, list[float]] = {}
+        for item in os.scandir(self.cacheDirectory):
+            key, extension = os.path.splitext(item.name)
+            if extension not in ('.json', '.body'):
+                continue
+
+            try:
+                stat: os.stat_result = item.stat()
+            except OSError:
+                continue
+
+            entry: list[float] = entries.setdefault(key, [0.0, 0])
+            entry[1] += stat.st_size
+            if extension == '.json':
+                entry[0] = stat.st_mtime
+
+        totalBytes: float = sum(size for _, size in entries.values())
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if totalBytes <= self.maxCacheBytes:
+                break
+
+            for extension in ('.json', '.body'):
+                try:
+                    os.remove(os.path.join(self.cacheDirectory, key + extension))
+                except OSError:
+                    pass
+
+            totalBytes -= size
+            self._Count('evicted')
+
+    def _Freshness(self, headers: httpx.Headers) -> tuple[bool, int]:
+        """
+        Returns whether a response may be stored, and for how many seconds it stays fresh.
+        """
+
+        cacheControl: str = headers.get('cache-control', '').lower()
+        if 'no-store' in cacheControl:
+            return False, 0
+
+        if 'no-cache' in cacheControl:
+            return True, 0
+
+        if match := re.search(r'max-age=(\d+)', cacheControl):
+            return True, int(match.group(1))
+
+        # Fall back to the Expires header
+        if expires := headers.get('expires'):
+            try:
+                return True, max(0, int(parsedate_to_datetime(expires).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                return True, 0
+
+        return True, self.defaultMaxAge
+
+    # # # #
+    #
+    # Fetch Methods
+    #
+    # # # #
+
+    def _Count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _Read_Body(self, response: httpx.Response) -> tuple[bytes, bool]:
+        """
+        Reads a streamed response body up to maxResponseBytes. Returns the body and whether it was cut short.
+        """
+
+        chunks: list[bytes] = []
+        size: int = 0
+        for chunk in response.iter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > self.maxResponseBytes:
+                self._Count('truncated')
+                return b''.join(chunks)[:self.maxResponseBytes], True
+
+        return b''.join(chunks), False
+
+    def _Serve_Stale(self, cached: tuple[dict, bytes]) -> tuple[dict, bytes, str]:
+        self._Count('staleServed')
+        return cached[0], cached[1], 'stale'
+
+    def Fetch_Raw(self, url: str) -> tuple[dict, bytes, str]:
+        """
+        Fetches a URL through the cache.
+        If the server cannot be reached or answers with a server error, a cached copy is served even if it is stale.
+
+        Parameters:
+            url (str): The URL to fetch.
+
+        Returns:
+            tuple[dict, bytes, str]: The cache metadata, the body, and how it was served: 'cache', 'revalidated', 'network' or 'stale'.
+
+        Raises:
+            httpx.HTTPError: If the request fails and there is no cached copy, or the server answers with a client error.
+        """
+
+        self._Count('fetches')
+        cached: tuple[dict, bytes] | None = self._Read_Cache(url)
+
+        # Serve fresh entries without a request
+        if cached is not None:
+            meta, body = cached
+            if time.time() - meta['fetchedAt'] < meta['maxAge']:
+                self._Count('cacheHits')
+                self._Touch_Cache(url)
+                return meta, body, 'cache'
+
+        # Ask the server whether the cached copy is still valid
+        headers: dict[str, str] = {}
+        if cached is not None:
+            if cached[0].get('etag'):
+                headers['If-None-Match'] = cached[0]['etag']
+            if cached[0].get('lastModified'):
+                headers['If-Modified-Since'] = cached[0]['lastModified']
+
+        try:
+            with self.client.stream('GET', url, headers=headers) as response:
+                body, truncated = self._Read_Body(response) if response.is_success else (b'', False)
+
+        except httpx.TransportError:
+            if cached is None:
+                raise
+            return self._Serve_Stale(cached)
+
+        if response.status_code == 304 and cached is not None:
+            meta, body = cached
+            storable, maxAge = self._Freshness(response.headers)
+            meta['fetchedAt'] = time.time()
+            meta['maxAge'] = maxAge
+            meta['etag'] = response.headers.get('etag', meta.get('etag'))
+            meta['lastModified'] = response.headers.get('last-modified', meta.get('lastModified'))
+            if storable:
+                self._Write_Cache(url, meta, None)
+
+            self._Count('revalidated')
+            return meta, body, 'revalidated'
+
+        if response.status_code >= 500 and cached is not None:
+            return self._Serve_Stale(cached)
+
+        response.raise_for_status()
+
+        storable, maxAge = self._Freshness(response.headers)
+        meta: dict = {
+            'url': url,
+            'finalUrl': str(response.url),
+            'contentType': response.headers.get('content-type', ''),
+            'encoding': response.charset_encoding,
+            'etag': response.headers.get('etag'),
+            'lastModified': response.headers.get('last-modified'),
+            'fetchedAt': time.time(),
+            'maxAge': maxAge,
+            'truncated': truncated,
+        }
+        if storable:
+            self._Write_Cache(url, meta, body)
+
+        self._Count('downloads')
+        return meta, body, 'network'
+
+    def Fetch(self, url: str, maxTokens: int | None = None) -> dict[str, any]:
+        """
+        Fetches a URL and extracts its readable text.
+
+        Parameters:
+            url (str): The URL to fetch.
+            maxTokens (int | None): The approximate token budget of the text. Defaults to the fetcher's budget.
+
+        Returns:
+            dict[str, any]: The page's url, title, text and how it was served.
+
+        Raises:
+            httpx.HTTPError: If the request fails and there is no cached copy.
+        """
+
+        meta, body, servedFrom = self.Fetch_Raw(url)
+        text: str = body.decode(meta.get('encoding') or 'utf-8', errors='replace')
+        contentType: str = meta['contentType'].lower()
+
+        if 'html' in contentType or (contentType == '' and '<html' in text[:1000].lower()):
+            title, text = Extract_Readable_Text(text)
+        elif contentType.startswith('text/') or 'json' in contentType or 'xml' in contentType:
+            title, text = '', text.strip()
+        else:
+            title, text = '', f"Unsupported content type: {meta['contentType']}"
+
+        return {
+            'url': meta['finalUrl'],
+            'title': title,
+            'text': Truncate_To_Tokens(text, maxTokens if maxTokens is not None else self.maxTokens),
+            'servedFrom': servedFrom,
+        }
+
+    def Get_Metrics(self) -> dict[str, any]:
+        """
+        Returns the fetcher's counters.
+
+        Returns:
+            dict[str, any]: The fetcher's metrics.
+        """
+
+        with self._lock:
+            return dict(self.counters)
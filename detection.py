@@ -1,38 +1,163 @@
 import speech_recognition as sr
+from typing import Callable
+import time
 
-def Get_Speech(micIndex: int) -> str:
+# The microphone source, replaced by a capture worker when audio runs in its own process
+Microphone: Callable[..., sr.AudioSource] = sr.Microphone
+_processAudio: bool = False
+
+# What the assistant is playing, removed from the microphone before the wake word is checked
+_echoReference = None
+
+def Use_Process_Audio(enabled: bool = True) -> None:
+    # capture the microphone in a worker process, so work in this process cannot starve it
+    global Microphone, _processAudio
+
+    if enabled:
+        from AudioProcess import Process_Microphone
+        Microphone = Process_Microphone
+    else:
+        Microphone = sr.Microphone
+    _processAudio = enabled
+
+def Use_Echo_Suppression(echoReference) -> None:
+    # remove the assistant's own voice from the microphone, None turns suppression off
+    global _echoReference
+    _echoReference = echoReference
+
+def Recognize_Google(r: sr.Recognizer, audio: sr.AudioData) -> str:
+    return r.recognize_google(audio)
+
+def Transcribe_Next(r: sr.Recognizer, source: sr.AudioSource, recognize: Callable[[sr.Recognizer, sr.AudioData], str] = Recognize_Google) -> str | None:
+    # remove abient noise from the audio
+    r.adjust_for_ambient_noise(source, duration=2)
+
+    # listen for speech
+    audio: sr.AudioData = r.listen(source)
+
+    # stop once a replayed source runs out, a phrase cut off by the end of a recording is dropped
+    if getattr(source.stream, 'exhausted', False):
+        raise EOFError("The audio source has no audio left.")
+
+    # downsample to 16 kHz and encode FLAC in this process, instead of uploading the microphone's rate through a flac process
+    from SpeechEncoding import Prepare_Speech
+    audio = Prepare_Speech(audio)
+
+    # convert sound to text, or None if no speech was recognized
+    try:
+        return recognize(r, audio).lower()
+    except sr.UnknownValueError:
+        return None
+
+def Get_Speech(micIndex: int | None = None, source: sr.AudioSource | None = None, recognize: Callable[[sr.Recognizer, sr.AudioData], str] = Recognize_Google) -> str:
     # create a speech recognizer
     r = sr.Recognizer()
 
     # loop until speech is detected
     while True:
-        try:
-            # connect to the microphone
-            with sr.Microphone(micIndex) as mic:
-
-                # remove abient noise from the audio
-                r.adjust_for_ambient_noise(mic, duration=2)
-
-                # listen for speech and convert sound to text
-                text: str = r.recognize_google(r.listen(mic)).lower()
-
-                # check if the user said "jarvis"
-                if "jarvis" in text:
-                    return text
-                
-        except sr.UnknownValueError:
-            # if speech is not detected, try again
+        # connect to the microphone, unless an open source such as a replayed recording was given
+        if source is None:
+            with Microphone(micIndex) as mic:
+                if _echoReference is not None:
+                    from EchoSuppression import Suppress_Source
+                    Suppress_Source(mic, _echoReference)
+                text: str | None = Transcribe_Next(r, mic, recognize)
+        else:
+            text: str | None = Transcribe_Next(r, source, recognize)
+
+        # check if the user said "jarvis"
+        if text is not None and "jarvis" in text:
+            return text
+
+        # if speech is not detected, try again
+        if text is None:
             r = sr.Recognizer()
 
-def Select_Microphone() -> int:
-    # get all available microphones
-    microphones: list[str] = sr.Microphone.list_microphone_names()
-    # print the available microphones
-    for i, microphone in enumerate(microphones):
-        print(f"{i}: {microphone}")
+def Select_Microphone(configPath: str = 'devices.json', interactive: bool = False) -> int:
+    from DeviceConfig import Device_Config, List_Devices
+
+    # load the saved devices
+    config = Device_Config(configPath)
+
+    if interactive:
+        # print the available microphones
+        microphones: list[dict] = List_Devices('input')
+        for i, microphone in enumerate(microphones):
+            print(f"{i}: {microphone['name']}")
+
+        # prompt the user to select a microphone and remember it by name
+        selectedMicrophone: dict = microphones[int(input("Select a microphone: "))]
+        config.Set_Device('input', selectedMicrophone)
+        return selectedMicrophone['index']
+
+    # find the saved microphone, or pick the loudest live one without asking
+    config.Resolve_Output()
+    return config.Resolve_Input()['index']
+
+def Stream_Speech(micIndex: int, modelPath: str, sampleRate: int = 16000):
+    """
+    Transcribes the microphone locally as the user speaks, using a Vosk model.
+    Requires the optional `vosk` and `pyaudio` packages.
+
+    Parameters:
+        micIndex (int): The index of the microphone to listen to.
+        modelPath (str): The path of the Vosk model directory.
+        sampleRate (int): The sample rate to record at.
+
+    Returns:
+        Iterator[tuple[str, str]]: ('partial', text) about every quarter second while the user speaks, then ('final', text) once they stop.
+    """
+
+    import pyaudio
+    from vosk import Model, KaldiRecognizer
+    from json import loads
+
+    recognizer = KaldiRecognizer(Model(modelPath), sampleRate)
+
+    # read 4000 frames at a time, from the capture worker or straight from the device
+    if _processAudio:
+        from AudioProcess import Get_Capture_Process, READ_INDEX
+        capture = Get_Capture_Process(micIndex, sampleRate, chunkSize=4000)
+        capture.Attach()
+        Read_Frames: Callable[[], bytes] = lambda: capture.Read(8000)
+        End_Time: Callable[[], float] = lambda: capture.Captured_At(capture.ring.Get(READ_INDEX))
+    else:
+        audio = pyaudio.PyAudio()
+        stream = audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=sampleRate,
+            input=True,
+            input_device_index=micIndex,
+            frames_per_buffer=4000
+        )
+        Read_Frames: Callable[[], bytes] = lambda: stream.read(4000, exception_on_overflow=False)
+        End_Time: Callable[[], float] = time.monotonic
+
+    try:
+        while True:
+            data: bytes = Read_Frames()
+
+            # drop the assistant's own voice before it can be transcribed
+            if _echoReference is not None:
+                data = _echoReference.Suppress(data, sampleRate, End_Time())
+
+            # the recognizer returns True once it detects the end of an utterance
+            if recognizer.AcceptWaveform(data):
+                text: str = loads(recognizer.Result()).get('text', '')
+                if len(text) > 0:
+                    yield 'final', text
 
-    # prompt the user to select a microphone
-    selectedMicrophone: int = int(input("Select a microphone: "))
+            # repeat unchanged partials too, so listeners can tell how long they have been stable
+            else:
+                text: str = loads(recognizer.PartialResult()).get('partial', '')
+                if len(text) > 0:
+                    yield 'partial', text
 
-    # return the selected microphone
-    return selectedMicrophone
\ No newline at end of file
+    finally:
+        if _processAudio:
+            capture.Detach()
+        else:
+            stream.stop_stream()
+            stream.close()
+            audio.terminate()
@@ -1,33 +1,199 @@
 """
-Assistant Set Up
+Start Up
 """
 # Imports
-from Assistant2 import Assistant_V2, Stream_Handler
-from JarvisFunctions import *
-from typing_extensions import override
-from openai import OpenAI
-from dotenv import load_dotenv
-from os import environ, system
+from StartupProfile import Startup_Profiler
+from argparse import ArgumentParser
+from os import environ, system, name as osName
 from json import loads
-load_dotenv()
 
-# Create an instance of the assistant
-jARVIS: Assistant_V2 = Assistant_V2(
-    client=OpenAI(
-        api_key=environ['OPENAI_API_KEY']
-    ),
-    id=environ['ASSISTANT_ID']
+# Parse command line options
+parser = ArgumentParser(description='Jarvis voice assistant.')
+parser.add_argument(
+    '--profile-startup',
+    action='store_true',
+    help='Print the import and initialization time of each subsystem.'
+)
+parser.add_argument(
+    '--speculate',
+    action='store_true',
+    help='Start runs from stable partial transcripts before the user stops talking. Requires vosk.'
+)
+parser.add_argument(
+    '--vosk-model',
+    default='vosk-model',
+    help='The Vosk model directory used for streaming recognition with --speculate.'
+)
+parser.add_argument(
+    '--no-local-intents',
+    action='store_true',
+    help='Send every command to the assistant, even simple ones that can be handled locally.'
+)
+parser.add_argument(
+    '--no-intent-notes',
+    action='store_true',
+    help='Do not add a note to the thread when a command is handled locally.'
+)
+parser.add_argument(
+    '--no-model-routing',
+    action='store_true',
+    help="Run every turn on the assistant's own language model."
+)
+parser.add_argument(
+    '--routes',
+    default=None,
+    help='A JSON file of model routing rules, used instead of the default routes.'
+)
+parser.add_argument(
+    '--tts',
+    choices=['auto', 'cloud', 'local'],
+    default='auto',
+    help='The speech engine. auto uses the cloud and falls back to the local engine when the cloud is slow or unreachable.'
+)
+parser.add_argument(
+    '--select-microphone',
+    action='store_true',
+    help='Choose the microphone from a list and save it, instead of using the saved or loudest one.'
+)
+parser.add_argument(
+    '--device-config',
+    default='devices.json',
+    help='The file the chosen audio devices are saved to.'
+)
+parser.add_argument(
+    '--documents',
+    default=None,
+    help='A directory of documents to search. They are kept in a vector store linked to the assistant and in a local index.'
+)
+parser.add_argument(
+    '--vector-stores',
+    default='vector_stores.json',
+    help='The file that records vector stores, so expired ones can be rebuilt at startup.'
 )
-jARVIS.Update_Assistant_Name('Jarvis')
-jARVIS.Update_Assistant_Tools(Get_Function_Details())
+parser.add_argument(
+    '--conversation-log',
+    default='conversations.db',
+    help='The local database every utterance, message, tool call and run is written to.'
+)
+parser.add_argument(
+    '--no-conversation-log',
+    action='store_true',
+    help='Do not keep a local conversation log.'
+)
+parser.add_argument(
+    '--resume',
+    action='store_true',
+    help='Start the thread with the recent messages of the previous session, read from the conversation log.'
+)
+parser.add_argument(
+    '--process-audio',
+    action='store_true',
+    help='Capture and play audio in separate worker processes that share ring buffers with the assistant.'
+)
+parser.add_argument(
+    '--no-echo-suppression',
+    action='store_true',
+    help="Do not remove the assistant's own voice from the microphone."
+)
+arguments = parser.parse_args()
+profiler: Startup_Profiler = Startup_Profiler(enabled=arguments.profile_startup)
+
+# Load the audio backends in the background while the assistant warms up
+profiler.Start_Background_Imports([
+    'speech_recognition',
+    'playsound3',
+    'detection',
+    'SpeechEncoding',
+    'TextToSpeech'
+])
+
+"""
+Assistant Set Up
+"""
+# Imports
+with profiler.Stage('openai + Assistant2', kind='import'):
+    from Assistant2 import Assistant_V2, Assistant_Error, Stream_Handler
+    from RequestPolicy import Request_Policy
+    from openai import OpenAI
+
+with profiler.Stage('JarvisFunctions', kind='import'):
+    from JarvisFunctions import *
+
+with profiler.Stage('dotenv', kind='import'):
+    from typing_extensions import override
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Record the conversation locally
+conversationLog = None
+if not arguments.no_conversation_log:
+    from ConversationLog import Conversation_Log
+    conversationLog = Conversation_Log(arguments.conversation_log)
+
+    # Write the events still queued when the assistant exits
+    import atexit
+    atexit.register(conversationLog.Close)
+
+# Share one client and request policy, retries are handled by the policy
+with profiler.Stage('client'):
+    client: OpenAI = OpenAI(
+        api_key=environ['OPENAI_API_KEY'],
+        max_retries=0
+    )
+    requestPolicy: Request_Policy = Request_Policy(hedging=True)
+
+# Create an instance of the assistant
+with profiler.Stage('assistant'):
+    jARVIS: Assistant_V2 = Assistant_V2(
+        client=client,
+        id=environ['ASSISTANT_ID'],
+        requestPolicy=requestPolicy,
+        conversationLog=conversationLog
+    )
+    jARVIS.Update_Assistant_Name('Jarvis')
+    jARVIS.Update_Assistant_Tools(Get_Function_Details())
+
+# Pre-start the sandboxed code runner
+with profiler.Stage('code runner'):
+    Start_Code_Runner()
+
+# Pick the language model of each turn
+from ModelRouter import Model_Router, Route_Rule
+if arguments.routes is not None:
+    with open(arguments.routes, 'r', encoding='utf-8') as file:
+        modelRouter: Model_Router = Model_Router(rules=[Route_Rule.From_Config(rule) for rule in loads(file.read())])
+else:
+    modelRouter: Model_Router = Model_Router()
 
 # Create a thread to store messages
-jARVIS.Create_Thread('MAIN_THREAD')
+with profiler.Stage('thread'):
+    jARVIS.Create_Thread(
+        'MAIN_THREAD',
+        messages=conversationLog.Build_Thread_Messages('MAIN_THREAD') if arguments.resume and conversationLog is not None else None
+    )
+
+# Check the vector stores in the background and rebuild any that expired
+from VectorStoreRegistry import Vector_Store_Registry
+vectorStoreRegistry: Vector_Store_Registry = Vector_Store_Registry(
+    client=client,
+    registryPath=arguments.vector_stores,
+    requestPolicy=requestPolicy,
+    onProgress=lambda name, status: print(f"|| Vector store {name}: {status} ||", flush=True)
+)
+if arguments.documents is not None:
+    from LocalIndex import Local_Embedding_Index
+    vectorStoreRegistry.Start_Background_Rewarm(
+        assistant=jARVIS,
+        corpora={'DOCUMENTS': arguments.documents},
+        localIndexes={'DOCUMENTS': Local_Embedding_Index(client=client, requestPolicy=requestPolicy)}
+    )
+else:
+    vectorStoreRegistry.Start_Background_Rewarm(assistant=jARVIS)
 
 # Create a stream handler interact with the assistant
 class Custom_Stream_Handler(Stream_Handler):
-    def __init__(self, client, assistantName = 'Assistant'):
-        super().__init__(client, assistantName)
+    def __init__(self, client, assistantName = 'Assistant', requestPolicy = None, sinks = None, speechSinks = None):
+        super().__init__(client, assistantName, requestPolicy, sinks, speechSinks)
 
     @override
     def Handle_Required_Actions(self, data) -> None:
@@ -55,50 +221,251 @@ class Custom_Stream_Handler(Stream_Handler):
                     )
                 })
 
+            elif tool.function.name == "Run_Code_Snippet":
+                toolOutputs.append({
+                    "tool_call_id": tool.id,
+                    "output": Run_Code_Snippet(
+                        codeSnippet=args['codeSnippet'],
+                    )
+                })
+
+            elif tool.function.name == "Fetch_Webpage":
+                toolOutputs.append({
+                    "tool_call_id": tool.id,
+                    "output": Fetch_Webpage(
+                        url=args['url'],
+                    )
+                })
+
         # Submit the tool outputs
         self._Submit_Tool_Outputs(toolOutputs)
 
 """
 TTS Set Up
 """
-import Detection as dc
-import TextToSpeech as s
+# Finish loading the audio backends
+profiler.Wait_For_Background_Imports()
+dc = profiler.Import('detection')
+s = profiler.Import('TextToSpeech')
+
+# Publish what the assistant plays, so the microphone does not transcribe its own voice
+echoReference = None
+if not arguments.no_echo_suppression:
+    with profiler.Stage('echo suppression'):
+        from EchoSuppression import Echo_Reference
+        echoReference = Echo_Reference()
+        dc.Use_Echo_Suppression(echoReference)
+
+# Move microphone capture and cloud speech playback into worker processes
+player = None
+if arguments.process_audio:
+    with profiler.Stage('audio processes'):
+        import AudioProcess
+        dc.Use_Process_Audio()
+
+        if arguments.tts != 'local':
+            player = AudioProcess.Playback_Process(sampleRate=24000, echoReference=echoReference)
+            player.Start()
+
+        import atexit
+        atexit.register(AudioProcess.Stop_Capture_Processes)
+        if player is not None:
+            atexit.register(player.Stop)
+
+# Create the speech engines once and keep them alive
+with profiler.Stage('speech engines'):
+    localEngine = None
+    if arguments.tts != 'cloud':
+        try:
+            localEngine = s.Local_TTS_Engine(echoReference=echoReference)
+        except Exception as e:
+            if arguments.tts == 'local':
+                raise
+            print(f"|| Local speech engine unavailable: {e} ||", flush=True)
+
+    # Local speech alone still goes through Fallback_TTS, so its errors are raised as Assistant_Error
+    if arguments.tts == 'local':
+        ttsEngine = s.Fallback_TTS(primary=localEngine, fallback=None)
+    else:
+        ttsEngine = s.Fallback_TTS(
+            primary=s.OpenAI_TTS_Engine(client=client, requestPolicy=requestPolicy, timeout=4.0, player=player, echoReference=echoReference),
+            fallback=localEngine,
+            latencyThreshold=2.0
+        )
 
 # Select a microphone
-microphoneIndex: int = dc.Select_Microphone()
+with profiler.Stage('microphone selection'):
+    microphoneIndex: int = dc.Select_Microphone(
+        configPath=arguments.device_config,
+        interactive=arguments.select_microphone
+    )
 
 """
 Main Loop
 """
-system('cls')
+# Keep the startup report on screen when profiling
+if arguments.profile_startup:
+    profiler.Mark('first listen')
+    profiler.Report()
+else:
+    system('cls' if osName == 'nt' else 'clear')
+
+# The first turn should search the rebuilt stores
+if not vectorStoreRegistry.Wait(timeout=0):
+    print('|| Waiting for vector stores ||', flush=True)
+    vectorStoreRegistry.Wait()
+for name, status in vectorStoreRegistry.Get_Progress().items():
+    print(f"|| Vector store {name}: {status} ||", flush=True)
+
+# Handle simple commands without an assistant run
+from IntentMatcher import Intent_Matcher
+from OutputSinks import Speech_Sink
+from threading import Thread
+intentMatcher: Intent_Matcher | None = None if arguments.no_local_intents else Intent_Matcher()
+noteThread: Thread | None = None
+
+def Wait_For_Note() -> None:
+    # Keep the thread's messages in order by adding the last note before the next message
+    if noteThread is not None:
+        noteThread.join()
+
+def Log_Utterance(userInput: str, handledLocally: bool = False) -> None:
+    if conversationLog is not None:
+        conversationLog.Log('utterance', userInput, 'MAIN_THREAD', jARVIS.threads.get('MAIN_THREAD'), 'user', handledLocally=handledLocally)
+
+def Handle_Locally(userInput: str) -> bool:
+    global noteThread
+
+    if intentMatcher is None:
+        return False
+
+    handled = intentMatcher.Handle(userInput)
+    if handled is None:
+        return False
+
+    Log_Utterance(userInput, handledLocally=True)
+
+    match, output = handled
+    print(f"User > {userInput}\n")
+    print(f"Jarvis > {match.confirmation} ({output})\n", flush=True)
+
+    # Let the assistant know what happened without waiting on the API
+    if not arguments.no_intent_notes:
+        Wait_For_Note()
+
+        def Add_Note() -> None:
+            try:
+                jARVIS.Create_Message(
+                    threadName='MAIN_THREAD',
+                    textContent=intentMatcher.Describe(match, output),
+                    role='assistant'
+                )
+            except Assistant_Error as e:
+                print(f"|| Failed to add note: {e} ||", flush=True)
+
+        noteThread = Thread(target=Add_Note, name='Intent_Note', daemon=True)
+        noteThread.start()
+
+    # Confirmations are short and repeat, so their audio is cached
+    ttsEngine.Speak(
+        text=match.confirmation if not output.startswith('Failed') else "Sorry, I couldn't do that.",
+        cache=True
+    )
+
+    return True
+
+def Speak_Response(streamHandler: Stream_Handler) -> None:
+    # Speak the final message of the streamed response, without the code and markup shown on screen
+    speechSink: Speech_Sink = streamHandler.speechSinks[0]
+    if len(speechSink.messages) > 0 and len(speechSink.messages[-1]) > 0:
+        ttsEngine.Speak(text=speechSink.messages[-1])
+
+if arguments.speculate:
+    from Speculation import Speculative_Runner
+    from OutputSinks import Console_Sink
+
+    speculativeRunner: Speculative_Runner = Speculative_Runner(
+        assistant=jARVIS,
+        threadName='MAIN_THREAD',
+        streamHandlerFactory=lambda sinks: Custom_Stream_Handler(
+            client=client,
+            assistantName='Jarvis',
+            requestPolicy=requestPolicy,
+            sinks=sinks,
+            speechSinks=[Speech_Sink()]
+        ),
+        sinks=[Console_Sink()]
+    )
+
+    for kind, userInput in dc.Stream_Speech(micIndex=microphoneIndex, modelPath=arguments.vosk_model):
+        if kind == 'partial':
+            speculativeRunner.On_Partial(userInput)
+            continue
+
+        # only answer utterances addressed to the assistant
+        if 'jarvis' not in userInput:
+            speculativeRunner.Cancel()
+            continue
+
+        try:
+            if Handle_Locally(userInput):
+                speculativeRunner.Cancel()
+                continue
+
+            Wait_For_Note()
+
+            # Display user input
+            print(f"User > {userInput}\n")
+
+            # keep or restart the speculative run, then speak once the transcript is final
+            Speak_Response(speculativeRunner.On_Final(userInput))
+
+        # Keep listening if a turn fails after its retries are exhausted
+        except Assistant_Error as e:
+            print(f"|| Turn failed: {e} ||", flush=True)
+
+        metrics: dict[str, any] = speculativeRunner.Get_Metrics()
+        print(f"|| Speculation hit rate {metrics['hitRate']:.0%}, {metrics['averageTimeSavedSeconds']:.2f}s saved per hit ||", flush=True)
+
 while True:
     # Get user input
     userInput:str = dc.Get_Speech(
         micIndex=microphoneIndex
     )
 
-    # send text to the assistant
-    jARVIS.Create_Message(
-        threadName='MAIN_THREAD',
-        textContent=userInput
-    )
+    try:
+        if Handle_Locally(userInput):
+            continue
 
-    # Display user input
-    print(f"User > {userInput}\n")
+        Wait_For_Note()
 
-    # get response from the assistant
-    jARVIS.Stream_Response(
-        threadName='MAIN_THREAD',
-        streamHandler=Custom_Stream_Handler(
-            client=OpenAI(api_key=environ['OPENAI_API_KEY']),
-            assistantName='Jarvis'
+        # Display user input
+        print(f"User > {userInput}\n")
+
+        # send text to the assistant and get its response in one request
+        streamHandler: Custom_Stream_Handler = Custom_Stream_Handler(
+            client=client,
+            assistantName='Jarvis',
+            requestPolicy=requestPolicy,
+            speechSinks=[Speech_Sink()]
         )
-    )
+        if arguments.no_model_routing:
+            jARVIS.Send_And_Stream(
+                threadName='MAIN_THREAD',
+                textContent=userInput,
+                streamHandler=streamHandler
+            )
+        else:
+            modelRouter.Stream_Response(
+                assistant=jARVIS,
+                threadName='MAIN_THREAD',
+                textContent=userInput,
+                streamHandler=streamHandler,
+                sendMessage=True
+            )
 
-    # Speak the response
-    s.Speak(
-        text=jARVIS.Static_Response(
-            threadName='MAIN_THREAD'
-        )[-1],
-        client=OpenAI(api_key=environ['OPENAI_API_KEY'])
-    )
+        Speak_Response(streamHandler)
+
+    # Keep listening if a turn fails after its retries are exhausted
+    except Assistant_Error as e:
+        print(f"|| Turn failed: {e} ||", flush=True)